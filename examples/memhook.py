@@ -1,15 +1,18 @@
 """This example shows how to hook and hijack memory writes"""
 
+from smol_evm.hooks import Hooks
 from smol_evm.opcodes import *
 from smol_evm.runner import run
 
 def prehook(context, instruction):
-    if instruction.opcode == MSTORE.opcode:
-        offset, expected = context.stack.pop(), context.stack.pop()
-        hijacked = 0xdeadbeef
-        context.stack.push(hijacked)
-        context.stack.push(offset)
-        print(f"MSTORE hijacker replaced stack contents with {hijacked:x} (was {expected:x})")
+    offset, expected = context.stack.pop(), context.stack.pop()
+    hijacked = 0xdeadbeef
+    context.stack.push(hijacked)
+    context.stack.push(offset)
+    print(f"MSTORE hijacker replaced stack contents with {hijacked:x} (was {expected:x})")
+
+# the hook is only called for MSTORE, the other instructions run without any callback
+hooks = Hooks().on(MSTORE, prehook=prehook)
 
 code = assemble([
     PUSH(0x42),
@@ -23,5 +26,5 @@ code = assemble([
 ret = run(code, verbose=False).returndata
 print("unmodified return value:", ret.hex())
 
-ret = run(code, verbose=False, prehook=prehook).returndata
+ret = run(code, hooks=hooks).returndata
 print("hijacked return value:", ret.hex())
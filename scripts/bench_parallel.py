@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+Executes a synthetic block with `smol_evm.parallel` and reports the speedup and conflict rate.
+
+Usage: `python3 bench_parallel.py [--transactions N] [--contracts C] [--slots S] [--processes P]`
+
+Every transaction runs a loop of --work iterations, then increments a random slot in one of C counter contracts.
+Fewer contracts and slots mean more conflicts.
+"""
+
+import argparse
+import random
+
+from smol_evm.context import AccountState, WorldState
+from smol_evm.opcodes import *
+from smol_evm.parallel import Transaction, execute_block
+
+
+def counter(work: int) -> bytes:
+    # loop `work` times, then increment the slot given as calldata
+    loop = len(PUSH(work).to_bytes())
+    return assemble(
+        [
+            PUSH(work), JUMPDEST, PUSH(1), SWAP1, SUB, DUP1, PUSH(loop), JUMPI, POP,
+            PUSH(0), CALLDATALOAD, DUP1, SLOAD, PUSH(1), ADD, SWAP1, SSTORE,
+        ],
+        print_bin=False,
+    )  # fmt: skip
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=200)
+    parser.add_argument("--contracts", type=int, default=20)
+    parser.add_argument("--slots", type=int, default=10)
+    parser.add_argument("--work", type=int, default=2000, help="loop iterations per transaction")
+    parser.add_argument("--processes", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    code = counter(args.work)
+    world_state = WorldState({address: AccountState(code=code) for address in range(1, args.contracts + 1)})
+
+    rng = random.Random(args.seed)
+    transactions = [
+        Transaction(to=rng.randint(1, args.contracts), calldata=rng.randrange(args.slots).to_bytes(32, "big"))
+        for _ in range(args.transactions)
+    ]
+
+    print(execute_block(world_state, transactions, processes=args.processes, compare=True))
+
+
+if __name__ == "__main__":
+    main()
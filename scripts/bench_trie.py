@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks storage root computation with `smol_evm.trie`.
+
+Usage: `python3 bench_trie.py [--slots N] [--batch K] [--rounds R]`
+
+Fills a storage trie with N random slots and measures:
+- the initial root computation (every node is hashed once)
+- R rounds of K random updates followed by a root computation (only the modified paths are rehashed)
+- for comparison, recomputing the root from scratch
+
+Example: `python3 bench_trie.py --slots 1000000 --batch 1000`
+"""
+
+import argparse
+import random
+import time
+
+from smol_evm.trie import StorageTrie
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<40} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=100_000, help="number of storage slots")
+    parser.add_argument("--batch", type=int, default=1_000, help="number of slots updated per round")
+    parser.add_argument("--rounds", type=int, default=5, help="number of update rounds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    slots = {rng.getrandbits(256): rng.getrandbits(256) for _ in range(args.slots)}
+
+    trie = StorageTrie()
+
+    def fill():
+        for slot, value in slots.items():
+            trie.update(slot, value)
+
+    timed(f"insert {len(slots)} slots", fill)
+    timed("initial root", trie.root_hash)
+    initial_nodes = trie.encoded_nodes
+
+    keys = list(slots)
+    total = 0.0
+    for _ in range(args.rounds):
+        batch = [(rng.choice(keys), rng.getrandbits(256)) for _ in range(args.batch)]
+        nodes_before = trie.encoded_nodes
+        start = time.perf_counter()
+        for slot, value in batch:
+            trie.update(slot, value)
+            slots[slot] = value
+        trie.root_hash()
+        total += time.perf_counter() - start
+        rehashed = trie.encoded_nodes - nodes_before
+
+    print(f"{'update ' + str(args.batch) + ' slots + root (avg)':<40} {total / args.rounds:8.3f}s")
+    print(f"nodes rehashed: {rehashed} per round, {initial_nodes} for the initial root")
+
+    def from_scratch():
+        fresh = StorageTrie()
+        for slot, value in slots.items():
+            fresh.update(slot, value)
+        return fresh.root_hash()
+
+    assert timed("rebuild + root from scratch", from_scratch) == trie.root_hash()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
+from array import array
 from collections import defaultdict
 from time import sleep
-from web3 import Web3
 
+from Crypto.Hash import keccak
+
+import os
 import requests
+import struct
+import sys
 
 
 CORRUPTIONS_CONTRACT_ADDRESS = "0x5bdf397bb2912859dbd8011f320a222f79a28d2e"
@@ -56,9 +61,168 @@ fgcolors = [
 ]
 
 
+NUM_TOKENS = 4196
+
+# tag -> (column name, labels, offset into the labels, modulus), as in CorruptionsMetadata.sol
+ATTRIBUTES = {
+    "PHRASE": ("phrase", phrases, 0, 10),
+    "FGCOLOR": ("secret_phrase", phrases, len(phrases) - 6, 6),
+    "BORDER": ("border", borders_and_corruptors, 0, 11),
+    "CORRUPTOR": ("corruptor", borders_and_corruptors, 0, 11),
+    "CHECKER": ("checker", checkers, 0, 7),
+    "BGCOLOR": ("bgcolor", bgcolors, 0, 6),
+    "CORRUPTION": ("num_iterations", None, 0, 1024),
+}
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".corruptions.cache")
+CACHE_MAGIC = b"CORRUPT1"
+
+# every label gets a symbol, so that columns with different label lists (e.g. corruptor and checker) compare by value
+SYMBOLS = {label: i for i, label in enumerate(dict.fromkeys(phrases + borders_and_corruptors + checkers + bgcolors))}
+
+IS_ZERO = bytes([1] + [0] * 255)
+
+
+def attribute_hash(tag, token_id):
+    """keccak256(abi.encodePacked(tag, tokenId)), i.e. Web3.solidityKeccak(["string", "uint256"], [tag, tokenId])"""
+    data = tag.encode() + token_id.to_bytes(32, "big")
+    return int.from_bytes(keccak.new(data=data, digest_bits=256).digest(), "big")
+
+
+class Mask:
+    """a 0/1 byte per token, combined with & and |, and iterated as token ids"""
+
+    def __init__(self, flags):
+        self.flags = flags
+
+    def _combine(self, other, op):
+        value = op(int.from_bytes(self.flags, "big"), int.from_bytes(other.flags, "big"))
+        return Mask(value.to_bytes(len(self.flags), "big"))
+
+    def __and__(self, other):
+        return self._combine(other, lambda a, b: a & b)
+
+    def __or__(self, other):
+        return self._combine(other, lambda a, b: a | b)
+
+    def __iter__(self):
+        i = self.flags.find(1)
+        while i != -1:
+            yield i
+            i = self.flags.find(1, i + 1)
+
+    def __len__(self):
+        return self.flags.count(1)
+
+
+class Column:
+    """
+    The values of one attribute for all the tokens, as one byte per token (the index into the labels), or an array of
+    ints for numeric attributes. Comparisons return a Mask, computed on the whole column at once.
+    """
+
+    def __init__(self, name, codes, labels=None):
+        self.name = name
+        self.codes = codes
+        self.labels = labels
+
+        # the codes translated to shared symbols, for comparisons with other columns
+        if labels is not None:
+            table = bytes(SYMBOLS[label] for label in labels).ljust(256, b"\xff")
+            self.symbols = bytes(codes).translate(table)
+        else:
+            self.symbols = codes.tobytes()
+
+    def __getitem__(self, token_id):
+        code = self.codes[token_id]
+        return self.labels[code] if self.labels is not None else code
+
+    def __eq__(self, other):
+        if isinstance(other, Column):
+            other = other.symbols
+        elif self.labels is not None:
+            other = bytes([SYMBOLS[other]]) * len(self.symbols)
+        else:
+            other = array(self.codes.typecode, [other]).tobytes() * len(self.codes)
+
+        diff = int.from_bytes(self.symbols, "big") ^ int.from_bytes(other, "big")
+        flags = diff.to_bytes(len(self.symbols), "big").translate(IS_ZERO)
+        if self.labels is not None:
+            return Mask(flags)
+
+        # numeric columns have 2 bytes per token, and both must be equal: AND each byte with the previous one
+        value = int.from_bytes(flags, "big")
+        return Mask((value & (value >> 8)).to_bytes(len(flags), "big")[1::2])
+
+    __hash__ = None
+
+
+class AttributeTable:
+    """
+    The attributes of all the tokens, hashing every (tag, tokenId) pair exactly once. The codes are cached on disk, in
+    a file that is rebuilt when it's missing or doesn't match NUM_TOKENS.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        for column in columns.values():
+            setattr(self, column.name, column)
+
+    @classmethod
+    def build(cls, num_tokens=NUM_TOKENS):
+        columns = {}
+        for tag, (name, labels, offset, modulus) in ATTRIBUTES.items():
+            codes = array("B" if labels is not None else "H")
+            codes.extend(offset + attribute_hash(tag, token_id) % modulus for token_id in range(num_tokens))
+            columns[tag] = Column(name, codes, labels)
+        return cls(columns)
+
+    @classmethod
+    def load(cls, path=CACHE_PATH, num_tokens=NUM_TOKENS):
+        try:
+            with open(path, "rb") as f:
+                magic, count = struct.unpack(">8sI", f.read(12))
+                if magic != CACHE_MAGIC or count != num_tokens:
+                    raise ValueError("stale cache")
+
+                columns = {}
+                for tag, (name, labels, _, _) in ATTRIBUTES.items():
+                    codes = array("B" if labels is not None else "H")
+                    codes.fromfile(f, num_tokens)
+                    if codes.itemsize > 1 and sys.byteorder == "little":
+                        codes.byteswap()
+                    columns[tag] = Column(name, codes, labels)
+                return cls(columns)
+
+        except (OSError, ValueError, EOFError, struct.error):
+            table = cls.build(num_tokens)
+            table.save(path)
+            return table
+
+    def save(self, path=CACHE_PATH):
+        with open(path, "wb") as f:
+            f.write(struct.pack(">8sI", CACHE_MAGIC, len(self.columns["PHRASE"].codes)))
+            for tag in ATTRIBUTES:
+                codes = array(self.columns[tag].codes.typecode, self.columns[tag].codes)
+                if codes.itemsize > 1 and sys.byteorder == "little":
+                    codes.byteswap()
+                codes.tofile(f)
+
+
+_table = None
+
+
+def attribute_table():
+    """the attribute table, loaded (or built and cached on disk) on first use rather than on import"""
+    global _table
+    if _table is None:
+        _table = AttributeTable.load()
+    return _table
+
+
 class Corruption:
     """
-    Each Corruption models one token and its properties.
+    Each Corruption models one token and its properties, looked up in the attribute table.
 
     >>> token_0 = Corruption(0)
     >>> token_0.get_token_id()
@@ -84,32 +248,25 @@ class Corruption:
         return self.tokenId
 
     def get_phrase(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["PHRASE", self.tokenId])
-        return phrases[Web3.toInt(hash) % 10]
+        return attribute_table().phrase[self.tokenId]
 
     def get_num_iterations(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["CORRUPTION", self.tokenId])
-        return Web3.toInt(hash) % 1024
+        return attribute_table().num_iterations[self.tokenId]
 
     def get_border(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["BORDER", self.tokenId])
-        return borders_and_corruptors[Web3.toInt(hash) % 11]
+        return attribute_table().border[self.tokenId]
 
     def get_corruptor(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["CORRUPTOR", self.tokenId])
-        return borders_and_corruptors[Web3.toInt(hash) % 11]
+        return attribute_table().corruptor[self.tokenId]
 
     def get_bgcolor(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["BGCOLOR", self.tokenId])
-        return bgcolors[Web3.toInt(hash) % 6]
+        return attribute_table().bgcolor[self.tokenId]
 
     def get_secret_phrase(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["FGCOLOR", self.tokenId])
-        return phrases[len(phrases) - 6 + Web3.toInt(hash) % 6]
+        return attribute_table().secret_phrase[self.tokenId]
 
     def get_checker(self):
-        hash = Web3.solidityKeccak(["string", "uint256"], ["CHECKER", self.tokenId])
-        return checkers[Web3.toInt(hash) % 7]
+        return attribute_table().checker[self.tokenId]
 
     def get_orders(self):
         url = "https://api.opensea.io/wyvern/v1/orders?bundled=false&include_bundled=false&include_invalid=false&limit=20&offset=0&order_by=created_date&order_direction=desc"
@@ -126,7 +283,7 @@ class Corruption:
 
 
 # all the tokens:
-corruptions = [Corruption(i) for i in range(4196)]
+corruptions = [Corruption(i) for i in range(NUM_TOKENS)]
 
 
 ###############################################################################
@@ -156,12 +313,11 @@ def get_borders():
 
 
 def get_backgrounds():
-    bgcolors = defaultdict(int)
-
-    for c in corruptions:
-        bgcolors[c.get_bgcolor()] += 1
+    counts = defaultdict(int)
+    for code in attribute_table().bgcolor.codes:
+        counts[bgcolors[code]] += 1
 
-    for color, count in sorted(bgcolors.items(), key=lambda x: x[1], reverse=True):
+    for color, count in sorted(counts.items(), key=lambda x: x[1], reverse=True):
         print(f"console.log('{count} %c    ', 'background: {color};');")
 
 
@@ -171,42 +327,29 @@ def get_corruptors():
 
 
 def get_tokens_with_same_border_and_corruptor():
-    same = [
-        (x.get_token_id(), x.get_corruptor())
-        for x in corruptions
-        if x.get_border() == x.get_corruptor()
-    ]
-    for (token_id, corruptor) in same:
-        print(token_id, "\t", corruptor)
+    table = attribute_table()
+    for token_id in table.border == table.corruptor:
+        print(token_id, "\t", table.corruptor[token_id])
 
 
 def get_tokens_with_same_phrase_and_secret_phrase():
-    same = [
-        (x.get_token_id(), x.get_phrase())
-        for x in corruptions
-        if x.get_phrase() == x.get_secret_phrase()
-    ]
-    for (token_id, phrase) in same:
-        print(token_id, "\t", phrase)
+    table = attribute_table()
+    for token_id in table.phrase == table.secret_phrase:
+        print(token_id, "\t", table.phrase[token_id])
 
 
 def get_triple_perfect_corruptions():
-    return [
-        x
-        for x in corruptions
-        if x.get_phrase() == x.get_secret_phrase()
-        and x.get_corruptor() == x.get_border()
-        and x.get_corruptor() == x.get_checker()
-    ]
+    table = attribute_table()
+    perfect = (
+        (table.phrase == table.secret_phrase) & (table.corruptor == table.border) & (table.corruptor == table.checker)
+    )
+    return [corruptions[token_id] for token_id in perfect]
 
 
 def get_corruptor_and_checker_perfects():
-    return [
-        x
-        for x in corruptions
-        if x.get_phrase() == x.get_secret_phrase()
-        and x.get_corruptor() == x.get_checker()
-    ]
+    table = attribute_table()
+    perfect = (table.phrase == table.secret_phrase) & (table.corruptor == table.checker)
+    return [corruptions[token_id] for token_id in perfect]
 
 
 def print_collection(some_corruptions):
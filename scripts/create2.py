@@ -1,19 +1,35 @@
 #!/usr/bin/env python3
 
 """
-Based on web3.py, this script can find addresses of contracts deployed by the `CREATE2` opcode that satisfy a particular predicate.
+Finds addresses of contracts deployed by the `CREATE2` opcode that match a pattern, with `smol_evm.create2`.
 
-Usage: `python3 create2.py deployer_addr <salt | predicate> bytecode`
+Usage: `python3 create2.py deployer_addr <salt | pattern | predicate> <bytecode | initCodeHash>`
 
 When passing a salt value, this script prints the address of the newly deployed contract based on the deployer address and bytecode hash.
 
 Example: `python3 create2.py Bf6cE3350513EfDcC0d5bd5413F1dE53D0E4f9aE 42 602a60205260206020f3`
 
-When passing a predicate, this script will search for a salt value such that the new address satisfies the predicate.
+When passing a pattern, this script will search for a salt value such that the new address matches the pattern.
 
-Example: `python3 create2.py Bf6cE3350513EfDcC0d5bd5413F1dE53D0E4f9aE 'lambda addr: "badc0de" in addr.lower()' 602a60205260206020f3`
+Example: `python3 create2.py Bf6cE3350513EfDcC0d5bd5413F1dE53D0E4f9aE 00000000 602a60205260206020f3`
 
-Another predicate that may be useful: `'lambda addr: addr.startswith("0" * 8)'`
+Patterns are nibbles with `?` wildcards, anchored at the start of the address, or at the end after a `*`: `badc0de`,
+`*badc0de`, `dead*beef`, `00??00`. Patterns with mixed case must match the checksummed address. Patterns that read
+as a decimal number need a trailing `*` (`1234*`), otherwise they are taken as a salt.
+
+Several patterns are searched at once with `--pattern`, in a single pass over the salts. The target can also be
+`~badc0de` (anywhere in the address), or a score to maximize: `score:leading-zeros` or `score:zero-bytes`. Score
+searches run until they are stopped (Ctrl-C), and print the best address found for each pattern.
+
+Python predicates like `'lambda addr: "badc0de" in addr'` (called with the lowercase address) still work, but they
+run for every candidate and are much slower than patterns.
+
+Long searches can be stopped and resumed:
+
+- `--checkpoint FILE` records the completed chunks of salts and the hits, restart with the same arguments to resume
+- `--shared-dir DIR` shares the chunks with the searches of other machines through a (network) directory
+- `--serve [HOST:]PORT` coordinates the search over TCP instead of searching, and keeps its checkpoint in --checkpoint.
+  Other machines join with `python3 create2.py --join HOST:PORT`, they get everything else from the coordinator.
 
 Use with a deployer contract like this:
 
@@ -34,122 +50,143 @@ contract Deployer {
 ```
 """
 
-from multiprocessing import Pool, Event
-from web3 import Web3
-
-import os
+import argparse
 import sys
 
-
-def hexlify(x: int) -> str:
-    return "0x" + hex(x)[2:].zfill(64)
-
-
-def init_pool_processes(the_shutdown_event):
-    """
-    Initialize each process with the global shutdown event
-    """
-    global shutdown_event
-    shutdown_event = the_shutdown_event
-
-
-def _create2(deployer, salt_hexstr, hashed_bytecode):
-    addr_hexbytes = Web3.keccak(
-        hexstr=("ff" + deployer + salt_hexstr + hashed_bytecode)
-    )
-    addr = Web3.toChecksumAddress(Web3.toHex(addr_hexbytes)[-40:])
-    return addr
-
-
-def init_code_hash(bytecode: str):
-    if bytecode.startswith("0x") and len(bytecode) == 66:
+from smol_evm.create2 import (
+    ADDRESS_OFFSET,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_COORDINATOR_PORT,
+    DEFAULT_LEASE,
+    Coordinator,
+    DirectoryChunks,
+    InvalidCheckpoint,
+    InvalidPattern,
+    LocalChunks,
+    RemoteChunks,
+    SearchSpec,
+    best_hits,
+    compile_pattern,
+    create2_address,
+    init_code_hash,
+    search_chunks,
+    serve_coordinator,
+)
+
+
+class Predicate:
+    """a Python predicate over the lowercase address, compiled lazily so that it can be sent to the workers"""
+
+    def __init__(self, source: str) -> None:
+        self.text = source
+        self.predicate = None
+
+    def match(self, digest: bytes) -> bool:
+        if self.predicate is None:
+            self.predicate = eval(self.text)
+        return self.predicate("0x" + digest[ADDRESS_OFFSET:].hex())
+
+    def __getstate__(self):
+        return {"text": self.text, "predicate": None}
+
+
+def code_hash(arg: str) -> bytes:
+    if arg.startswith("0x") and len(arg) == 66:
         print("🔍 Looks like you passed an initCodeHash, using it directly")
-        return bytecode
+        return bytes.fromhex(arg[2:])
 
-    return Web3.toHex(Web3.keccak(hexstr=bytecode))
+    return init_code_hash(bytes.fromhex(arg[2:] if arg.startswith("0x") else arg))
 
 
-# expecting deployer='aabbccdd' (20 bytes -> 40 characters)
-# salt = some decimal number
-# bytecode = 'aabbccddeeff...' (variable length)
-def create2(deployer, salt, bytecode):
-    assert len(deployer) == 40
-    assert len(bytecode) % 2 == 0
-    salt_hexstr = hex(salt)[2:].zfill(64)
-    return _create2(deployer, salt_hexstr, init_code_hash(bytecode)[2:])
+def parse_salt(arg: str):
+    """0x-prefixed hex or decimal numbers are salts, "00000000" is a pattern"""
+    try:
+        salt = int(arg, 16) if arg.startswith("0x") else int(arg)
+    except ValueError:
+        return None
+    return salt if arg.startswith("0x") or str(salt) == arg else None
 
 
-class Create2Searcher:
-    def __init__(self, deployer_addr, predicate_str, bytecode):
-        self.deployer_addr = deployer_addr
-        self.predicate_str = predicate_str
-        self.hashed_bytecode = init_code_hash(bytecode)[2:]
+def compile_target(text: str):
+    return Predicate(text) if text.startswith("lambda") else compile_pattern(text)
 
-    def search(self, starting_salt=0):
-        predicate = eval(self.predicate_str)
-        salt = starting_salt
-        print("Starting search with salt:", hexlify(salt))
-        while True:
-            addr = _create2(self.deployer_addr, hexlify(salt)[2:], self.hashed_bytecode)
 
-            if predicate(addr.lower()):
-                print(
-                    f"\nFound a match! Deploying with salt={hexlify(salt)} to get address {addr}"
-                )
-                shutdown_event.set()
+def host_port(arg: str):
+    host, _, port = arg.rpartition(":")
+    return host or "127.0.0.1", int(port or DEFAULT_COORDINATOR_PORT)
 
-            if (salt % 10000) == 0 and shutdown_event.is_set():
-                print(f"Stopped searching after {salt - starting_salt} attempts")
-                break
 
-            salt += 1
+def report(stats):
+    print(f"\r{stats}", end="", file=sys.stderr, flush=True)
 
 
 def main():
-    if len(sys.argv) != 4:
-        print(
-            f"""Usage: python3 {sys.argv[0]} deployer_addr <salt | predicate> <bytecode|initCodeHash>
-
-When passing a salt value, this script prints the address of the newly deployed contract based on the deployer address and bytecode hash.
-Example: python3 {sys.argv[0]} Bf6cE3350513EfDcC0d5bd5413F1dE53D0E4f9aE 42 602a60205260206020f3
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("deployer", nargs="?")
+    parser.add_argument("target", nargs="?", help="a salt, a pattern or a Python predicate")
+    parser.add_argument("bytecode", nargs="?", help="the init code, or its hash")
+    parser.add_argument("--pattern", action="append", default=[], help="another pattern to search at the same time")
+    parser.add_argument("--start", type=lambda x: int(x, 0), default=0, help="the first salt to try")
+    parser.add_argument("--hits", type=int, default=1, help="stop after this many hits, 0 to never stop")
+    parser.add_argument("--processes", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="salts per chunk")
+    parser.add_argument("--checkpoint", help="resume from and save progress to this file")
+    parser.add_argument("--shared-dir", help="share the chunks with other searches through this directory")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="coordinate searches that --join, don't search")
+    parser.add_argument("--join", metavar="HOST:PORT", help="search the chunks of a coordinator")
+    parser.add_argument(
+        "--lease", type=float, default=DEFAULT_LEASE, help="seconds before a claim is handed out again"
+    )
+    args = parser.parse_args()
 
-When passing a predicate, this script will search for a salt value such that the new address satisfies the predicate.
-Example: python3 {sys.argv[0]} Bf6cE3350513EfDcC0d5bd5413F1dE53D0E4f9aE 'lambda addr: \"badc0de\" in addr.lower()' 602a60205260206020f3
+    if args.join:
+        chunks = RemoteChunks(*host_port(args.join))
+        spec = chunks.spec
+        print(f"👷‍♂️ Joined the search for {', '.join(spec.patterns)} on {args.join}")
+    else:
+        if args.bytecode is None:
+            parser.error("deployer, target and bytecode are required unless joining a coordinator")
 
-Another predicate that may be useful: 'lambda addr: addr.startswith(\"0\" * 8)'
-"""
-        )
-        sys.exit(0)
+        deployer = bytes.fromhex(args.deployer[2:] if args.deployer.startswith("0x") else args.deployer)
+        if len(deployer) != 20:
+            parser.error("the deployer must be a 20-byte address")
+        hashed = code_hash(args.bytecode)
 
-    deployer_addr = sys.argv[1]
-    if deployer_addr.startswith("0x"):
-        deployer_addr = deployer_addr[2:]
+        salt = parse_salt(args.target)
+        if salt is not None:
+            print(create2_address(deployer, salt, hashed))
+            return
 
-    bytecode = sys.argv[3]
+        targets = (args.target, *args.pattern)
+        spec = SearchSpec(deployer, hashed, targets, start=args.start, chunk_size=args.chunk_size)
 
     try:
-        salt_str = sys.argv[2]
-        salt = int(salt_str, 16) if salt_str.startswith("0x") else int(salt_str)
-        print(create2(deployer_addr, salt, bytecode))
-        sys.exit(0)
-    except ValueError as e:
-        pass
-
-    predicate_str = sys.argv[2]
-    process_count = os.cpu_count()
-
-    print(f"👷‍♂️ Starting {process_count} worker processes")
-    shutdown_event = Event()
-    searcher = Create2Searcher(deployer_addr, predicate_str, bytecode)
-
-    with Pool(
-        processes=process_count,
-        initializer=init_pool_processes,
-        initargs=(shutdown_event,),
-    ) as pool:
-        pool.map(searcher.search, [2**64 * x for x in range(os.cpu_count())])
-        pool.close()
-        pool.join()
+        patterns = [compile_target(text) for text in spec.patterns]
+        if args.serve:
+            coordinator = Coordinator(spec, args.checkpoint, max_hits=args.hits, lease=args.lease)
+            serve_coordinator(coordinator, *host_port(args.serve))
+            hits = coordinator.chunks.hits()
+        else:
+            if not args.join:
+                if args.shared_dir:
+                    chunks = DirectoryChunks(args.shared_dir, spec, lease=args.lease)
+                else:
+                    chunks = LocalChunks(spec, args.checkpoint)
+                print(f"👷‍♂️ Searching from salt 0x{spec.start:064x} with {args.processes or 'all the'} processes")
+
+            try:
+                hits = search_chunks(spec, chunks, patterns, args.hits, processes=args.processes, report=report).hits
+            except KeyboardInterrupt:
+                # the completed chunks are saved, score searches are usually stopped this way
+                hits = chunks.hits()
+            print(file=sys.stderr)
+
+    except (InvalidPattern, InvalidCheckpoint) as e:
+        parser.error(str(e))
+
+    for hit in best_hits(hits).values():
+        score = f" (score {hit.score})" if hit.score is not None else ""
+        print(f"{hit.pattern}: deploying with salt=0x{hit.salt:064x} gets address {hit.address}{score}")
 
 
 if __name__ == "__main__":
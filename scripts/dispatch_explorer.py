@@ -4,11 +4,13 @@ import argparse
 import os
 import subprocess
 
-from functools import partial
-
+from smol_evm.concolic import Constraint, explore, solve, trace_branches
 from smol_evm.context import ExecutionContext
+from smol_evm.dispatcher import find_selectors
+from smol_evm.hooks import Hooks
 from smol_evm.opcodes import Instruction, EQ, LT, GT
 from smol_evm.runner import run
+from smol_evm.utils import strip_0x
 
 DEBUG = False
 
@@ -18,11 +20,6 @@ def debug(msg):
         print(f"[DEBUG] {msg}")
 
 
-def strip_0x(s: str):
-    if s and s.startswith("0x"):
-        return s[2:]
-
-
 class Tracer:
     def __init__(self, sentinel: int):
         self.sentinel = sentinel
@@ -30,10 +27,12 @@ class Tracer:
         self.lt = []
         self.gt = []
 
+    def hooks(self) -> Hooks:
+        # we only care about comparison instructions, the others run without any callback
+        return Hooks().on([EQ, LT, GT], prehook=self.prehook)
+
     def prehook(self, context: ExecutionContext, instruction: Instruction):
-        # we only care about comparison instructions
-        if instruction not in (EQ, LT, GT):
-            return
+        op = instruction.execute
 
         # inspect the stack
         s0, s1 = context.stack.peek(0), context.stack.peek(1)
@@ -43,9 +42,9 @@ class Tracer:
             other = s1
 
             # note which side of the branch was taken (will be used later to take the other side)
-            if instruction is LT:
+            if op is LT:
                 self.gt.append(other) if self.sentinel < s1 else self.lt.append(other)
-            elif instruction is GT:
+            elif op is GT:
                 self.lt.append(other) if self.sentinel > s1 else self.gt.append(other)
 
         elif self.sentinel == s1:
@@ -53,32 +52,25 @@ class Tracer:
             other = s0
 
             # note which side of the branch was taken (will be used later to take the other side)
-            if instruction is LT:
+            if op is LT:
                 self.lt.append(other) if s0 < self.sentinel else self.gt.append(other)
-            elif instruction is GT:
+            elif op is GT:
                 self.gt.append(other) if s0 > self.sentinel else self.lt.append(other)
 
         else:
-            debug(
-                f"test for {hex(s0)} {instruction} {hex(s1)} does not match the sentinel value {hex(self.sentinel)}"
-            )
+            debug(f"test for {hex(s0)} {instruction} {hex(s1)} does not match the sentinel value {hex(self.sentinel)}")
 
         # if there was an equality check, infer that other is a function selector
-        if instruction is EQ and other is not None:
+        if op is EQ and other is not None:
             self.eq.append(other)
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--code",
-        help="hex data of the code to run, e.g. using `cast code <deployment_addr>`",
-        required=True,
-    )
-    args = parser.parse_args()
-
-    code = bytes.fromhex(strip_0x(args.code))
+def explore_dynamic(code: bytes) -> set:
+    """
+    Finds selectors by running the code repeatedly with sentinel calldata and watching comparisons.
 
+    Slow (many full executions per contract) and can miss branches, prefer the concolic explorer.
+    """
     lt = set([0xAABBCCDE])
     gt = set()
     eq = set()
@@ -107,8 +99,7 @@ def main():
             run(
                 code=code,
                 calldata=bytes.fromhex(hex(sentinel)[2:]),
-                verbose=False,
-                prehook=partial(Tracer.prehook, tracer),
+                hooks=tracer.hooks(),
             )
         except Exception as e:
             debug(f"ignoring exception {type(e)}: {e}")
@@ -118,13 +109,77 @@ def main():
         gt = gt.union(tracer.gt)
         eq = eq.union(tracer.eq)
 
-    selectors = ("0x" + hex(x)[2:].zfill(8) for x in eq)
     print(f"Found {len(eq)} potential selectors in {iteration} iterations")
+    return eq
+
+
+def looks_truncated(code: bytes, entries: dict) -> bool:
+    """
+    Cross-checks a static result with one concolic run for a selector that matches none of the entries.
+
+    On that path the dispatcher compares the selector against the leaves it visits; if one of these values is
+    missing from the static result, the pattern matcher lost track of the dispatcher somewhere.
+    """
+    selector = solve([Constraint("ne", x) for x in entries])
+    if selector is None:
+        return False
 
-    for selector in selectors:
+    return any(
+        branch.constraint.op in ("eq", "ne") and branch.constraint.value not in entries
+        for branch in trace_branches(code, selector)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--code",
+        help="hex data of the code to run, e.g. using `cast code <deployment_addr>`",
+        required=True,
+    )
+    parser.add_argument(
+        "--mode",
+        help="static analysis with a concolic fallback when nothing is found or the result looks truncated (auto), "
+        "or force one of the exploration strategies",
+        choices=["auto", "static", "concolic", "sentinel"],
+        default="auto",
+    )
+    args = parser.parse_args()
+
+    code = bytes.fromhex(strip_0x(args.code))
+
+    entries = find_selectors(code) if args.mode in ("auto", "static") else None
+    if entries is not None:
+        print(f"Found {len(entries)} selectors in the dispatcher")
+
+        if args.mode == "auto" and looks_truncated(code, entries):
+            print(
+                "The dispatcher compares against selectors we did not find, cross-checking with concolic exploration"
+            )
+            result = explore(code)
+            print(f"Found {len(result.selectors)} selectors in {result.runs} runs")
+            entries = {**result.selectors, **entries}
+
+    elif args.mode == "static":
+        print("Could not recognize the dispatcher statically")
+        entries = {}
+
+    elif args.mode == "sentinel":
+        # the sentinel loop does not know where functions start
+        entries = {x: None for x in explore_dynamic(code)}
+
+    else:
+        if args.mode == "auto":
+            print("Could not recognize the dispatcher statically, falling back to concolic exploration")
+        result = explore(code)
+        print(f"Found {len(result.selectors)} selectors in {result.runs} runs")
+        entries = result.selectors
+
+    for x, entry_pc in sorted(entries.items()):
+        selector = "0x" + hex(x)[2:].zfill(8)
         debug(f"+ cast 4byte {selector}")
 
-        print(f"{selector}:")
+        print(f"{selector}:" if entry_pc is None else f"{selector} (entry pc={hex(entry_pc)}):")
 
         cast = subprocess.run(
             f"cast 4byte {selector}".split(),
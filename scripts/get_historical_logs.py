@@ -1,65 +1,75 @@
 #!/usr/bin/env python3
 
-import json
-import os
-import sys
-import time
+"""
+Fetches the historical events of a contract to a JSON lines file, with `smol_evm.logs`.
 
-from web3 import Web3
-from web3._utils.events import get_event_data
+Usage: `python3 get_historical_logs.py address abi_json_filename event_name from_block`
 
-# based on https://ethereum.stackexchange.com/questions/106868/listen-to-events-in-the-polygon-network-using-web3-py
+Several `eth_getLogs` requests are in flight at once, and the block ranges adapt to the density of the events: they
+are split when the node reports too many results (or times out), and grow when they are sparse.
 
-# might start getting timeouts if this gets too big
-BLOCK_RANGE_SIZE = 1000
+The progress is saved to a checkpoint file (`<output>.checkpoint` by default), run the same command again to resume a
+fetch that was stopped or failed. The node is taken from `ETH_RPC_URL` (default http://localhost:8545).
+"""
 
-ETH_RPC_URL = os.environ.get("ETH_RPC_URL", "http://localhost:8545")
-print("ETH_RPC_URL:", ETH_RPC_URL)
-w3 = Web3(Web3.HTTPProvider(ETH_RPC_URL))
+import argparse
+import asyncio
+import json
+import os
+import sys
 
+from smol_evm.logs import DEFAULT_CONCURRENCY, DEFAULT_RANGE_SIZE, InvalidCheckpoint, fetch_logs
 
-def handle_event(event, event_template):
-    try:
-        result = get_event_data(
-            event_template.web3.codec, event_template._get_event_abi(), event
-        )
-        return True, result
-    except:
-        return False, None
 
+def report(stats):
+    print(f"\r{stats}", end="", file=sys.stderr, flush=True)
 
-def main():
-    address, abi_json_filename, event_name, from_block = sys.argv[1:]
-    from_block = int(from_block)
-    print(f"Starting from block {from_block} with block range size {BLOCK_RANGE_SIZE}")
 
-    with open(abi_json_filename) as f:
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("address")
+    parser.add_argument("abi_json_filename", help="a JSON file with the contract ABI under 'abi'")
+    parser.add_argument("event_name", help="the event to fetch, or 'all' for all the events of the ABI")
+    parser.add_argument("from_block", type=int)
+    parser.add_argument("--to-block", type=int, help="defaults to the latest block")
+    parser.add_argument("--output", help="defaults to <event_name>.jsonl")
+    parser.add_argument("--checkpoint", help="defaults to <output>.checkpoint")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="requests in flight")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE, help="blocks per initial range")
+    args = parser.parse_args()
+
+    url = os.environ.get("ETH_RPC_URL", "http://localhost:8545")
+    output = args.output or f"{args.event_name}.jsonl"
+    checkpoint = args.checkpoint or f"{output}.checkpoint"
+    print(f"ETH_RPC_URL: {url}, writing to {output}")
+
+    with open(args.abi_json_filename) as f:
         abi = json.load(f)["abi"]
 
-    contract = w3.eth.contract(address=address, abi=abi)
-    event_template = contract.events[event_name]
-
-    earliest_block = from_block
-    latest_block = w3.eth.get_block_number()
-
-    while from_block < latest_block:
-        done = from_block - earliest_block
-        print(
-            f"from_block: {from_block} ({done / (latest_block - earliest_block) * 100:.2f}%)"
-        )
-
-        to_block = from_block + BLOCK_RANGE_SIZE
-        events = w3.eth.get_logs(
-            {"fromBlock": from_block, "toBlock": to_block, "address": address}
+    try:
+        stats = asyncio.run(
+            fetch_logs(
+                url,
+                args.address,
+                abi,
+                output,
+                args.from_block,
+                to_block=args.to_block,
+                event_names=None if args.event_name == "all" else [args.event_name],
+                checkpoint=checkpoint,
+                report=report,
+                concurrency=args.concurrency,
+                range_size=args.range_size,
+            )
         )
-        from_block = to_block
-
-        for event in events:
-            suc, res = handle_event(event=event, event_template=event_template)
-            if suc:
-                print("Event found", res)
-
-        time.sleep(1)
+    except (InvalidCheckpoint, ValueError) as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        print(f"\nstopped, run the same command to resume from {checkpoint}", file=sys.stderr)
+        return
+
+    print(file=sys.stderr)
+    print(f"{stats.logs} events written to {output}")
 
 
 if __name__ == "__main__":
@@ -1,7 +1,17 @@
 import click
+import importlib
 import os
+import time
 
+import smol_evm.accesslist
+import smol_evm.conformance
+import smol_evm.context
+import smol_evm.coverage
+import smol_evm.fuzz
+import smol_evm.replay
+import smol_evm.rpc
 import smol_evm.runner
+import smol_evm.tracediff
 import smol_evm.opcodes
 import disasm
 
@@ -31,20 +41,43 @@ def cli():
 @click.option("--trace/--no-trace", help="print the full instruction trace", default=True)
 @click.option("--stack/--no-stack", help="enables stack output in the trace", default=False)
 @click.option("--memory/--no-memory", help="enables memory output in the trace", default=False)
-def run(code: str, calldata: str, trace: bool, stack: bool, memory: bool):
+@click.option("--access-list", help="print the EIP-2930 access list of the execution", is_flag=True, default=False)
+@click.option("--record", "record_path", help="record the inputs of the execution to a file, see `replay`")
+@click.option("--json-trace", "json_trace", help="write an EIP-3155 trace to a file, see `trace-diff`")
+def run(
+    code: str,
+    calldata: str,
+    trace: bool,
+    stack: bool,
+    memory: bool,
+    access_list: bool,
+    record_path: str,
+    json_trace: str,
+):
     """Execute bytecode"""
     code_bytes = load_bytecode(code)
     calldata_bytes = bytes.fromhex(strip_0x(calldata)) if calldata else bytes()
 
-    ret = smol_evm.runner.run(
-        code=code_bytes,
-        calldata=calldata_bytes,
-        verbose=trace,
-        print_stack=stack,
-        print_memory=memory,
-    ).returndata
+    kwargs = dict(code=code_bytes, calldata=calldata_bytes, verbose=trace, print_stack=stack, print_memory=memory)
+    if sum(map(bool, (access_list, record_path, json_trace))) > 1:
+        raise click.UsageError("--access-list, --record and --json-trace can't be combined")
 
-    click.echo(f"0x{ret.hex()}")
+    if access_list:
+        context, accesses = smol_evm.accesslist.create_access_list(**kwargs)
+    elif record_path:
+        context, recording = smol_evm.replay.record(**kwargs)
+        recording.save(record_path)
+        if context is None:
+            raise click.ClickException(recording.error)
+    elif json_trace:
+        with open(json_trace, "w") as out:
+            context = smol_evm.tracediff.write_trace(out, memory=memory, **kwargs)
+    else:
+        context = smol_evm.runner.run(**kwargs)
+
+    click.echo(f"0x{context.returndata.hex()}")
+    if access_list:
+        click.echo(accesses.to_json(indent=2))
 
 
 @cli.command()
@@ -60,3 +93,149 @@ def disassemble(code: str):
 def assemble(input_file):
     """Turn assembly code into bytecode"""
     smol_evm.opcodes.assemble(input_file.readlines(), print_bin=True)
+
+
+@cli.command()
+@click.option("--code", help="bytecode as hex string, e.g. 6080604052", required=True)
+@click.option("--inputs", help="file with one hex calldata per line", type=click.File("r"), required=True)
+@click.option("--map", "map_path", help="coverage map file, merged before the runs and updated after them")
+def coverage(code: str, inputs, map_path: str):
+    """Report the edge coverage of a set of inputs"""
+    code_bytes = load_bytecode(code)
+    edge_coverage = smol_evm.coverage.EdgeCoverage()
+    if map_path and os.path.exists(map_path):
+        edge_coverage.load(map_path)
+
+    for line in inputs:
+        if not line.strip():
+            continue
+        try:
+            edge_coverage.run(code_bytes, calldata=bytes.fromhex(strip_0x(line.strip())), max_steps=1_000_000)
+        except Exception as e:
+            click.echo(f"input {line.strip()}: {type(e).__name__}: {e}", err=True)
+
+    click.echo("\n".join(edge_coverage.report(code_bytes, disasm.disassemble(code_bytes))))
+    if map_path:
+        edge_coverage.save(map_path)
+
+
+@cli.command()
+@click.option("--code", help="bytecode as hex string, e.g. 6080604052", required=True)
+@click.option("--corpus", help="corpus directory, crashing inputs are saved to CORPUS/crashes", required=True)
+@click.option("--processes", help="worker processes, defaults to the number of cores", type=int)
+@click.option("--duration", help="seconds to fuzz for", default=60.0)
+@click.option("--runs", help="stop after this many executions", default=0)
+@click.option("--seed", help="random seed", type=int)
+@click.option("--max-steps", help="step limit per execution", default=smol_evm.fuzz.DEFAULT_MAX_STEPS)
+@click.option(
+    "--fail-on",
+    help="what counts as a crash",
+    type=click.Choice(smol_evm.fuzz.FAILURE_KINDS),
+    multiple=True,
+    default=smol_evm.fuzz.DEFAULT_FAIL_ON,
+)
+@click.option("--invariant", help="module:function called with the context of each successful run")
+def fuzz(code: str, corpus: str, processes, duration, runs, seed, max_steps, fail_on, invariant):
+    """Fuzz calldata with coverage guidance"""
+    invariant_func = None
+    if invariant:
+        module, _, name = invariant.partition(":")
+        invariant_func = getattr(importlib.import_module(module), name)
+
+    os.makedirs(corpus, exist_ok=True)
+    stats = smol_evm.fuzz.fuzz(
+        load_bytecode(code),
+        corpus,
+        processes=processes,
+        max_execs=runs,
+        duration=duration if not runs else 0,
+        max_steps=max_steps,
+        fail_on=fail_on,
+        invariant=invariant_func,
+        seed=seed,
+        report=lambda stats: click.echo(str(stats)),
+    )
+    for kind, count in stats.crashes.items():
+        click.echo(f"{kind}: {count} (see {os.path.join(corpus, 'crashes')})")
+
+
+@cli.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--processes", help="worker processes, defaults to the number of cores", type=int)
+@click.option("--cache", "cache_path", help="results cache file, unchanged tests are skipped on rerun")
+@click.option(
+    "--fork",
+    "forks",
+    help="forks of the state tests to run, in order of preference",
+    multiple=True,
+    default=smol_evm.conformance.DEFAULT_FORKS,
+)
+@click.option("--max-steps", help="step limit per test", default=smol_evm.conformance.DEFAULT_MAX_STEPS)
+def conformance(paths, processes, cache_path, forks, max_steps):
+    """Run JSON test fixtures (VMTests, GeneralStateTests)"""
+    report = smol_evm.conformance.run_conformance(
+        paths, processes=processes, cache_path=cache_path, forks=forks, max_steps=max_steps
+    )
+    for result in report.results:
+        if result.status == "fail":
+            click.echo(f"FAIL {result.name}: {result.reason}")
+    click.echo(report.summary())
+
+
+@cli.command()
+@click.argument("recording_path", type=click.Path(exists=True))
+@click.option("--threaded/--no-threaded", help="replay through the threaded dispatch loop", default=True)
+@click.option("--repeat", help="replay this many times, and print the timings", default=1)
+def replay(recording_path: str, threaded: bool, repeat: int):
+    """Replay a recorded execution"""
+    recording = smol_evm.replay.Recording.load(recording_path)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            context = smol_evm.replay.replay(recording, threaded=threaded)
+        except (*smol_evm.runner.EXECUTION_ERRORS, smol_evm.runner.ExecutionLimitReached):
+            if recording.error is None:
+                raise
+            context = None
+        timings.append(time.perf_counter() - start)
+
+    outcome = (context.success, context.returndata) if context is not None else None
+    if context is None:
+        click.echo(f"raised like the recorded run: {recording.error}")
+    elif recording.error is not None or outcome != (recording.success, recording.returndata):
+        raise click.ClickException("the replay doesn't match the recorded outcome")
+    else:
+        click.echo(f"0x{context.returndata.hex()}")
+
+    if repeat > 1:
+        timings.sort()
+        click.echo(f"runs: {repeat}, min: {timings[0]:.6f}s, median: {timings[len(timings) // 2]:.6f}s")
+
+
+@cli.command("trace-diff")
+@click.argument("left", type=click.Path(exists=True))
+@click.argument("right", type=click.Path(exists=True))
+@click.option("--context", help="steps to show around the divergence", default=smol_evm.tracediff.DEFAULT_CONTEXT)
+def trace_diff(left: str, right: str, context: int):
+    """Find the first divergent step between two EIP-3155 traces"""
+    divergence, count = smol_evm.tracediff.diff_files(left, right, context)
+    if divergence is None:
+        click.echo(f"traces are identical ({count} steps)")
+        return
+
+    click.echo("\n".join(divergence.format()))
+    raise SystemExit(1)
+
+
+@cli.command()
+@click.option("--snapshot", help="snapshot file to serve (see smol_evm.snapshot), empty state by default")
+@click.option("--host", help="interface to listen on", default="127.0.0.1")
+@click.option("--port", help="port to listen on", default=8545)
+@click.option("--processes", help="worker processes for eth_call, defaults to the number of cores", type=int)
+def serve(snapshot: str, host: str, port: int, processes: int):
+    """Serve a local JSON-RPC endpoint"""
+    world_state = smol_evm.context.WorldState() if snapshot is None else None
+    server = smol_evm.rpc.RpcServer(world_state=world_state, snapshot_path=snapshot, processes=processes)
+    smol_evm.rpc.serve(server, host, port)
@@ -0,0 +1,118 @@
+"""
+EIP-2930 access list generation.
+
+Instead of inspecting every instruction in a prehook, `TracingWorldState` wraps the world state and the storage of
+every account that execution looks up, so the accounts and slots are recorded when they are actually accessed. The
+interpreter loop is untouched: there is no per-step overhead, and it works with `run(..., threaded=True)` too.
+"""
+
+import json
+from typing import Dict, Iterable, List
+
+from .context import AccountState, Storage, WorldState
+from .runner import run
+
+
+class AccessList:
+    def __init__(self) -> None:
+        # address -> slots, both in the order they were first accessed
+        self.entries: Dict[int, Dict[int, None]] = {}
+
+    def add_address(self, address: int) -> None:
+        self.entries.setdefault(address, {})
+
+    def add_slot(self, address: int, slot: int) -> None:
+        self.entries.setdefault(address, {})[slot] = None
+
+    def to_list(self, exclude: Iterable[int] = ()) -> List[dict]:
+        """
+        The access list in the standard JSON-RPC format.
+
+        Like geth's eth_createAccessList, callers typically exclude the sender and the recipient of the transaction,
+        since they are always warm.
+        """
+        exclude = set(exclude)
+        return [
+            {
+                "address": f"0x{address:040x}",
+                "storageKeys": [f"0x{slot:064x}" for slot in slots],
+            }
+            for address, slots in self.entries.items()
+            if address not in exclude
+        ]
+
+    def to_json(self, exclude: Iterable[int] = (), **kwargs) -> str:
+        return json.dumps(self.to_list(exclude), **kwargs)
+
+
+class TracingStorage(Storage):
+    """records the slots read or written, and forwards everything to the wrapped storage"""
+
+    def __init__(self, storage: Storage, access_list: AccessList, address: int) -> None:
+        self.storage = storage
+        self.access_list = access_list
+        self.address = address
+
+    @property
+    def data(self):
+        return self.storage.data
+
+    def get(self, slot):
+        value = self.storage.get(slot)
+        self.access_list.add_slot(self.address, slot)
+        return value
+
+    def put(self, slot, value):
+        self.storage.put(slot, value)
+        self.access_list.add_slot(self.address, slot)
+
+
+class TracingWorldState(WorldState):
+    """
+    Wraps a world state and records all the accounts looked up during execution.
+
+    Accounts are returned as views that share the code and storage of the wrapped accounts. Missing accounts are
+    returned as empty accounts, so that the storage of a contract that only exists in the current run is traced too.
+    """
+
+    def __init__(self, world_state: WorldState, access_list: AccessList = None) -> None:
+        self.world_state = world_state
+        self.access_list = access_list if access_list is not None else AccessList()
+        self.views = {}
+
+    @property
+    def accounts(self):
+        return self.world_state.accounts
+
+    def find(self, address):
+        self.access_list.add_address(address)
+
+        view = self.views.get(address)
+        if view is None:
+            account = self.world_state.find(address)
+            if account is None:
+                account = AccountState()
+
+            view = AccountState(
+                nonce=account.nonce,
+                balance=account.balance,
+                storage=TracingStorage(account.storage, self.access_list, address),
+            )
+            view.code_handle = account.code_handle
+            self.views[address] = view
+
+        return view
+
+    def get(self, address):
+        return self.find(address)
+
+    def set(self, address, account):
+        self.views.pop(address, None)
+        self.world_state.set(address, account)
+
+
+def create_access_list(code: bytes, world_state: WorldState = None, address=0, **kwargs):
+    """runs the code and returns (context, access list), kwargs are passed to `run`"""
+    tracing = TracingWorldState(world_state if world_state is not None else WorldState())
+    context = run(code, world_state=tracing, address=address, **kwargs)
+    return context, tracing.access_list
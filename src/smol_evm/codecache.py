@@ -0,0 +1,143 @@
+"""
+Process-wide cache of code analysis, keyed by keccak(code).
+
+Proxies, clones and factory-deployed contracts share the same bytecode, so the analysis that only depends on the code
+(jump destinations, decoded program, basic blocks) is computed once per distinct code and shared by every account.
+
+Entries stay alive as long as an `AccountState` (or anything else) holds a reference to them, plus a bounded number
+of recently used entries that are kept around even when nothing references them anymore.
+"""
+
+import sys
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from eth_utils import keccak
+
+DEFAULT_MAX_UNREFERENCED = 256
+
+# instructions that end a basic block, besides the ones that jump
+TERMINATING = ("STOP", "RETURN", "REVERT", "INVALID", "SELFDESTRUCT", "JUMP", "JUMPI")
+
+
+class CodeAnalysis:
+    """immutable analysis artifacts for a piece of code, shared by all the accounts with that code"""
+
+    def __init__(self, code: bytes, code_hash: bytes) -> None:
+        from .context import valid_jump_destinations
+
+        self.code = code
+        self.code_hash = code_hash
+        self.jumpdests = frozenset(valid_jump_destinations(code))
+
+        # one bit per byte of code
+        bitmap = bytearray((len(code) + 7) // 8)
+        for pc in self.jumpdests:
+            bitmap[pc // 8] |= 1 << (pc % 8)
+        self.jumpdest_bitmap = bytes(bitmap)
+
+        self._program = None
+        self._basic_blocks = None
+
+    def is_jumpdest(self, pc: int) -> bool:
+        return pc < len(self.code) and bool(self.jumpdest_bitmap[pc // 8] & (1 << (pc % 8)))
+
+    @property
+    def program(self) -> Dict[int, object]:
+        """pc -> decoded Instruction (with operands), computed on first access"""
+        if self._program is None:
+            from .context import ExecutionContext
+            from .opcodes import decode_opcode
+
+            program = {}
+            context = ExecutionContext(code=self.code)
+            while context.pc < len(self.code):
+                pc = context.pc
+
+                # increments pc by instruction length
+                program[pc] = decode_opcode(context)
+
+            self._program = program
+        return self._program
+
+    @property
+    def basic_blocks(self) -> List[Tuple[int, int]]:
+        """(start, end) pc ranges, a block starts at a JUMPDEST or after a terminating instruction"""
+        if self._basic_blocks is None:
+            blocks = []
+            start = 0
+            for pc, instruction in self.program.items():
+                if instruction.name == "JUMPDEST" and pc != start:
+                    blocks.append((start, pc))
+                    start = pc
+
+                if instruction.name in TERMINATING:
+                    end = pc + 1
+                    blocks.append((start, end))
+                    start = end
+
+            if start < len(self.code):
+                blocks.append((start, len(self.code)))
+
+            self._basic_blocks = blocks
+        return self._basic_blocks
+
+    def memory_usage(self) -> int:
+        """approximate size in bytes of the analysis, not counting the code itself"""
+        size = sys.getsizeof(self.jumpdests) + sys.getsizeof(self.jumpdest_bitmap)
+        if self._program is not None:
+            size += sys.getsizeof(self._program) + sum(sys.getsizeof(i) for i in self._program.values())
+        if self._basic_blocks is not None:
+            size += sys.getsizeof(self._basic_blocks) + len(self._basic_blocks) * sys.getsizeof((0, 0))
+        return size
+
+    def __repr__(self) -> str:
+        return f"CodeAnalysis(0x{self.code_hash.hex()}, {len(self.code)} bytes)"
+
+
+class CodeRegistry:
+    def __init__(self, max_unreferenced=DEFAULT_MAX_UNREFERENCED) -> None:
+        self.max_unreferenced = max_unreferenced
+
+        # entries are dropped when the last handle to them goes away
+        self.live = weakref.WeakValueDictionary()
+
+        # strong references to the most recently used entries
+        self.recent = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code: bytes) -> CodeAnalysis:
+        code = bytes(code)
+        code_hash = keccak(code)
+
+        analysis = self.live.get(code_hash)
+        if analysis is None:
+            self.misses += 1
+            analysis = CodeAnalysis(code, code_hash)
+            self.live[code_hash] = analysis
+        else:
+            self.hits += 1
+
+        self.recent[code_hash] = analysis
+        self.recent.move_to_end(code_hash)
+        if len(self.recent) > self.max_unreferenced:
+            self.recent.popitem(last=False)
+
+        return analysis
+
+    def memory_usage(self) -> int:
+        """approximate size in bytes of all the live entries, including the code"""
+        return sum(sys.getsizeof(a.code) + a.memory_usage() for a in list(self.live.values()))
+
+    def clear(self) -> None:
+        self.recent.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+
+CODE_REGISTRY = CodeRegistry()
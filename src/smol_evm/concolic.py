@@ -0,0 +1,280 @@
+"""
+Concolic exploration of function dispatchers.
+
+We run the code concretely, but keep a shadow stack next to the real one that tags the values derived from the
+function selector. When a JUMPI depends on a tagged value, we record the branch constraint (e.g. `selector < 0x8000`)
+and whether it was taken. Flipping the last branch of a path prefix gives a small system of equalities and ranges on
+the selector that we can solve locally, which yields the input for the next run.
+
+This is much more lightweight than a real symbolic execution engine: only the selector is symbolic, and only the
+operations that dispatchers actually use are tracked. Everything else is concrete (tag = None).
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from . import runner
+from .context import ExecutionContext
+from .opcodes import Instruction, DUP1, DUP16, SWAP1, SWAP16
+from .runner import run, ExecutionLimitReached
+
+SELECTOR_BITS = 32
+MAX_SELECTOR = 2**SELECTOR_BITS - 1
+
+# tags for the symbolic values we know about
+CALLDATA_WORD = "calldata[0:32]"
+SELECTOR = "selector"
+
+# ways a concrete run can end early, anything else is a bug that should not be swallowed
+EXECUTION_ERRORS = (ExecutionLimitReached,) + runner.EXECUTION_ERRORS
+
+NEGATED = {"eq": "ne", "ne": "eq", "lt": "ge", "ge": "lt", "gt": "le", "le": "gt"}
+
+# number of stack inputs for the instructions we need to follow, anything else resets the shadow stack
+STACK_INPUTS = {
+    "STOP": 0, "ADD": 2, "MUL": 2, "SUB": 2, "DIV": 2, "SDIV": 2, "MOD": 2, "SMOD": 2, "ADDMOD": 3, "MULMOD": 3,
+    "EXP": 2, "SIGNEXTEND": 2, "LT": 2, "GT": 2, "SLT": 2, "SGT": 2, "EQ": 2, "ISZERO": 1, "AND": 2, "OR": 2,
+    "XOR": 2, "NOT": 1, "BYTE": 2, "SHL": 2, "SHR": 2, "SAR": 2, "SHA3": 2, "CALLVALUE": 0, "CALLDATALOAD": 1,
+    "CALLDATASIZE": 0, "CALLDATACOPY": 3, "POP": 1, "MLOAD": 1, "MSTORE": 2, "MSTORE8": 2, "SLOAD": 1,
+    "SSTORE": 2, "JUMP": 1, "JUMPI": 2, "PC": 0, "MSIZE": 0, "GAS": 0, "JUMPDEST": 0, "PUSH0": 0, "ADDRESS": 0,
+    "CALLER": 0, "RETURNDATASIZE": 0, "RETURNDATACOPY": 3,
+}  # fmt: skip
+
+
+@dataclass(frozen=True)
+class Constraint:
+    """a constraint on the selector, e.g. Constraint("lt", 0x8000) means selector < 0x8000"""
+
+    op: str
+    value: int
+
+    def negate(self) -> "Constraint":
+        return Constraint(NEGATED[self.op], self.value)
+
+    def holds(self, selector: int) -> bool:
+        return {
+            "eq": selector == self.value,
+            "ne": selector != self.value,
+            "lt": selector < self.value,
+            "ge": selector >= self.value,
+            "gt": selector > self.value,
+            "le": selector <= self.value,
+        }[self.op]
+
+
+@dataclass(frozen=True)
+class Branch:
+    """a JUMPI whose condition depends on the selector"""
+
+    pc: int
+    constraint: Constraint
+    taken: bool
+
+    # where execution continues, i.e. the jump target if taken or the next instruction otherwise
+    next_pc: int
+
+    def path_constraint(self) -> Constraint:
+        """the constraint that held on the path we observed"""
+        return self.constraint if self.taken else self.constraint.negate()
+
+    def is_selector_match(self) -> bool:
+        """returns true if this branch enters a function, i.e. it was taken because the selector matched"""
+        return self.path_constraint().op == "eq"
+
+
+def solve(constraints: Sequence[Constraint]) -> Optional[int]:
+    """returns the smallest selector that satisfies all the constraints, or None if there is none"""
+    lo, hi = 0, MAX_SELECTOR
+    excluded = set()
+
+    for c in constraints:
+        if c.op == "eq":
+            lo, hi = max(lo, c.value), min(hi, c.value)
+        elif c.op == "ne":
+            excluded.add(c.value)
+        elif c.op == "lt":
+            hi = min(hi, c.value - 1)
+        elif c.op == "le":
+            hi = min(hi, c.value)
+        elif c.op == "gt":
+            lo = max(lo, c.value + 1)
+        elif c.op == "ge":
+            lo = max(lo, c.value)
+
+    selector = lo
+    while selector <= hi:
+        if selector not in excluded:
+            return selector
+        selector += 1
+
+    return None
+
+
+class ShadowStackTracer:
+    """records the branches that depend on the selector in a single concrete run"""
+
+    def __init__(self):
+        self.shadow = []
+        self.branches: List[Branch] = []
+        self.pending = None
+
+    def prehook(self, context: ExecutionContext, instruction: Instruction) -> None:
+        stack = context.stack.stack
+        opcode = instruction.opcode
+
+        # the runner pushes the result of message calls after the posthook of the CALL instruction
+        if len(self.shadow) != len(stack):
+            self.shadow = [None] * len(stack)
+
+        if DUP1.opcode <= opcode <= DUP16.opcode or SWAP1.opcode <= opcode <= SWAP16.opcode or instruction.is_push():
+            self.pending = (instruction, 0, (), ())
+            return
+
+        num_inputs = STACK_INPUTS.get(instruction.name)
+        if num_inputs is None or len(stack) < num_inputs:
+            self.pending = None
+            return
+
+        # inputs are listed top of the stack first
+        values = tuple(reversed(stack[len(stack) - num_inputs :]))
+        tags = tuple(reversed(self.shadow[len(self.shadow) - num_inputs :]))
+        self.pending = (instruction, num_inputs, values, tags)
+
+        if instruction.name == "JUMPI" and isinstance(tags[1], Constraint):
+            target, cond = values
+            taken = cond != 0
+            self.branches.append(Branch(context.pc - 1, tags[1], taken, target if taken else context.pc))
+
+    def posthook(self, context: ExecutionContext, instruction: Instruction) -> None:
+        stack_len = len(context.stack.stack)
+
+        if self.pending is None:
+            # unknown instruction, we can't tell what happened to the stack so we forget about all the tags
+            self.shadow = [None] * stack_len
+            return
+
+        insn, num_inputs, values, tags = self.pending
+        opcode = insn.opcode
+        if DUP1.opcode <= opcode <= DUP16.opcode:
+            self.shadow.append(self.shadow[-(opcode - DUP1.opcode + 1)])
+        elif SWAP1.opcode <= opcode <= SWAP16.opcode:
+            i = opcode - SWAP1.opcode + 1
+            self.shadow[-1], self.shadow[-i - 1] = self.shadow[-i - 1], self.shadow[-1]
+        else:
+            if num_inputs:
+                del self.shadow[-num_inputs:]
+            if stack_len > len(self.shadow):
+                self.shadow.append(_propagate(insn.name, values, tags))
+
+        # stay aligned with the real stack no matter what
+        if len(self.shadow) != stack_len:
+            self.shadow = [None] * stack_len
+
+
+def _propagate(name: str, values, tags):
+    """computes the tag of the output of an instruction based on the tags of its inputs"""
+    if name == "CALLDATALOAD":
+        return CALLDATA_WORD if values[0] == 0 else None
+
+    if not any(tags):
+        return None
+
+    if name == "SHR" and tags == (None, CALLDATA_WORD) and values[0] == 256 - SELECTOR_BITS:
+        return SELECTOR
+
+    if name == "DIV" and tags == (CALLDATA_WORD, None) and values[1] == 2 ** (256 - SELECTOR_BITS):
+        return SELECTOR
+
+    if name == "AND" and SELECTOR in tags and MAX_SELECTOR in values:
+        return SELECTOR
+
+    if name == "ISZERO":
+        if isinstance(tags[0], Constraint):
+            return tags[0].negate()
+        return Constraint("eq", 0) if tags[0] == SELECTOR else None
+
+    if tags.count(SELECTOR) != 1 or any(isinstance(t, Constraint) for t in tags):
+        return None
+
+    # binary operations between the selector and a concrete value
+    selector_first = tags[0] == SELECTOR
+    other = values[1] if selector_first else values[0]
+
+    if name == "EQ":
+        return Constraint("eq", other)
+    if name in ("XOR", "SUB"):
+        return Constraint("ne", other)
+    if name == "LT":
+        # LT computes a < b where a is the top of the stack
+        return Constraint("lt" if selector_first else "gt", other)
+    if name == "GT":
+        return Constraint("gt" if selector_first else "lt", other)
+
+    return None
+
+
+@dataclass
+class ExplorationResult:
+    # selector -> entry pc
+    selectors: Dict[int, int] = field(default_factory=dict)
+    runs: int = 0
+
+
+def trace_branches(code: bytes, selector: int, max_steps: int = 100000) -> List[Branch]:
+    """runs the code once with the given selector as calldata and returns the selector-dependent branches"""
+    tracer = ShadowStackTracer()
+    try:
+        run(
+            code=code,
+            calldata=selector.to_bytes(SELECTOR_BITS // 8, "big"),
+            max_steps=max_steps,
+            prehook=tracer.prehook,
+            posthook=tracer.posthook,
+        )
+    except EXECUTION_ERRORS:
+        # the path up to the exception is still valid
+        pass
+
+    return tracer.branches
+
+
+def explore(code: bytes, seed: int = 0, max_runs: int = 10000) -> ExplorationResult:
+    """
+    Explores the dispatcher by flipping one branch at a time, until all the reachable leaves have been visited.
+    """
+    result = ExplorationResult()
+    queue = deque([seed])
+    tried = set()
+
+    # path prefixes (sequence of (pc, taken)) that we already visited or already generated an input for
+    seen = set()
+
+    while queue and result.runs < max_runs:
+        selector = queue.popleft()
+        if selector in tried:
+            continue
+        tried.add(selector)
+
+        branches = trace_branches(code, selector)
+        result.runs += 1
+
+        prefix = ()
+        for i, branch in enumerate(branches):
+            if branch.is_selector_match():
+                result.selectors.setdefault(branch.constraint.value, branch.next_pc)
+
+            flipped = prefix + ((branch.pc, not branch.taken),)
+            prefix += ((branch.pc, branch.taken),)
+            seen.add(prefix)
+
+            if flipped in seen:
+                continue
+            seen.add(flipped)
+
+            constraints = [b.path_constraint() for b in branches[:i]] + [branch.path_constraint().negate()]
+            solution = solve(constraints)
+            if solution is not None:
+                queue.append(solution)
+
+    return result
@@ -0,0 +1,371 @@
+"""
+A parallel conformance runner for JSON test fixtures, loaded from local files.
+
+Supported formats:
+
+- evm-from-scratch (a list of tests with "code" and "expect"): checks success, the stack and the return data
+- ethereum/tests VMTests (tests with "exec"): checks the output and the post storage, or that execution failed when
+  there is no "post" section
+- GeneralStateTests (tests with "transaction" and "post"): every post entry of the selected fork is a test case. The
+  post storage is checked when the fixture includes the post state (like execution-spec-tests fixtures do). smol-evm
+  doesn't charge gas or transfer value, so balances and nonces are not compared, and root-only fixtures are skipped.
+
+Fixture files are sharded across worker processes, and loaded one at a time by the worker that runs them. Results are
+cached per (fixture hash, interpreter version), where the version includes a digest of the smol_evm sources: unchanged
+tests are skipped on reruns, and any change to the interpreter invalidates the cache.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import __version__
+from .codecache import CODE_REGISTRY
+from .context import AccountState, Storage, WorldState
+from .runner import EXECUTION_ERRORS, ExecutionLimitReached, run
+
+DEFAULT_MAX_STEPS = 1_000_000
+DEFAULT_FORKS = ("Prague", "Cancun", "Shanghai", "Merge", "Paris", "London", "Berlin", "Istanbul")
+
+
+@dataclass
+class CaseResult:
+    name: str
+    fixture_hash: str
+    status: str  # "pass", "fail" or "skip"
+    reason: str = ""
+    opcodes: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    cached: bool = False
+
+
+@dataclass
+class ConformanceReport:
+    results: List[CaseResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(result.status == status for result in self.results)
+
+    @property
+    def execution_time(self) -> float:
+        """time spent executing the tests that actually ran (not cached)"""
+        return sum(result.seconds for result in self.results if not result.cached)
+
+    def opcode_failures(self) -> Counter:
+        """opcode -> number of failing tests that involve it"""
+        return Counter(opcode for result in self.results if result.status == "fail" for opcode in result.opcodes)
+
+    def summary(self, top: int = 20) -> str:
+        cached = sum(result.cached for result in self.results)
+        lines = [
+            f"tests: {len(self.results)} ({cached} cached)",
+            f"passed: {self.count('pass')}, failed: {self.count('fail')}, skipped: {self.count('skip')}",
+            f"execution time: {self.execution_time:.3f}s, wall time: {self.wall_time:.3f}s",
+        ]
+
+        failures = self.opcode_failures()
+        if failures:
+            lines.append("failures per opcode:")
+            lines.extend(f"  {opcode:<16} {count}" for opcode, count in failures.most_common(top))
+        return "\n".join(lines)
+
+
+def interpreter_version() -> str:
+    """the package version, plus a digest of the interpreter sources"""
+    digest = hashlib.sha256()
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith(".py"):
+            with open(os.path.join(package_dir, name), "rb") as f:
+                digest.update(f.read())
+    return f"{__version__}+{digest.hexdigest()[:12]}"
+
+
+def fixture_hash(test) -> str:
+    return hashlib.sha256(json.dumps(test, sort_keys=True).encode()).hexdigest()
+
+
+def _int(value) -> int:
+    if value is None or value == "":
+        return 0
+    if isinstance(value, int):
+        return value
+    return int(value, 16) if value.startswith("0x") else int(value)
+
+
+def _bytes(value) -> bytes:
+    if isinstance(value, dict):
+        # evm-from-scratch: {"asm": ..., "bin": ...}
+        value = value.get("bin", "")
+    value = value or ""
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+def _world_state(accounts: Optional[dict]) -> WorldState:
+    return WorldState(
+        {
+            _int(address): AccountState(
+                nonce=_int(account.get("nonce")),
+                balance=_int(account.get("balance")),
+                code=_bytes(account.get("code")),
+                storage=Storage({_int(k): _int(v) for k, v in account.get("storage", {}).items() if _int(v)}),
+            )
+            for address, account in (accounts or {}).items()
+        }
+    )
+
+
+def _opcodes(code: bytes) -> List[str]:
+    return sorted({instruction.name for instruction in CODE_REGISTRY.get(code).program.values()})
+
+
+def _execute(code: bytes, max_steps: int, **kwargs):
+    """returns (context or None, error message or None)"""
+    try:
+        return run(code, max_steps=max_steps, **kwargs), None
+    except ExecutionLimitReached:
+        return None, f"step limit of {max_steps} reached"
+    except EXECUTION_ERRORS as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _storage_mismatch(world_state: WorldState, expected_accounts: dict) -> Optional[str]:
+    for address, expected in expected_accounts.items():
+        account = world_state.find(_int(address))
+        actual = {k: v for k, v in account.storage.data.items() if v} if account is not None else {}
+        wanted = {_int(k): _int(v) for k, v in expected.get("storage", {}).items() if _int(v)}
+        if actual != wanted:
+            return f"storage of {address}: expected {wanted}, got {actual}"
+    return None
+
+
+def _check_evm_from_scratch(test: dict, max_steps: int) -> Tuple[str, str, bytes]:
+    code = _bytes(test["code"])
+    tx = test.get("tx", {})
+    expect = test.get("expect", {})
+    context, error = _execute(
+        code,
+        max_steps,
+        calldata=_bytes(tx.get("data")),
+        world_state=_world_state(test.get("state")),
+        address=_int(tx.get("to")),
+        caller=_int(tx.get("from")),
+        callvalue=_int(tx.get("value")),
+    )
+
+    success = context is not None and bool(context.success)
+    if "success" in expect and success != expect["success"]:
+        return "fail", f"expected success={expect['success']}, got {error or context.reason or success}", code
+
+    if expect.get("logs"):
+        return "skip", "logs are not supported", code
+
+    if success:
+        stack = list(reversed(context.stack.stack))
+        expected_stack = [_int(x) for x in expect.get("stack", [])]
+        if "stack" in expect and stack != expected_stack:
+            return "fail", f"expected stack {expected_stack}, got {stack}", code
+
+        if "return" in expect and context.returndata != _bytes(expect["return"]):
+            return "fail", f"expected return {expect['return']}, got 0x{context.returndata.hex()}", code
+
+    return "pass", "", code
+
+
+def _check_vm_test(test: dict, max_steps: int) -> Tuple[str, str, bytes]:
+    execution = test["exec"]
+    code = _bytes(execution["code"])
+    world_state = _world_state(test.get("pre"))
+    context, error = _execute(
+        code,
+        max_steps,
+        calldata=_bytes(execution.get("data")),
+        world_state=world_state,
+        address=_int(execution.get("address")),
+        caller=_int(execution.get("caller")),
+        callvalue=_int(execution.get("value")),
+    )
+
+    if "post" not in test:
+        # no post state means an exceptional halt is expected
+        if context is not None and context.success:
+            return "fail", "expected an exceptional halt", code
+        return "pass", "", code
+
+    if context is None or not context.success:
+        return "fail", error or context.reason or "execution failed", code
+
+    if "out" in test and context.returndata != _bytes(test["out"]):
+        return "fail", f"expected output {test['out']}, got 0x{context.returndata.hex()}", code
+
+    mismatch = _storage_mismatch(world_state, test["post"])
+    return ("fail", mismatch, code) if mismatch else ("pass", "", code)
+
+
+def _state_cases(name: str, test: dict, forks: Sequence[str]) -> Iterator[Tuple[str, dict]]:
+    post = test["post"]
+    fork = next((fork for fork in forks if fork in post), None) or next(iter(post), None)
+    for entry in post.get(fork, []) if fork else []:
+        indexes = entry.get("indexes", {})
+        yield f"{name}[{fork}:{indexes.get('data', 0)}-{indexes.get('gas', 0)}-{indexes.get('value', 0)}]", entry
+
+
+def _check_state_test(test: dict, entry: dict, max_steps: int) -> Tuple[str, str, bytes]:
+    tx = test["transaction"]
+    if not tx.get("to"):
+        return "skip", "contract creation is not supported", b""
+
+    indexes = entry.get("indexes", {})
+    world_state = _world_state(test.get("pre"))
+    target = world_state.find(_int(tx["to"]))
+    code = target.code if target is not None else bytes()
+
+    context, error = _execute(
+        code,
+        max_steps,
+        calldata=_bytes(tx["data"][indexes.get("data", 0)]),
+        world_state=world_state,
+        address=_int(tx["to"]),
+        caller=_int(tx.get("sender")),
+        callvalue=_int(tx["value"][indexes.get("value", 0)]),
+    )
+
+    if entry.get("expectException"):
+        return (
+            ("pass", "", code) if context is None or not context.success else ("fail", "expected an exception", code)
+        )
+
+    if "state" not in entry:
+        return "skip", "the fixture only has the state root, which depends on gas accounting", code
+
+    mismatch = _storage_mismatch(world_state, entry["state"])
+    return ("fail", mismatch, code) if mismatch else ("pass", "", code)
+
+
+def load_cases(path: str, forks: Sequence[str] = DEFAULT_FORKS) -> Iterator[Tuple[str, str, object]]:
+    """yields (name, kind, case) for every test case in a fixture file"""
+    with open(path) as f:
+        fixtures = json.load(f)
+
+    if isinstance(fixtures, list):
+        for i, test in enumerate(fixtures):
+            yield f"{os.path.basename(path)}#{i} {test.get('name', '')}".strip(), "evm", test
+        return
+
+    for name, test in fixtures.items():
+        if "exec" in test:
+            yield name, "vm", test
+        elif "transaction" in test and "post" in test:
+            for case, entry in _state_cases(name, test, forks):
+                yield case, "state", (test, entry)
+
+
+def run_case(name: str, kind: str, case, max_steps: int = DEFAULT_MAX_STEPS) -> CaseResult:
+    start = time.perf_counter()
+    try:
+        if kind == "evm":
+            status, reason, code = _check_evm_from_scratch(case, max_steps)
+        elif kind == "vm":
+            status, reason, code = _check_vm_test(case, max_steps)
+        else:
+            status, reason, code = _check_state_test(case[0], case[1], max_steps)
+    except (KeyError, ValueError, TypeError) as e:
+        status, reason, code = "skip", f"malformed fixture: {type(e).__name__}: {e}", b""
+
+    seconds = time.perf_counter() - start
+    opcodes = _opcodes(code) if status == "fail" and code else []
+    return CaseResult(name, fixture_hash(case), status, reason, opcodes, seconds)
+
+
+# the state of the worker processes, set once by the pool initializer
+_worker = None
+
+
+def _init_worker(cache: Dict[str, dict], forks: Sequence[str], max_steps: int) -> None:
+    global _worker
+    _worker = (cache, forks, max_steps)
+
+
+def _run_file(path: str) -> List[CaseResult]:
+    cache, forks, max_steps = _worker
+    results = []
+    for name, kind, case in load_cases(path, forks):
+        cached = cache.get(fixture_hash(case))
+        if cached is not None:
+            results.append(CaseResult(**dict(cached, name=name, cached=True)))
+        else:
+            results.append(run_case(name, kind, case, max_steps))
+    return results
+
+
+def find_fixtures(paths: Sequence[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(".json"))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def load_cache(path: Optional[str], version: str) -> Dict[str, dict]:
+    """fixture hash -> result, for this interpreter version only"""
+    if path is None or not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        cache = json.load(f)
+    return cache.get(version, {})
+
+
+def save_cache(path: str, version: str, results: Sequence[CaseResult]) -> None:
+    """adds the results to the cached ones of this version, older versions are dropped (they can't be hit anymore)"""
+    entries = load_cache(path, version)
+    entries.update({r.fixture_hash: dict(asdict(r), cached=False) for r in results})
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({version: entries}, f)
+    os.replace(tmp, path)
+
+
+def run_conformance(
+    paths: Sequence[str],
+    processes: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    forks: Sequence[str] = DEFAULT_FORKS,
+    max_steps: int = DEFAULT_MAX_STEPS,
+) -> ConformanceReport:
+    """
+    Runs all the fixtures found in paths (files or directories), sharded by file across worker processes.
+
+    processes=1 runs everything in the current process. With cache_path, results are cached across runs.
+    """
+    start = time.perf_counter()
+    version = interpreter_version()
+    cache = load_cache(cache_path, version)
+    files = find_fixtures(paths)
+
+    initargs = (cache, tuple(forks), max_steps)
+    report = ConformanceReport()
+    if processes == 1:
+        _init_worker(*initargs)
+        for path in files:
+            report.results.extend(_run_file(path))
+    else:
+        with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            for results in pool.imap_unordered(_run_file, files):
+                report.results.extend(results)
+
+    report.results.sort(key=lambda result: result.name)
+    if cache_path is not None:
+        save_cache(cache_path, version, report.results)
+
+    report.wall_time = time.perf_counter() - start
+    return report
@@ -1,4 +1,7 @@
-from .constants import is_valid_uint256
+from dataclasses import dataclass
+
+from .codecache import CODE_REGISTRY
+from .constants import MAX_CALL_DEPTH, is_valid_uint256
 from .memory import Memory
 from .stack import Stack
 
@@ -52,21 +55,76 @@ class Calldata:
         return len(self.data)
 
 
+@dataclass
+class Message:
+    """a pending message call, created by the CALL family of instructions and executed by the runner"""
+
+    # name of the instruction that created the message, e.g. "DELEGATECALL"
+    kind: str
+    caller: int
+
+    # the account whose storage and address the callee runs with
+    address: int
+
+    # the account whose code is executed (differs from address for DELEGATECALL)
+    code_address: int
+    value: int
+    calldata: bytes
+    ret_offset: int
+    ret_size: int
+    is_static: bool
+
+
 class ExecutionContext:
-    def __init__(self, code=bytes(), pc=0, stack=None, memory=None, calldata=None, storage=None) -> None:
+    def __init__(
+        self,
+        code=bytes(),
+        pc=0,
+        stack=None,
+        memory=None,
+        calldata=None,
+        storage=None,
+        address=0,
+        caller=0,
+        callvalue=0,
+        world_state=None,
+        depth=0,
+        is_static=False,
+        journal=None,
+        analysis=None,
+    ) -> None:
         self.code = code
-        self.stack = stack if stack else Stack()
-        self.memory = memory if memory else Memory()
+        self.stack = stack if stack is not None else Stack()
+        self.memory = memory if memory is not None else Memory()
         self.pc = pc
         self.success = None
         self.returndata = bytes()
-        self.jumpdests = valid_jump_destinations(code)
+        # shared analysis from the code registry if we have it, otherwise compute the jumpdests for this context only
+        self.jumpdests = analysis.jumpdests if analysis is not None else valid_jump_destinations(code)
         self.calldata = calldata if calldata else Calldata()
-        self.storage = storage if storage else Storage()
+        self.storage = storage if storage is not None else Storage()
 
         # human-readable reason for stopping execution
         self.reason = None
 
+        self.address = address
+        self.caller = caller
+        self.callvalue = callvalue
+        self.world_state = world_state
+
+        # number of message calls between this context and the top-level one
+        self.depth = depth
+        self.is_static = is_static
+
+        # returndata of the last message call made from this context (see RETURNDATASIZE)
+        self.last_returndata = bytes()
+
+        # set by the CALL family of instructions, the runner then executes the message in a new context
+        self.message = None
+
+        # (storage, slot, previous value) for every SSTORE in this transaction, shared by all the nested contexts
+        self.journal = journal if journal is not None else []
+
     def set_return_data(self, offset: int, length: int) -> None:
         self.success = True
         self.returndata = self.memory.load_range(offset, length)
@@ -93,6 +151,22 @@ class ExecutionContext:
         self.pc += num_bytes
         return value
 
+    def sstore(self, slot: int, value: int) -> None:
+        """writes to storage, journaling the previous value so that a failed call can be rolled back"""
+        if self.is_static:
+            self.stop(success=False, reason="SSTORE in a static context")
+            return
+
+        self.journal.append((self.storage, slot, self.storage.get(slot)))
+        self.storage.put(slot, value)
+
+    def revert_journal(self, checkpoint: int) -> None:
+        """undoes all the storage writes made since the journal had `checkpoint` entries"""
+        journal = self.journal
+        while len(journal) > checkpoint:
+            storage, slot, value = journal.pop()
+            storage.put(slot, value)
+
     def set_program_counter(self, pc: int) -> None:
         self.pc = pc
 
@@ -104,8 +178,8 @@ class ExecutionContext:
 
 
 class Storage:
-    def __init__(self, init=dict()) -> None:
-        self.data = init
+    def __init__(self, init=None) -> None:
+        self.data = init if init is not None else {}
 
     def get(self, slot):
         if not is_valid_uint256(slot):
@@ -129,6 +203,15 @@ class AccountState:
         self.storage = storage if storage else Storage()
         self.code = code
 
+    @property
+    def code(self) -> bytes:
+        return self.code_handle.code
+
+    @code.setter
+    def code(self, code: bytes) -> None:
+        # accounts with the same code share a single analysis
+        self.code_handle = CODE_REGISTRY.get(code)
+
     def is_empty(self):
         return self.nonce == 0 and self.balance == 0 and self.code == b""
 
@@ -137,12 +220,16 @@ class AccountState:
 
 
 class WorldState:
-    def __init__(self, accounts=dict()) -> None:
-        self.accounts = accounts
+    def __init__(self, accounts=None) -> None:
+        self.accounts = accounts if accounts is not None else {}
 
     def get(self, address):
         return self.accounts[address]
 
+    def find(self, address):
+        """like get(), but returns None for unknown accounts"""
+        return self.accounts.get(address)
+
     def set(self, address, account):
         self.accounts[address] = account
 
@@ -151,3 +238,28 @@ class WorldState:
 
     def __repr__(self):
         return str(self)
+
+
+class FramePool:
+    """
+    Recycles the stack and memory of finished call frames, so that call-heavy transactions don't allocate new ones
+    on every message call.
+    """
+
+    def __init__(self, max_size=MAX_CALL_DEPTH) -> None:
+        self.max_size = max_size
+        self.free = []
+
+    def acquire(self):
+        """returns an empty (stack, memory) pair"""
+        if self.free:
+            return self.free.pop()
+        return Stack(), Memory()
+
+    def release(self, stack: Stack, memory: Memory) -> None:
+        if len(self.free) >= self.max_size:
+            return
+
+        stack.stack.clear()
+        memory.memory.clear()
+        self.free.append((stack, memory))
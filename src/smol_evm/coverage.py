@@ -0,0 +1,198 @@
+"""
+AFL-style edge coverage, collected across many runs.
+
+Only the JUMP and JUMPI handlers of the dispatch table are wrapped (see `Hooks.wrap`), every other instruction runs at
+full speed. Each taken jump is an edge between two basic blocks, identified by (pc of the jump, destination), and is
+counted in a fixed-size bytearray, at (location(src) >> 1) ^ location(dst) like in AFL. Collisions are possible, and
+accepted, for the same reasons.
+
+After each run, the hit counts are classified into AFL's buckets (1, 2, 3, 4-7, 8-15, 16-31, 32-127, 128+), one bit
+per bucket, and OR-ed into the total map. Merging maps from other runs or processes is a single OR over the bytes.
+
+The edges of all the code that runs, including the contracts it calls, share the same map. Reports map the edges back
+to the instructions of the code: a basic block is covered if execution entered it, either through a covered edge or by
+falling through from a covered block. Blocks that fail halfway are reported as fully covered.
+"""
+
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Set, Tuple, Union
+
+from .codecache import CODE_REGISTRY, TERMINATING
+from .hooks import Hooks
+from .opcodes import JUMP, JUMPI
+from .runner import run
+
+MAP_SIZE = 1 << 16
+
+# hit count -> AFL bucket bit
+BUCKETS = bytes([0, 1, 2, 4] + [8] * 4 + [16] * 8 + [32] * 16 + [64] * 96 + [128] * 128)
+
+
+def _location(pc: int) -> int:
+    return (pc * 0x9E3779B1) >> 16
+
+
+def edge_index(src: int, dst: int, map_size: int = MAP_SIZE) -> int:
+    """map_size must be a power of 2"""
+    return ((_location(src) >> 1) ^ _location(dst)) & (map_size - 1)
+
+
+class EdgeCoverage:
+    def __init__(self, map_size: int = MAP_SIZE, hooks: Optional[Hooks] = None) -> None:
+        if map_size & (map_size - 1):
+            raise ValueError(f"the map size must be a power of 2, got {map_size}")
+
+        self.map_size = map_size
+        self.zero = bytes(map_size)
+
+        # hit counts of the current run, and buckets seen across all runs
+        self.trace = bytearray(map_size)
+        self.total = bytearray(map_size)
+        self.runs = 0
+
+        # whether the last run had new bits
+        self.new = False
+
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.hooks.wrap([JUMP, JUMPI], self._wrap)
+
+    def _wrap(self, handler):
+        trace = self.trace
+        mask = self.map_size - 1
+
+        def jump(ctx, stack, pc):
+            target = handler(ctx, stack, pc)
+
+            # invalid jumps stop the context and don't go anywhere
+            if ctx.success is None:
+                i = ((_location(pc - 1) >> 1) ^ _location(target)) & mask
+                if trace[i] < 255:
+                    trace[i] += 1
+            return target
+
+        return jump
+
+    def run(self, code: bytes, **kwargs):
+        """
+        Runs the code with coverage, kwargs are passed to `run`.
+
+        Returns (context, new) where new is True if the run hit edges (or hit counts) never seen before. The coverage
+        of runs that raise is recorded too, and `self.new` is set for them as well.
+        """
+        self.trace[:] = self.zero
+        try:
+            context = run(code, hooks=self.hooks, **kwargs)
+        finally:
+            self.runs += 1
+            self.new = self.merge(self.trace.translate(BUCKETS))
+
+        return context, self.new
+
+    def merge(self, other: Union[bytes, bytearray, "EdgeCoverage"]) -> bool:
+        """ORs classified buckets into the total map, returns True if they contained new bits"""
+        if isinstance(other, EdgeCoverage):
+            other = other.total
+
+        if len(other) != self.map_size:
+            raise ValueError(f"can't merge a map of size {len(other)} into a map of size {self.map_size}")
+
+        total = int.from_bytes(self.total, "little")
+        merged = total | int.from_bytes(other, "little")
+        if merged == total:
+            return False
+
+        self.total[:] = merged.to_bytes(self.map_size, "little")
+        return True
+
+    def edge_count(self) -> int:
+        return self.map_size - self.total.count(0)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.total)
+
+    def load(self, path: str) -> bool:
+        """merges a map saved by another process"""
+        with open(path, "rb") as f:
+            return self.merge(f.read())
+
+    def covers(self, src: int, dst: int) -> bool:
+        return self.total[edge_index(src, dst, self.map_size)] != 0
+
+    def covered_edges(self, code: bytes) -> List[Tuple[int, int]]:
+        return [edge for edge in static_edges(code) if self.covers(*edge)]
+
+    def covered_pcs(self, code: bytes) -> Set[int]:
+        """the pcs of the instructions in the basic blocks entered by execution"""
+        analysis = CODE_REGISTRY.get(code)
+        program = analysis.program
+        pcs = list(program)
+        entered = {dst for _, dst in self.covered_edges(code)}
+
+        covered = set()
+        falls_through = self.runs > 0
+        for start, end in analysis.basic_blocks:
+            block = pcs[bisect_left(pcs, start) : bisect_left(pcs, end)]
+            if not block:
+                continue
+
+            if falls_through or start in entered:
+                covered.update(block)
+                falls_through = program[block[-1]].name not in TERMINATING
+            else:
+                falls_through = False
+
+        return covered
+
+    def report(self, code: bytes, lines: Iterable[str]) -> List[str]:
+        """
+        Annotates disassembly lines (`disasm.disassemble(code)`), instructions that were never executed are marked
+        with ####, like gcov does. The last line is a summary.
+        """
+        program = CODE_REGISTRY.get(code).program
+        covered = self.covered_pcs(code)
+        edges = static_edges(code)
+
+        annotated = []
+        instructions = executed = 0
+        for line in lines:
+            pc, _, text = line.partition(": ")
+            pc = int(pc, 16)
+            if pc in program and not text.startswith("DATA"):
+                instructions += 1
+                executed += pc in covered
+                annotated.append(f"{'    ' if pc in covered else '####'} {line}")
+            else:
+                annotated.append(f"     {line}")
+
+        annotated.append(
+            f"instructions: {executed}/{instructions}, "
+            f"edges: {sum(self.covers(*edge) for edge in edges)}/{len(edges)}, runs: {self.runs}"
+        )
+        return annotated
+
+
+def static_edges(code: bytes) -> List[Tuple[int, int]]:
+    """
+    The possible edges of the code: the fallthrough of every JUMPI, and the jump targets, which are the pushed value
+    for PUSH + JUMP(I) sequences, or every JUMPDEST otherwise.
+    """
+    analysis = CODE_REGISTRY.get(code)
+    jumpdests = sorted(analysis.jumpdests)
+
+    edges = []
+    previous = None
+    for pc, instruction in analysis.program.items():
+        if instruction.name in ("JUMP", "JUMPI"):
+            if previous is not None and previous.is_push() and previous.operands:
+                targets = [previous.operands[0].value] if previous.operands[0].value in analysis.jumpdests else []
+            else:
+                targets = jumpdests
+
+            if instruction.name == "JUMPI":
+                edges.append((pc, pc + 1))
+            edges.extend((pc, target) for target in targets if instruction.name == "JUMP" or target != pc + 1)
+
+        previous = instruction
+
+    return edges
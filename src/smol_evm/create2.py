@@ -0,0 +1,890 @@
+"""
+A CREATE2 vanity address search engine.
+
+The address of a contract deployed with CREATE2 is the last 20 bytes of
+
+    keccak256(0xff ++ deployer ++ salt ++ keccak256(init_code))
+
+i.e. the hash of an 85-byte preimage where only the 32-byte salt changes. Each worker preallocates the preimage once
+and writes the salt in place, then hashes it with the raw keccak function of pycryptodome (reset, absorb, digest on a
+reused state) instead of building a hex string and a new hash object per salt.
+
+Patterns are compiled to the leading bytes of the address, and a mask and value over the rest of it, that are checked
+against the raw digest: most candidates are rejected by a single `bytes.startswith`. Addresses are only checksummed
+for hits, and only to check mixed-case patterns.
+
+Pattern syntax, case-insensitive unless the pattern has both lower and upper case letters (then it must match the
+EIP-55 checksummed address):
+
+    c0ffee                  the address starts with c0ffee
+    *c0ffee                 the address ends with c0ffee
+    dead*beef               both
+    00??????00              ? matches any nibble
+    ~c0ffee                 the address contains c0ffee
+    score:leading-zeros     the most leading zero nibbles
+    score:zero-bytes        the most zero bytes (cheaper calldata)
+
+Any number of patterns can be searched at once, every digest is tested against all of them in a single pass (see
+`Matcher`). Scores never stop a search, the best address so far is kept for each of them.
+
+The salts are partitioned into numbered chunks (see `SearchSpec`), that are spread across a process pool like
+`smol_evm.fuzz` does with inputs. Searches can be stopped and resumed: the chunks are claimed from a source that
+records the completed ones and the hits,
+
+- `LocalChunks`: a checkpoint file
+- `DirectoryChunks`: a directory shared by several machines, claims are files created exclusively
+- `RemoteChunks`: a `Coordinator` serving the chunks over TCP, which keeps the checkpoint
+"""
+
+import asyncio
+import ctypes
+import json
+import os
+import re
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from Crypto.Hash import keccak as _keccak
+from eth_utils import keccak, to_checksum_address
+
+PREIMAGE_SIZE = 85
+SALT_OFFSET = 21
+CODE_HASH_OFFSET = 53
+
+ADDRESS_OFFSET = 12
+ADDRESS_NIBBLES = 40
+
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+# seconds before a claimed chunk that was not completed is handed out again
+DEFAULT_LEASE = 600.0
+DEFAULT_COORDINATOR_PORT = 8546
+
+HEX_DIGITS = "0123456789abcdef"
+
+
+class InvalidPattern(Exception): ...
+
+
+def init_code_hash(init_code: bytes) -> bytes:
+    return keccak(init_code)
+
+
+def preimage(deployer: bytes, code_hash: bytes, salt: int = 0) -> bytearray:
+    buffer = bytearray(PREIMAGE_SIZE)
+    buffer[0] = 0xFF
+    buffer[1:SALT_OFFSET] = deployer
+    buffer[SALT_OFFSET:CODE_HASH_OFFSET] = salt.to_bytes(32, "big")
+    buffer[CODE_HASH_OFFSET:] = code_hash
+    return buffer
+
+
+def create2_address(deployer: bytes, salt: int, code_hash: bytes) -> str:
+    """the checksummed address, code_hash is `init_code_hash(init_code)`"""
+    return to_checksum_address(keccak(preimage(deployer, code_hash, salt))[ADDRESS_OFFSET:])
+
+
+def hasher(buffer: bytearray) -> Callable[[], bytes]:
+    """
+    Returns a function that hashes the current content of the buffer, with a keccak state that is allocated once.
+    Falls back to `keccak.new` if pycryptodome doesn't expose its raw ctypes library (e.g. with the cffi backend).
+    """
+    lib = getattr(_keccak, "_raw_keccak_lib", None)
+    if not isinstance(lib, ctypes.CDLL) or not hasattr(lib, "keccak_reset"):
+        new = _keccak.new
+        return lambda: new(data=buffer, digest_bits=256).digest()
+
+    from Crypto.Util._raw_api import SmartPointer, VoidPointer
+
+    state = VoidPointer()
+    if lib.keccak_init(state.address_of(), ctypes.c_size_t(64), ctypes.c_ubyte(24)):
+        raise RuntimeError("failed to initialize keccak")
+    state = SmartPointer(state.get(), lib.keccak_destroy)
+
+    data = (ctypes.c_ubyte * len(buffer)).from_buffer(buffer)
+    size, digest_size, padding = ctypes.c_size_t(len(buffer)), ctypes.c_size_t(32), ctypes.c_ubyte(1)
+    out = ctypes.create_string_buffer(32)
+    reset, absorb, squeeze = lib.keccak_reset, lib.keccak_absorb, lib.keccak_digest
+
+    def digest() -> bytes:
+        handle = state.get()
+        reset(handle)
+        absorb(handle, data, size)
+        squeeze(handle, out, digest_size, padding)
+        return out.raw
+
+    return digest
+
+
+class Pattern:
+    """a compiled pattern, see the module docstring for the syntax"""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        source = text[2:] if text.lower().startswith("0x") else text
+        if source.count("*") > 1:
+            raise InvalidPattern(f"{text}: at most one * is allowed")
+
+        prefix, _, suffix = source.partition("*")
+        if "*" not in source:
+            suffix = ""
+        if len(prefix) + len(suffix) > ADDRESS_NIBBLES:
+            raise InvalidPattern(f"{text}: longer than an address")
+
+        for char in prefix + suffix:
+            if char.lower() not in HEX_DIGITS and char != "?":
+                raise InvalidPattern(f"{text}: invalid character {char!r}")
+
+        # the pattern as 40 nibbles, None for any nibble
+        nibbles = [None] * ADDRESS_NIBBLES
+        for i, char in enumerate(prefix):
+            nibbles[i] = char
+        for i, char in enumerate(suffix):
+            nibbles[ADDRESS_NIBBLES - len(suffix) + i] = char
+        nibbles = [None if char in (None, "?") else char for char in nibbles]
+
+        # the leading bytes that are fully specified are checked with startswith, the other nibbles with the mask
+        lead = 0
+        while lead < ADDRESS_NIBBLES // 2 and None not in nibbles[2 * lead : 2 * lead + 2]:
+            lead += 1
+        self.lead = bytes.fromhex("".join(nibbles[: 2 * lead]))
+
+        self.mask = self.value = 0
+        for i, char in enumerate(nibbles[2 * lead :], start=2 * lead):
+            if char is not None:
+                shift = 4 * (ADDRESS_NIBBLES - 1 - i)
+                self.mask |= 0xF << shift
+                self.value |= int(char, 16) << shift
+
+        letters = [char for char in source if char.isalpha()]
+        mixed_case = any(char.islower() for char in letters) and any(char.isupper() for char in letters)
+        self.checksum = nibbles if mixed_case else None
+
+    def match(self, digest: bytes) -> bool:
+        """digest is the full 32-byte hash of the preimage"""
+        if not digest.startswith(self.lead, ADDRESS_OFFSET):
+            return False
+        if self.mask and int.from_bytes(digest[ADDRESS_OFFSET:], "big") & self.mask != self.value:
+            return False
+        if self.checksum is not None:
+            address = to_checksum_address(digest[ADDRESS_OFFSET:])[2:]
+            return all(char is None or char == actual for char, actual in zip(self.checksum, address))
+        return True
+
+    def __repr__(self) -> str:
+        return f"Pattern({self.text!r})"
+
+
+class Contains:
+    """a pattern that matches anywhere in the address: ~c0ffee, with the same case rules as `Pattern`"""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        source = text[1:]
+        if not source or len(source) > ADDRESS_NIBBLES:
+            raise InvalidPattern(f"{text}: expected 1 to {ADDRESS_NIBBLES} nibbles after ~")
+        for char in source:
+            if char.lower() not in HEX_DIGITS and char != "?":
+                raise InvalidPattern(f"{text}: invalid character {char!r}")
+
+        self.regex = source.lower().replace("?", ".")
+        letters = [char for char in source if char.isalpha()]
+        mixed_case = any(char.islower() for char in letters) and any(char.isupper() for char in letters)
+        self.checksum = re.compile(source.replace("?", ".")) if mixed_case else None
+        self.compiled = re.compile(self.regex)
+
+    def match(self, digest: bytes) -> bool:
+        if self.compiled.search(digest[ADDRESS_OFFSET:].hex()) is None:
+            return False
+        if self.checksum is not None:
+            return self.checksum.search(to_checksum_address(digest[ADDRESS_OFFSET:])) is not None
+        return True
+
+    def __repr__(self) -> str:
+        return f"Contains({self.text!r})"
+
+
+def _leading_zeros(digest: bytes) -> int:
+    return ADDRESS_NIBBLES - (int.from_bytes(digest[ADDRESS_OFFSET:], "big").bit_length() + 3) // 4
+
+
+def _above_leading_zeros(threshold: int) -> Callable[[bytes], bool]:
+    if threshold >= ADDRESS_NIBBLES:
+        return lambda value: False
+
+    lead, limit = bytes((threshold + 1) // 2), 1 << 4 * (ADDRESS_NIBBLES - threshold - 1)
+    return (
+        lambda value: value.startswith(lead, ADDRESS_OFFSET) and int.from_bytes(value[ADDRESS_OFFSET:], "big") < limit
+    )
+
+
+def _zero_bytes(digest: bytes) -> int:
+    return digest.count(0, ADDRESS_OFFSET)
+
+
+def _above_zero_bytes(threshold: int) -> Callable[[bytes], bool]:
+    return lambda value: value.count(0, ADDRESS_OFFSET) > threshold
+
+
+# name -> (score, above(threshold) -> a function that checks that the score of a digest is above the threshold)
+SCORES = {
+    "leading-zeros": (_leading_zeros, _above_leading_zeros),
+    "zero-bytes": (_zero_bytes, _above_zero_bytes),
+}
+
+
+class Score:
+    """
+    score:NAME, not a match but a score to maximize (see SCORES): the search reports every address that beats the
+    best score so far, and never stops because of it.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.name = text[len("score:") :]
+        if self.name not in SCORES:
+            raise InvalidPattern(f"{text}: unknown score, expected one of {', '.join(SCORES)}")
+        self.score, self.above = SCORES[self.name]
+
+    def __repr__(self) -> str:
+        return f"Score({self.text!r})"
+
+
+def compile_pattern(text: str):
+    if text.startswith("score:"):
+        return Score(text)
+    if text.startswith("~"):
+        return Contains(text)
+    return Pattern(text)
+
+
+@dataclass
+class Hit:
+    salt: int
+    address: str
+    pattern: str
+
+    # set for the hits of score patterns
+    score: Optional[int] = None
+
+    def __str__(self) -> str:
+        score = f", score {self.score}" if self.score is not None else ""
+        return f"salt=0x{self.salt:064x} address={self.address} ({self.pattern}{score})"
+
+
+def _matches(hits: Sequence[Hit]) -> List[Hit]:
+    """the hits that are not score improvements"""
+    return [hit for hit in hits if hit.score is None]
+
+
+def best_hits(hits: Sequence[Hit]) -> Dict[str, Hit]:
+    """pattern -> the first hit, or the hit with the highest score (the first one on ties)"""
+    best = {}
+    for hit in sorted(hits, key=lambda hit: hit.salt):
+        current = best.get(hit.pattern)
+        if current is None or (hit.score is not None and hit.score > current.score):
+            best[hit.pattern] = hit
+    return best
+
+
+class Matcher:
+    """
+    Tests a digest against all the patterns in a single pass. Anchored patterns are indexed by the first byte of their
+    lead (a one-level prefix trie), so a digest is only tested against the patterns that can match it, and the
+    contains patterns are merged into a single regex alternation over the hex address. Scores only pass when they are
+    above their threshold, the best score so far.
+    """
+
+    def __init__(self, patterns: Sequence, thresholds: Optional[Sequence[Optional[int]]] = None) -> None:
+        self.patterns = list(patterns)
+        self.thresholds = list(thresholds) if thresholds is not None else [None] * len(self.patterns)
+        self.compile()
+
+    def compile(self) -> None:
+        # first byte -> the anchored patterns that start with it
+        by_byte = [[] for _ in range(256)]
+        checks, contains = [], []
+
+        for pattern, threshold in zip(self.patterns, self.thresholds):
+            if isinstance(pattern, Pattern) and pattern.lead:
+                by_byte[pattern.lead[0]].append(pattern.match)
+            elif isinstance(pattern, Contains):
+                contains.append(pattern.regex)
+            elif isinstance(pattern, Score):
+                checks.append(pattern.above(threshold if threshold is not None else -1))
+            else:
+                checks.append(pattern.match)
+
+        anchored = [match for matches in by_byte for match in matches]
+        if len(anchored) == 1:
+            checks.append(anchored[0])
+        elif anchored:
+            first_bytes = bytes(bool(matches) for matches in by_byte)
+            table = tuple(tuple(matches) for matches in by_byte)
+
+            def check(value):
+                return first_bytes[value[ADDRESS_OFFSET]] and any(
+                    match(value) for match in table[value[ADDRESS_OFFSET]]
+                )
+
+            checks.append(check)
+
+        if contains:
+            search = re.compile("|".join(contains)).search
+            checks.append(lambda value: search(value[ADDRESS_OFFSET:].hex()) is not None)
+
+        # chained with `or`, calling any() on a generator for every digest costs more than most checks
+        self.match = checks[0] if checks else lambda value: False
+        for check in checks[1:]:
+            self.match = _either(self.match, check)
+
+    def hits(self, salt: int, digest: bytes) -> List[Hit]:
+        """the hits of a digest that passed `match`, raises the thresholds of the scores it beats"""
+        hits = []
+        for i, pattern in enumerate(self.patterns):
+            if isinstance(pattern, Score):
+                score = pattern.score(digest)
+                if self.thresholds[i] is None or score > self.thresholds[i]:
+                    self.thresholds[i] = score
+                    hits.append(Hit(salt, to_checksum_address(digest[ADDRESS_OFFSET:]), pattern.text, score))
+            elif pattern.match(digest):
+                hits.append(Hit(salt, to_checksum_address(digest[ADDRESS_OFFSET:]), pattern.text))
+
+        if any(hit.score is not None for hit in hits):
+            self.compile()
+        return hits
+
+
+def _either(first: Callable[[bytes], bool], second: Callable[[bytes], bool]) -> Callable[[bytes], bool]:
+    return lambda value: first(value) or second(value)
+
+
+def search_salts(
+    deployer: bytes,
+    code_hash: bytes,
+    patterns: Sequence,
+    start: int,
+    count: int,
+    thresholds: Optional[Sequence[Optional[int]]] = None,
+) -> List[Hit]:
+    """
+    Hashes the salts in [start, start + count), returns the hits. thresholds are the best scores so far of the score
+    patterns (None for the other patterns), only the scores above them are hits.
+    """
+    buffer = preimage(deployer, code_hash, start)
+    digest = hasher(buffer)
+    pack_low = struct.Struct(">Q").pack_into
+    matcher = Matcher(patterns, thresholds)
+    hits = []
+
+    salt, stop = start, start + count
+    while salt < stop:
+        # only the low 8 bytes of the salt change within a 2**64 block
+        high = salt >> 64
+        buffer[SALT_OFFSET : SALT_OFFSET + 24] = high.to_bytes(24, "big")
+        block_stop = min(stop, (high + 1) << 64)
+
+        match = matcher.match
+        for low in range(salt & 0xFFFFFFFFFFFFFFFF, block_stop - (high << 64)):
+            pack_low(buffer, SALT_OFFSET + 24, low)
+            value = digest()
+            if match(value):
+                hits.extend(matcher.hits((high << 64) + low, value))
+                match = matcher.match
+
+        salt = block_stop
+
+    return hits
+
+
+def _hit_to_json(hit: Hit) -> dict:
+    data = {"salt": hex(hit.salt), "address": hit.address, "pattern": hit.pattern}
+    if hit.score is not None:
+        data["score"] = hit.score
+    return data
+
+
+def _hit_from_json(data: dict) -> Hit:
+    return Hit(salt=int(data["salt"], 16), address=data["address"], pattern=data["pattern"], score=data.get("score"))
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    """
+    What is searched, and how the salts are partitioned: chunk n covers the salts from start + n * chunk_size, up to
+    stop (exclusive, 0 for no limit). Checkpoints and coordinators refuse to mix chunks of different specs.
+    """
+
+    deployer: bytes
+    code_hash: bytes
+    patterns: Tuple[str, ...]
+    start: int = 0
+    stop: int = 0
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+
+    def has_chunk(self, chunk: int) -> bool:
+        return not self.stop or self.start + chunk * self.chunk_size < self.stop
+
+    def chunk_range(self, chunk: int) -> Tuple[int, int]:
+        """(first salt, number of salts)"""
+        start = self.start + chunk * self.chunk_size
+        return start, self.chunk_size if not self.stop else min(self.chunk_size, self.stop - start)
+
+    def to_json(self) -> dict:
+        return {
+            "deployer": f"0x{self.deployer.hex()}",
+            "code_hash": f"0x{self.code_hash.hex()}",
+            "patterns": list(self.patterns),
+            "start": hex(self.start),
+            "stop": hex(self.stop),
+            "chunk_size": self.chunk_size,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "SearchSpec":
+        return cls(
+            deployer=bytes.fromhex(data["deployer"][2:]),
+            code_hash=bytes.fromhex(data["code_hash"][2:]),
+            patterns=tuple(data["patterns"]),
+            start=int(data["start"], 16),
+            stop=int(data["stop"], 16),
+            chunk_size=data["chunk_size"],
+        )
+
+
+class InvalidCheckpoint(Exception): ...
+
+
+def _write_json(path: str, data) -> None:
+    """atomically, a search that is stopped halfway through a write keeps the previous version"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _ranges(chunks) -> List[List[int]]:
+    """sorted chunk numbers -> [[first, last]] of the consecutive runs"""
+    ranges = []
+    for chunk in chunks:
+        if ranges and ranges[-1][1] == chunk - 1:
+            ranges[-1][1] = chunk
+        else:
+            ranges.append([chunk, chunk])
+    return ranges
+
+
+class LocalChunks:
+    """
+    Hands out the chunks in order, skipping the completed ones. With a path, the completed chunks and the hits are
+    saved to a checkpoint file after every chunk, and loaded back when the search restarts.
+    """
+
+    def __init__(self, spec: SearchSpec, path: Optional[str] = None) -> None:
+        self.spec = spec
+        self.path = path
+        self.completed = set()
+        self.found = []
+        self.next = 0
+
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                checkpoint = json.load(f)
+            if SearchSpec.from_json(checkpoint["spec"]) != spec:
+                raise InvalidCheckpoint(f"{path} is the checkpoint of a different search")
+
+            for first, last in checkpoint["completed"]:
+                self.completed.update(range(first, last + 1))
+            self.found = [_hit_from_json(hit) for hit in checkpoint["hits"]]
+
+    def claim(self) -> Optional[int]:
+        while self.next in self.completed:
+            self.next += 1
+        if not self.spec.has_chunk(self.next):
+            return None
+
+        self.next += 1
+        return self.next - 1
+
+    def complete(self, chunk: int, hits: List[Hit]) -> None:
+        if chunk in self.completed:
+            return
+
+        self.completed.add(chunk)
+        self.found.extend(hits)
+        if self.path is not None:
+            checkpoint = {
+                "spec": self.spec.to_json(),
+                "completed": _ranges(sorted(self.completed)),
+                "hits": [_hit_to_json(hit) for hit in self.found],
+            }
+            _write_json(self.path, checkpoint)
+
+    def hits(self) -> List[Hit]:
+        return sorted(self.found, key=lambda hit: hit.salt)
+
+
+class DirectoryChunks:
+    """
+    Chunks shared through a directory (e.g. on a network file system) by any number of searches. A chunk is claimed
+    by creating chunk-N.claim exclusively, and completed by writing its hits to chunk-N.done. Claims that are not
+    completed within lease seconds (their search died) are taken over.
+    """
+
+    def __init__(self, directory: str, spec: SearchSpec, lease: float = DEFAULT_LEASE) -> None:
+        self.directory = directory
+        self.spec = spec
+        self.lease = lease
+        self.next = 0
+
+        # chunks that were claimed by other searches, checked again until they are done
+        self.pending = []
+
+        os.makedirs(directory, exist_ok=True)
+        spec_path = os.path.join(directory, "spec.json")
+        try:
+            with open(spec_path, "x") as f:
+                json.dump(spec.to_json(), f)
+        except FileExistsError:
+            with open(spec_path) as f:
+                if SearchSpec.from_json(json.load(f)) != spec:
+                    raise InvalidCheckpoint(f"{directory} is shared by a different search")
+
+    def _path(self, chunk: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"chunk-{chunk:012d}.{suffix}")
+
+    def _try_claim(self, chunk: int) -> Optional[bool]:
+        """True if claimed, False if claimed by another search, None if done"""
+        if os.path.exists(self._path(chunk, "done")):
+            return None
+
+        path = self._path(chunk, "claim")
+        try:
+            with open(path, "x") as f:
+                f.write(f"{socket.gethostname()} {os.getpid()}\n")
+            return True
+        except FileExistsError:
+            pass
+
+        try:
+            if time.time() - os.stat(path).st_mtime < self.lease:
+                return False
+            # the lease expired: at worst, two searches take over the same chunk and hash it twice
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            # completed in the meantime
+            return None
+
+    def claim(self) -> Optional[int]:
+        for chunk in list(self.pending):
+            claimed = self._try_claim(chunk)
+            if claimed is not False:
+                self.pending.remove(chunk)
+            if claimed:
+                return chunk
+
+        while self.spec.has_chunk(self.next):
+            chunk = self.next
+            self.next += 1
+            claimed = self._try_claim(chunk)
+            if claimed:
+                return chunk
+            if claimed is False:
+                self.pending.append(chunk)
+
+        return None
+
+    def complete(self, chunk: int, hits: List[Hit]) -> None:
+        _write_json(self._path(chunk, "done"), [_hit_to_json(hit) for hit in hits])
+        try:
+            os.remove(self._path(chunk, "claim"))
+        except FileNotFoundError:
+            pass
+
+    def hits(self) -> List[Hit]:
+        hits = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".done"):
+                with open(os.path.join(self.directory, name)) as f:
+                    hits.extend(_hit_from_json(hit) for hit in json.load(f))
+        return sorted(hits, key=lambda hit: hit.salt)
+
+
+class Coordinator:
+    """
+    Hands out chunks to searches on other machines over TCP, and keeps the checkpoint of the whole search. The protocol
+    is one JSON object per line, each request gets one response:
+
+        {"op": "spec"}                              -> the spec, see SearchSpec.to_json
+        {"op": "claim"}                             -> {"chunk": n}, or {"chunk": null} when the search is over
+        {"op": "complete", "chunk": n, "hits": []}  -> {}
+        {"op": "hits"}                              -> {"hits": [...]}
+
+    Chunks that are not completed within lease seconds are handed out again. The search is over when max_hits hits
+    were found (0 for no limit, score hits don't count), or when there are no chunks left.
+    """
+
+    def __init__(
+        self, spec: SearchSpec, checkpoint: Optional[str] = None, max_hits: int = 1, lease: float = DEFAULT_LEASE
+    ) -> None:
+        self.spec = spec
+        self.chunks = LocalChunks(spec, checkpoint)
+        self.max_hits = max_hits
+        self.lease = lease
+
+        # chunk -> deadline
+        self.leases = {}
+
+    def claim(self) -> Optional[int]:
+        if self.max_hits and len(_matches(self.chunks.found)) >= self.max_hits:
+            return None
+
+        now = time.monotonic()
+        chunk = next((chunk for chunk, deadline in self.leases.items() if deadline < now), None)
+        if chunk is None:
+            chunk = self.chunks.claim()
+
+        if chunk is not None:
+            self.leases[chunk] = now + self.lease
+        return chunk
+
+    def complete(self, chunk: int, hits: List[Hit]) -> None:
+        self.leases.pop(chunk, None)
+        self.chunks.complete(chunk, hits)
+
+    def handle_request(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "spec":
+            return self.spec.to_json()
+        if op == "claim":
+            return {"chunk": self.claim()}
+        if op == "complete":
+            self.complete(request["chunk"], [_hit_from_json(hit) for hit in request["hits"]])
+            return {}
+        if op == "hits":
+            return {"hits": [_hit_to_json(hit) for hit in self.chunks.hits()]}
+        return {"error": f"unknown op {op!r}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    response = self.handle_request(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"error": f"invalid request: {e}"}
+
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        except ConnectionError:
+            pass
+
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_COORDINATOR_PORT):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+def serve_coordinator(coordinator: Coordinator, host: str = "127.0.0.1", port: int = DEFAULT_COORDINATOR_PORT) -> None:
+    async def main():
+        async with await coordinator.start(host, port) as s:
+            print(f"coordinating on {host}:{port}")
+            await s.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+class RemoteChunks:
+    """the chunks of a `Coordinator`, the spec of the search comes from the coordinator"""
+
+    def __init__(self, host: str, port: int = DEFAULT_COORDINATOR_PORT) -> None:
+        self.connection = socket.create_connection((host, port))
+        self.file = self.connection.makefile("rwb")
+        self.spec = SearchSpec.from_json(self._request(op="spec"))
+
+    def _request(self, **request) -> dict:
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("the coordinator closed the connection")
+
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"coordinator error: {response['error']}")
+        return response
+
+    def claim(self) -> Optional[int]:
+        return self._request(op="claim")["chunk"]
+
+    def complete(self, chunk: int, hits: List[Hit]) -> None:
+        self._request(op="complete", chunk=chunk, hits=[_hit_to_json(hit) for hit in hits])
+
+    def hits(self) -> List[Hit]:
+        return [_hit_from_json(hit) for hit in self._request(op="hits")["hits"]]
+
+    def close(self) -> None:
+        self.file.close()
+        self.connection.close()
+
+
+@dataclass
+class SearchStats:
+    chunks: int = 0
+    hashes: int = 0
+    hits: List[Hit] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def hashes_per_second(self) -> float:
+        return self.hashes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def best(self) -> Dict[str, Hit]:
+        return best_hits(self.hits)
+
+    def __str__(self) -> str:
+        scores = "".join(f", best {hit.pattern}: {hit.score}" for hit in self.best.values() if hit.score is not None)
+        return (
+            f"chunks: {self.chunks}, hashes: {self.hashes} ({self.hashes_per_second:,.0f}/s), "
+            f"hits: {len(_matches(self.hits))}{scores}"
+        )
+
+
+# the state of the worker processes, set once by the pool initializer
+_worker = None
+
+
+def _init_worker(deployer: bytes, code_hash: bytes, patterns: Sequence) -> None:
+    global _worker
+    _worker = (deployer, code_hash, patterns)
+
+
+def _search_chunk(task: Tuple[int, int, int, List[Optional[int]]]) -> Tuple[int, int, List[Hit]]:
+    chunk, start, count, thresholds = task
+    return chunk, count, search_salts(*_worker, start, count, thresholds)
+
+
+def search_chunks(
+    spec: SearchSpec,
+    chunks,
+    patterns: Optional[Sequence] = None,
+    max_hits: int = 1,
+    processes: Optional[int] = None,
+    report: Optional[Callable[[SearchStats], None]] = None,
+    report_interval: float = 1.0,
+) -> SearchStats:
+    """
+    Searches the chunks claimed from chunks (`LocalChunks`, `DirectoryChunks` or `RemoteChunks`), until max_hits hits
+    were found by all the searches sharing them (0 for no limit), or there are no chunks left. The hits of score
+    patterns don't count. All the patterns are tested in a single pass over the salts (see `Matcher`), they are
+    compiled from the spec by default. processes=1 runs everything in the current process. `report(stats)` is called
+    every report_interval seconds, and at the end.
+
+    Chunks run in rounds, so a few more of them than needed can be searched. stats.hits has all the hits found so far,
+    including the ones of previous runs and other searches, sorted by salt: the first max_hits matches, and the
+    improvements of the scores. stats.best has the best hit of each pattern.
+    """
+    if patterns is None:
+        patterns = [compile_pattern(text) for text in spec.patterns]
+
+    stats = SearchStats(hits=chunks.hits())
+    begin = last_report = time.perf_counter()
+
+    initargs = (spec.deployer, spec.code_hash, list(patterns))
+    workers = processes or os.cpu_count() or 1
+    pool = Pool(workers, initializer=_init_worker, initargs=initargs) if workers != 1 else None
+    if pool is None:
+        _init_worker(*initargs)
+
+    try:
+        while not (max_hits and len(_matches(stats.hits)) >= max_hits):
+            # workers only report the scores that beat the best ones when the round starts
+            best = stats.best
+            thresholds = [
+                best[pattern.text].score if isinstance(pattern, Score) and pattern.text in best else None
+                for pattern in patterns
+            ]
+
+            # a couple of chunks per worker keeps them all busy
+            tasks = []
+            for _ in range(2 * workers):
+                chunk = chunks.claim()
+                if chunk is None:
+                    break
+                tasks.append((chunk, *spec.chunk_range(chunk), thresholds))
+
+            if not tasks:
+                break
+
+            if pool is not None:
+                results = pool.imap_unordered(_search_chunk, tasks)
+            else:
+                results = map(_search_chunk, tasks)
+
+            for chunk, hashes, hits in results:
+                chunks.complete(chunk, hits)
+                stats.chunks += 1
+                stats.hashes += hashes
+                stats.hits.extend(hits)
+
+                stats.elapsed = time.perf_counter() - begin
+                if report is not None and time.perf_counter() - last_report >= report_interval:
+                    report(stats)
+                    last_report = time.perf_counter()
+
+            stats.hits = chunks.hits()
+
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    stats.hits = chunks.hits()
+    if max_hits:
+        extra = _matches(stats.hits)[max_hits:]
+        stats.hits = [hit for hit in stats.hits if hit not in extra]
+    stats.elapsed = time.perf_counter() - begin
+    if report is not None:
+        report(stats)
+    return stats
+
+
+def search(
+    deployer: bytes,
+    code_hash: bytes,
+    patterns: Sequence,
+    start: int = 0,
+    max_hits: int = 1,
+    max_salts: int = 0,
+    checkpoint: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    **kwargs,
+) -> SearchStats:
+    """
+    Searches the salts from start on, until max_hits hits were found (0 for no limit) or max_salts salts were hashed
+    (0 for no limit). With a checkpoint path, a search that is stopped resumes from its completed chunks, the search
+    must then be restarted with the same arguments. kwargs are passed to `search_chunks`.
+    """
+    spec = SearchSpec(
+        deployer=deployer,
+        code_hash=code_hash,
+        patterns=tuple(pattern.text for pattern in patterns),
+        start=start,
+        stop=start + max_salts if max_salts else 0,
+        chunk_size=chunk_size,
+    )
+    return search_chunks(spec, LocalChunks(spec, checkpoint), patterns, max_hits, **kwargs)
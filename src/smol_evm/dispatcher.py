@@ -0,0 +1,168 @@
+"""
+Static extraction of function selectors from the dispatcher of a contract.
+
+Solidity and Vyper compile the external function dispatcher to a recognizable pattern:
+
+    PUSH1 0x00 CALLDATALOAD PUSH1 0xe0 SHR     # load the selector
+    DUP1 PUSH4 <selector> EQ PUSH2 <entry> JUMPI
+    DUP1 PUSH4 <selector> EQ PUSH2 <entry> JUMPI
+    ...
+
+Larger contracts split the selector space with a binary search (`DUP1 PUSH4 <pivot> GT PUSH2 <subtree> JUMPI`), but
+every leaf still ends up in the same `EQ` / `JUMPI` pattern, so a single linear pass over the decoded code finds them.
+"""
+
+from typing import Dict, Iterator, Optional, Tuple
+
+from .context import ExecutionContext, valid_jump_destinations
+from .opcodes import (
+    Instruction,
+    decode_opcode,
+    CALLDATALOAD,
+    DIV,
+    DUP1,
+    DUP16,
+    EQ,
+    JUMPI,
+    SHR,
+    SUB,
+    SWAP1,
+    SWAP16,
+    XOR,
+)
+
+SELECTOR_SHIFT = 0xE0
+SELECTOR_DIVISOR = 2**SELECTOR_SHIFT
+
+# how far after CALLDATALOAD we look for the instruction that isolates the selector
+SELECTOR_LOAD_WINDOW = 4
+
+
+def _decode(code: bytes) -> Iterator[Tuple[int, Instruction]]:
+    context = ExecutionContext(code=code)
+    while context.pc < len(code):
+        pc = context.pc
+
+        # increments pc by instruction length
+        yield pc, decode_opcode(context)
+
+
+def _is_stack_shuffle(insn: Instruction) -> bool:
+    return DUP1.opcode <= insn.opcode <= DUP16.opcode or SWAP1.opcode <= insn.opcode <= SWAP16.opcode
+
+
+def _push_value(insn: Instruction) -> Optional[int]:
+    return insn.operands[0].value if insn.is_push() and insn.operands else None
+
+
+def _is_selector_load(window) -> bool:
+    """returns true if the window starts with CALLDATALOAD and then shifts or divides the word down to 4 bytes"""
+    _, first = window[0]
+    if first.opcode != CALLDATALOAD.opcode:
+        return False
+
+    constants = set()
+    for _, insn in window[1:]:
+        value = _push_value(insn)
+        if value is not None:
+            constants.add(value)
+        elif insn.opcode == SHR.opcode and SELECTOR_SHIFT in constants:
+            return True
+        elif insn.opcode == DIV.opcode and SELECTOR_DIVISOR in constants:
+            return True
+
+    return False
+
+
+def _match_selector_jump(window) -> Optional[Tuple[int, int, bool]]:
+    """
+    Matches `PUSHn <selector> [DUPn|SWAPn] <EQ|XOR|SUB> PUSHn <target> JUMPI` at the end of the window.
+
+    Returns (selector, target, jumps_on_match) or None if the window does not end with this pattern.
+    """
+    if len(window) < 4:
+        return None
+
+    (_, jumpi), (_, push_target), (_, compare) = window[-1], window[-2], window[-3]
+    if jumpi.opcode != JUMPI.opcode:
+        return None
+
+    target = _push_value(push_target)
+    if target is None:
+        return None
+
+    if compare.opcode == EQ.opcode:
+        jumps_on_match = True
+    elif compare.opcode in (XOR.opcode, SUB.opcode):
+        # vyper style: jump away if the selector does *not* match, fall through into the function otherwise
+        jumps_on_match = False
+    else:
+        return None
+
+    # the selector is pushed right before the comparison, possibly followed by a stack shuffle
+    for _, insn in reversed(window[:-3][-2:]):
+        selector = _push_value(insn)
+        if selector is not None:
+            return (selector, target, jumps_on_match) if insn.push_width() <= 4 else None
+
+        if not _is_stack_shuffle(insn):
+            return None
+
+    return None
+
+
+def find_selectors(code: bytes) -> Optional[Dict[int, int]]:
+    """
+    Returns a mapping of function selector -> entry pc, or None if no dispatcher could be recognized.
+
+    A None result means the dispatcher is missing or obfuscated, callers should fall back to dynamic exploration.
+    """
+    jumpdests = valid_jump_destinations(code)
+    selectors = {}
+    window = []
+    seen_selector_load = False
+
+    # function bodies come after the dispatcher, so we can stop at the first entry point we know about
+    dispatcher_end = len(code)
+
+    # vyper style dispatchers inline each function body between the checks, we skip over them
+    resume_at = 0
+
+    for pc, insn in _decode(code):
+        if pc >= dispatcher_end:
+            break
+
+        if pc < resume_at:
+            continue
+
+        window.append((pc, insn))
+        if len(window) > SELECTOR_LOAD_WINDOW + 2:
+            window.pop(0)
+
+        if not seen_selector_load:
+            if len(window) > SELECTOR_LOAD_WINDOW:
+                seen_selector_load = _is_selector_load(window[-SELECTOR_LOAD_WINDOW - 1 :])
+            continue
+
+        match = _match_selector_jump(window)
+        if match is None:
+            continue
+
+        selector, target, jumps_on_match = match
+        if target not in jumpdests:
+            continue
+
+        if jumps_on_match:
+            selectors.setdefault(selector, target)
+            dispatcher_end = min(dispatcher_end, target)
+        else:
+            # the function body starts right after the JUMPI, the next check is at the jump target
+            selectors.setdefault(selector, pc + 1)
+            if target > pc:
+                resume_at = target
+                window.clear()
+
+    if not seen_selector_load or not selectors:
+        return None
+
+    return selectors
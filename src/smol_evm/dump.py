@@ -0,0 +1,188 @@
+"""
+Lazy "fork mode" from a local state dump, for replaying historical transactions without network access.
+
+Both formats written by `geth dump` are supported:
+
+- JSON: {"root": ..., "accounts": {"0x<address>": {"balance": ..., "nonce": ..., "code": ..., "storage": {...}}}}
+- JSONL (`--iterative`): one account object per line, with an "address" field
+
+The dump is memory-mapped and scanned once to build an index of address -> byte range, without parsing the accounts.
+An account is only parsed when execution first touches it, and the parsed entries are kept in an LRU cache, so reading
+its slots doesn't parse it again.
+
+Accounts without an address (geth writes the hashed key when the preimage is missing) can't be looked up and are
+skipped.
+"""
+
+import json
+import mmap
+import re
+from typing import Dict, Optional, Tuple
+
+from .state import AccountFields, LRUCache, PersistentWorldState, StateBackend
+from .utils import strip_0x
+
+DEFAULT_ENTRY_CACHE_SIZE = 1_000
+
+# a JSON string (with escapes), or a brace
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}]')
+_ACCOUNTS = re.compile(rb'"accounts"\s*:\s*\{')
+_ADDRESS_FIELD = re.compile(rb'"address"\s*:\s*"(0x[0-9a-fA-F]{40})"')
+
+# (nonce, balance, code, storage)
+DumpEntry = Tuple[int, int, bytes, Dict[int, int]]
+
+
+class InvalidDump(Exception): ...
+
+
+def _parse_address(key: bytes) -> Optional[int]:
+    key = key.decode("latin-1")
+    if not key.startswith("0x") or len(key) != 42:
+        return None
+
+    try:
+        return int(key, 16)
+    except ValueError:
+        return None
+
+
+def _quantity(value) -> int:
+    """geth writes nonces as numbers and balances as decimal strings, hex strings are accepted too"""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    return int(value, 16) if value.startswith("0x") else int(value)
+
+
+def parse_entry(account: dict) -> DumpEntry:
+    storage = {}
+    for slot, value in account.get("storage", {}).items():
+        # geth writes slot values as unprefixed hex
+        value = int(strip_0x(value) or "0", 16)
+        if value:
+            storage[int(strip_0x(slot), 16)] = value
+
+    return (
+        _quantity(account.get("nonce")),
+        _quantity(account.get("balance")),
+        bytes.fromhex(strip_0x(account.get("code", ""))),
+        storage,
+    )
+
+
+def _index_jsonl(buffer) -> Dict[int, Tuple[int, int]]:
+    index = {}
+    start = 0
+    while start < len(buffer):
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            end = len(buffer)
+
+        match = _ADDRESS_FIELD.search(buffer, start, end)
+        if match is not None:
+            index[int(match.group(1), 16)] = (start, end)
+        start = end + 1
+
+    return index
+
+
+def _index_json(buffer) -> Dict[int, Tuple[int, int]]:
+    match = _ACCOUNTS.search(buffer)
+    if match is None:
+        raise InvalidDump('no "accounts" object')
+
+    index = {}
+    depth = 1
+    key = start = None
+    for token in _TOKEN.finditer(buffer, match.end()):
+        value = token.group()
+        if value == b"{":
+            if depth == 1:
+                start = token.start()
+            depth += 1
+        elif value == b"}":
+            depth -= 1
+            if depth == 0:
+                return index
+            if depth == 1:
+                address = _parse_address(key)
+                if address is not None:
+                    index[address] = (start, token.end())
+        elif depth == 1:
+            # strings directly in the accounts object can only be keys, the values are objects
+            key = value[1:-1]
+
+    raise InvalidDump("unterminated accounts object")
+
+
+class DumpBackend(StateBackend):
+    """a read-only StateBackend over a geth state dump"""
+
+    def __init__(self, path: str, entry_cache_size: int = DEFAULT_ENTRY_CACHE_SIZE) -> None:
+        self.file = open(path, "rb")
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            self.file.close()
+            raise InvalidDump(f"{path} is empty")
+
+        try:
+            # a JSONL dump starts with a one-line root object, a JSON dump is either indented or has the accounts
+            newline = self.buffer.find(b"\n")
+            first_line = self.buffer[: newline if newline != -1 else len(self.buffer)].strip()
+            if first_line.startswith(b"{") and first_line.endswith(b"}") and not _ACCOUNTS.search(first_line):
+                self.index = _index_jsonl(self.buffer)
+            else:
+                self.index = _index_json(self.buffer)
+        except InvalidDump:
+            self.close()
+            raise
+
+        self.entries = LRUCache(entry_cache_size)
+        self.parsed = 0
+
+    def load_entry(self, address: int) -> Optional[DumpEntry]:
+        entry = self.entries.get(address)
+        if entry is not None:
+            return entry
+
+        span = self.index.get(address)
+        if span is None:
+            return None
+
+        start, end = span
+        try:
+            entry = parse_entry(json.loads(self.buffer[start:end]))
+        except ValueError as e:
+            raise InvalidDump(f"invalid account {hex(address)}: {e}")
+
+        self.parsed += 1
+        self.entries.put(address, entry)
+        return entry
+
+    def load_account(self, address: int) -> Optional[AccountFields]:
+        entry = self.load_entry(address)
+        return entry[:3] if entry is not None else None
+
+    def load_slot(self, address: int, slot: int) -> int:
+        entry = self.load_entry(address)
+        return entry[3].get(slot, 0) if entry is not None else 0
+
+    def write_batch(self, accounts, slots) -> None:
+        raise NotImplementedError("state dumps are read-only")
+
+    def close(self) -> None:
+        self.buffer.close()
+        self.file.close()
+
+
+def open_dump(path: str, entry_cache_size: int = DEFAULT_ENTRY_CACHE_SIZE, **cache_sizes) -> PersistentWorldState:
+    """
+    Opens a state dump as a world state, accounts and slots are loaded on first access.
+
+    The world state can be modified, but not committed.
+    """
+    return PersistentWorldState(DumpBackend(path, entry_cache_size), **cache_sizes)
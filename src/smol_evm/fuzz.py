@@ -0,0 +1,335 @@
+"""
+A coverage-guided calldata fuzzer.
+
+Inputs are mutated from a corpus, at the byte level (bit flips, interesting bytes, insertions, deletions, splicing) and
+with the ABI layout in mind (4-byte selector followed by 32-byte words: known selectors, interesting words, word
+arithmetic). Each input runs with edge coverage (`smol_evm.coverage`), and is added to the corpus when it hits new
+edges or hit-count buckets.
+
+Work is spread across a process pool. The code analysis (the jump destinations) is computed before the workers are
+forked, so they all share it, and every run reuses it. Every worker keeps its own coverage map and only sends back the
+inputs that were new for it, the parent merges them into the global map.
+
+An input fails if it raises an execution error (stack underflow, unknown opcode...), jumps to an invalid destination,
+reverts (only if "revert" is in `fail_on`), or violates the invariant. Failing inputs are minimized by re-running them
+through the reference interpreter (`runner.run`), and written to the crashes directory.
+"""
+
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from eth_utils import keccak
+
+from .codecache import CODE_REGISTRY
+from .constants import MAX_UINT256
+from .coverage import BUCKETS, EdgeCoverage
+from .dispatcher import find_selectors
+from .opcodes import REVERT
+from .runner import EXECUTION_ERRORS, ExecutionLimitReached, run
+
+DEFAULT_MAX_STEPS = 100_000
+DEFAULT_BATCH_SIZE = 200
+MAX_INPUT_SIZE = 4 + 32 * 16
+
+FAILURE_KINDS = ("error", "invalid-jump", "revert", "invariant")
+DEFAULT_FAIL_ON = ("error", "invalid-jump", "invariant")
+
+INTERESTING_BYTES = (0x00, 0x01, 0x7F, 0x80, 0xFF)
+INTERESTING_WORDS = (0, 1, 2, 31, 32, 255, 256, 2**160 - 1, 2**255 - 1, 2**255, MAX_UINT256 - 1, MAX_UINT256)
+
+# invariant(context) -> False if the outcome of the run is a bug
+Invariant = Callable[[object], bool]
+
+
+@dataclass
+class FuzzStats:
+    execs: int = 0
+    corpus: int = 0
+    edges: int = 0
+    crashes: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def execs_per_second(self) -> float:
+        return self.execs / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        crashes = sum(self.crashes.values())
+        return (
+            f"execs: {self.execs} ({self.execs_per_second:.0f}/s), corpus: {self.corpus}, edges: {self.edges}, "
+            f"crashes: {crashes} unique"
+        )
+
+
+def _classify(context, fail_on, invariant: Optional[Invariant]):
+    if context.success:
+        if invariant is not None and "invariant" in fail_on and not invariant(context):
+            return ("invariant", "invariant violated")
+        return None
+
+    # pc is right after the instruction that stopped execution
+    stopped_by = context.code[context.pc - 1] if 0 < context.pc <= len(context.code) else None
+    if context.reason and context.reason.startswith("Invalid jump"):
+        kind, reason = "invalid-jump", context.reason.split(", not in")[0]
+    elif context.reason or stopped_by != REVERT.opcode:
+        kind, reason = "error", context.reason or "INVALID"
+    else:
+        kind, reason = "revert", f"reverted with 0x{context.returndata.hex()}"
+
+    return (kind, reason) if kind in fail_on else None
+
+
+def failure(code: bytes, calldata: bytes, max_steps: int, fail_on, invariant: Optional[Invariant] = None, **kwargs):
+    """runs the input, returns (kind, reason) if it fails, or None"""
+    try:
+        context = run(code, calldata=calldata, max_steps=max_steps, **kwargs)
+    except ExecutionLimitReached:
+        # hangs are not failures, the step limit is an arbitrary budget
+        return None
+    except EXECUTION_ERRORS as e:
+        return ("error", f"{type(e).__name__}: {e}") if "error" in fail_on else None
+
+    return _classify(context, fail_on, invariant)
+
+
+class Mutator:
+    def __init__(self, rng: random.Random, selectors: Sequence[int] = ()) -> None:
+        self.rng = rng
+        self.selectors = list(selectors)
+
+    def mutate(self, data: bytes, corpus: Sequence[bytes] = ()) -> bytes:
+        rng = self.rng
+        data = bytearray(data)
+        for _ in range(rng.choice((1, 1, 2, 4))):
+            mutation = rng.randrange(10)
+            if mutation < 5:
+                self._mutate_abi(data)
+            else:
+                self._mutate_bytes(data, corpus)
+
+        return bytes(data[:MAX_INPUT_SIZE])
+
+    def _mutate_abi(self, data: bytearray) -> None:
+        rng = self.rng
+        if len(data) < 4:
+            data.extend(bytes(4 - len(data)))
+
+        num_words = (len(data) - 4) // 32
+        mutation = rng.randrange(4)
+
+        if mutation == 0 and self.selectors:
+            data[:4] = rng.choice(self.selectors).to_bytes(4, "big")
+        elif mutation == 1 or num_words == 0:
+            # append a word
+            data.extend(rng.choice(INTERESTING_WORDS).to_bytes(32, "big"))
+        else:
+            i = 4 + 32 * rng.randrange(num_words)
+            word = int.from_bytes(data[i : i + 32], "big")
+            if mutation == 2:
+                word = rng.choice(INTERESTING_WORDS)
+            else:
+                word = (word + rng.choice((-1, 1)) * rng.randrange(1, 64)) & MAX_UINT256
+            data[i : i + 32] = word.to_bytes(32, "big")
+
+    def _mutate_bytes(self, data: bytearray, corpus: Sequence[bytes]) -> None:
+        rng = self.rng
+        mutation = rng.randrange(5)
+
+        if not data or mutation == 0:
+            data.insert(rng.randrange(len(data) + 1), rng.randrange(256))
+        elif mutation == 1:
+            i = rng.randrange(len(data))
+            data[i] ^= 1 << rng.randrange(8)
+        elif mutation == 2:
+            data[rng.randrange(len(data))] = rng.choice(INTERESTING_BYTES)
+        elif mutation == 3:
+            del data[rng.randrange(len(data))]
+        elif corpus:
+            other = rng.choice(corpus)
+            cut = rng.randrange(len(data))
+            data[cut:] = other[cut:]
+
+
+def minimize(code: bytes, data: bytes, kind: str, max_steps: int, invariant: Optional[Invariant] = None) -> bytes:
+    """shrinks a failing input while it fails the same way, through the reference interpreter"""
+    analysis = CODE_REGISTRY.get(code)
+
+    def fails(candidate: bytes) -> bool:
+        result = failure(code, candidate, max_steps, (kind,), invariant, analysis=analysis)
+        return result is not None and result[0] == kind
+
+    if not fails(data):
+        return data
+
+    # drop whole words, then trailing bytes, then zero out bytes
+    i = 4
+    while i < len(data):
+        candidate = data[:i] + data[i + 32 :]
+        if fails(candidate):
+            data = candidate
+        else:
+            i += 32
+
+    while data and fails(data[:-1]):
+        data = data[:-1]
+
+    for i in range(len(data)):
+        if data[i] and fails(data[:i] + b"\x00" + data[i + 1 :]):
+            data = data[:i] + b"\x00" + data[i + 1 :]
+
+    return data
+
+
+# the state of the worker processes, set once by the pool initializer
+_worker = None
+
+
+def _init_worker(code: bytes, max_steps: int, fail_on, invariant) -> None:
+    global _worker
+    # with fork, the analysis made by fuzz() is inherited from the parent
+    _worker = (code, CODE_REGISTRY.get(code), max_steps, fail_on, invariant, EdgeCoverage())
+
+
+def _run_batch(inputs: List[bytes]) -> Tuple[int, List[Tuple[bytes, Optional[bytes], Optional[Tuple[str, str]]]]]:
+    """returns (execs, [(input, classified trace if it was new for this worker, failure)]) for the interesting inputs"""
+    code, analysis, max_steps, fail_on, invariant, coverage = _worker
+    interesting = []
+    for data in inputs:
+        try:
+            context, new = coverage.run(code, calldata=data, max_steps=max_steps, analysis=analysis)
+            result = _classify(context, fail_on, invariant)
+        except ExecutionLimitReached:
+            new, result = coverage.new, None
+        except EXECUTION_ERRORS as e:
+            new, result = coverage.new, ("error", f"{type(e).__name__}: {e}") if "error" in fail_on else None
+
+        if new or result is not None:
+            interesting.append((data, bytes(coverage.trace.translate(BUCKETS)) if new else None, result))
+
+    return len(inputs), interesting
+
+
+def load_corpus(directory: str) -> List[bytes]:
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                corpus.append(f.read())
+    return corpus
+
+
+def _save(directory: str, data: bytes, prefix: str = "") -> str:
+    path = os.path.join(directory, f"{prefix}{keccak(data).hex()[:16]}")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def fuzz(
+    code: bytes,
+    corpus_dir: str,
+    processes: Optional[int] = None,
+    max_execs: int = 0,
+    duration: float = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_steps: int = DEFAULT_MAX_STEPS,
+    fail_on: Sequence[str] = DEFAULT_FAIL_ON,
+    invariant: Optional[Invariant] = None,
+    seed: Optional[int] = None,
+    report: Optional[Callable[[FuzzStats], None]] = None,
+    report_interval: float = 1.0,
+) -> FuzzStats:
+    """
+    Fuzzes the code until max_execs inputs ran or duration seconds passed (one of them must be set).
+
+    New inputs are saved to corpus_dir, failing inputs to corpus_dir/crashes (named after the failure kind), once per
+    distinct failure. processes=1 runs everything in the current process. `report(stats)` is called every
+    report_interval seconds, and at the end.
+    """
+    if not max_execs and not duration:
+        raise ValueError("set max_execs or duration")
+
+    crashes_dir = os.path.join(corpus_dir, "crashes")
+    os.makedirs(crashes_dir, exist_ok=True)
+
+    # analyze the code before forking, so that all the workers share the result (and keep it alive in the registry)
+    analysis = CODE_REGISTRY.get(code)
+
+    selectors = sorted(find_selectors(code) or {})
+    corpus = load_corpus(corpus_dir) or [s.to_bytes(4, "big") for s in selectors] or [bytes()]
+    mutator = Mutator(random.Random(seed), selectors)
+    coverage = EdgeCoverage()
+    failures = set()
+
+    stats = FuzzStats(corpus=len(corpus))
+    start = last_report = time.perf_counter()
+
+    def handle(execs, interesting):
+        stats.execs += execs
+        for data, trace, result in interesting:
+            if trace is not None and coverage.merge(trace):
+                corpus.append(data)
+                _save(corpus_dir, data)
+
+            if result is not None and result not in failures:
+                failures.add(result)
+                kind = result[0]
+                _save(crashes_dir, minimize(code, data, kind, max_steps, invariant), prefix=f"{kind}-")
+                stats.crashes[kind] = stats.crashes.get(kind, 0) + 1
+
+        stats.corpus = len(corpus)
+        stats.edges = coverage.edge_count()
+
+    def done():
+        return (max_execs and stats.execs >= max_execs) or (duration and time.perf_counter() - start >= duration)
+
+    initargs = (code, max_steps, tuple(fail_on), invariant)
+    workers = processes or os.cpu_count() or 1
+    pool = Pool(workers, initializer=_init_worker, initargs=initargs) if workers != 1 else None
+    if pool is None:
+        _init_worker(*initargs)
+
+    try:
+        # the existing corpus first, then mutations
+        batches = [list(corpus)]
+        while True:
+            if pool is not None:
+                results = pool.imap_unordered(_run_batch, batches)
+            else:
+                results = map(_run_batch, batches)
+
+            for execs, interesting in results:
+                handle(execs, interesting)
+
+            stats.elapsed = time.perf_counter() - start
+            if report is not None and time.perf_counter() - last_report >= report_interval:
+                report(stats)
+                last_report = time.perf_counter()
+
+            if done():
+                break
+
+            # a couple of batches per worker keeps them all busy
+            num_batches = 2 * workers
+            size = batch_size
+            if max_execs:
+                size = max(1, min(batch_size, (max_execs - stats.execs + num_batches - 1) // num_batches))
+
+            batches = [
+                [mutator.mutate(mutator.rng.choice(corpus), corpus) for _ in range(size)] for _ in range(num_batches)
+            ]
+
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    stats.elapsed = time.perf_counter() - start
+    if report is not None:
+        report(stats)
+    return stats
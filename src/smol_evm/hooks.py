@@ -0,0 +1,190 @@
+"""
+Hooks that only fire on the instructions they subscribe to.
+
+`run(prehook=...)` calls the hook on every single instruction, even when it only cares about one opcode. With
+`run(hooks=...)`, the hooks are instead compiled into a copy of the threaded dispatch table: only the handlers of the
+subscribed opcodes are wrapped, every other instruction runs its plain handler at full speed.
+
+    hooks = Hooks()
+    hooks.on(MSTORE, prehook=lambda context, instruction: ...)
+    hooks.on([EQ, LT, GT], prehook=tracer.prehook, pcs={0x1A, 0x2B})
+    run(code, hooks=hooks)
+
+Hooks have the same signature as `run`'s prehook and posthook: hook(context, instruction). Opcodes can be given as
+ints, names, or instructions. Subscriptions restricted to a set of pcs without opcodes have to wrap every opcode, and
+pay one set lookup per instruction.
+
+`EventSink` is the batched alternative for consumers that need every step but don't need to react synchronously.
+"""
+
+from array import array
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .context import ExecutionContext
+from .opcodes import REGISTRY, Instruction, Operand
+from .threaded import HANDLERS
+
+Hook = Callable[[ExecutionContext, Instruction], None]
+
+
+def _resolve(opcode: Union[int, str, object]) -> int:
+    if isinstance(opcode, int):
+        return opcode
+    if isinstance(opcode, str):
+        return REGISTRY.by_name[opcode].opcode
+    return opcode.opcode
+
+
+def instruction_at(code: bytes, pc: int) -> Instruction:
+    """the instruction at pc, with its operand for pushes (like `opcodes.decode_opcode`, without a context)"""
+    if pc >= len(code):
+        return REGISTRY.by_code[0x00]
+
+    opcode = code[pc]
+    instruction = REGISTRY.by_code[opcode]
+    if instruction is None:
+        return Instruction(opcode, f"UNKNOWN 0x{opcode:02x}")
+
+    if instruction.is_push():
+        width = instruction.push_width()
+        # bytes after the end of the code buffer are treated as 0
+        value = int.from_bytes(code[pc + 1 : pc + 1 + width].ljust(width, b"\x00"), "big")
+        return Instruction(opcode, instruction.name, [Operand(width, value)])
+
+    return instruction
+
+
+def _wrap(handler, subscriptions):
+    filtered = any(pcs is not None for pcs, _, _ in subscriptions)
+
+    def hooked(ctx, stack, pc):
+        instruction_pc = pc - 1
+        active = subscriptions
+        if filtered:
+            active = [s for s in subscriptions if s[0] is None or instruction_pc in s[0]]
+            if not active:
+                return handler(ctx, stack, pc)
+
+        # like in the reference loop, hooks see the pc of the next instruction
+        instruction = instruction_at(ctx.code, instruction_pc)
+        ctx.pc = pc + instruction.push_width()
+        for _, prehook, _ in active:
+            if prehook is not None:
+                prehook(ctx, instruction)
+
+        pc = handler(ctx, stack, pc)
+
+        ctx.pc = pc
+        for _, _, posthook in active:
+            if posthook is not None:
+                posthook(ctx, instruction)
+        return pc
+
+    return hooked
+
+
+class Hooks:
+    def __init__(self) -> None:
+        # opcode -> [(pcs or None, prehook, posthook)], opcode None means every opcode
+        self.subscriptions = {}
+
+        # opcode -> [wrapper], see wrap()
+        self.wrappers = {}
+        self._table = None
+
+    def on(
+        self,
+        opcodes=None,
+        prehook: Optional[Hook] = None,
+        posthook: Optional[Hook] = None,
+        pcs: Optional[Iterable[int]] = None,
+    ) -> "Hooks":
+        """subscribes to one opcode or a list of opcodes (None for all), optionally only at the given pcs"""
+        if opcodes is None and pcs is None:
+            raise ValueError("subscribe to some opcodes or pcs, or use run(prehook=...) to hook every instruction")
+
+        if opcodes is None:
+            keys = [None]
+        elif isinstance(opcodes, (list, tuple, set, frozenset)):
+            keys = [_resolve(opcode) for opcode in opcodes]
+        else:
+            keys = [_resolve(opcodes)]
+
+        subscription = (frozenset(pcs) if pcs is not None else None, prehook, posthook)
+        for key in keys:
+            self.subscriptions.setdefault(key, []).append(subscription)
+
+        self._table = None
+        return self
+
+    def wrap(self, opcodes, wrapper: Callable) -> "Hooks":
+        """
+        The low-level alternative to `on()`: wrapper(handler) returns a replacement for the raw handler of each opcode
+        (see `smol_evm.threaded`), for consumers that need the raw pcs and can't afford to materialize instructions.
+        """
+        opcodes = opcodes if isinstance(opcodes, (list, tuple, set, frozenset)) else [opcodes]
+        for opcode in opcodes:
+            self.wrappers.setdefault(_resolve(opcode), []).append(wrapper)
+
+        self._table = None
+        return self
+
+    def clear(self) -> None:
+        self.subscriptions = {}
+        self.wrappers = {}
+        self._table = None
+
+    def table(self, handlers: Tuple = HANDLERS) -> Tuple:
+        """the dispatch table with the subscribed handlers wrapped, cached until the subscriptions change"""
+        if self._table is None or self._table[0] is not handlers:
+            everywhere = self.subscriptions.get(None, [])
+            table: List = list(handlers)
+            for opcode, wrappers in self.wrappers.items():
+                for wrapper in wrappers:
+                    table[opcode] = wrapper(table[opcode])
+
+            for opcode in range(256):
+                subscriptions = self.subscriptions.get(opcode, []) + everywhere
+                if subscriptions:
+                    table[opcode] = _wrap(table[opcode], subscriptions)
+            self._table = (handlers, tuple(table))
+
+        return self._table[1]
+
+
+# step records are packed into a single uint64: pc << 24 | depth << 8 | opcode
+RECORD_PC_SHIFT = 24
+RECORD_DEPTH_SHIFT = 8
+DEFAULT_BATCH_SIZE = 4096
+
+
+def unpack_record(record: int) -> Tuple[int, int, int]:
+    """returns (pc, opcode, depth)"""
+    return record >> RECORD_PC_SHIFT, record & 0xFF, (record >> RECORD_DEPTH_SHIFT) & 0xFFFF
+
+
+def unpack_records(buffer: array, count: int) -> Iterator[Tuple[int, int, int]]:
+    return (unpack_record(buffer[i]) for i in range(count))
+
+
+class EventSink:
+    """
+    Batched delivery of every executed step, for consumers that don't need to react synchronously (coverage,
+    statistics, tracers).
+
+    With `run(sink=...)`, the interpreter writes one packed record per step into a preallocated `array("Q")`, and
+    calls `consume(buffer, count)` when the buffer is full and at the end of the run. Only the first `count` records
+    are valid, and the buffer is reused afterwards: consumers must copy what they want to keep.
+    """
+
+    def __init__(self, consume: Callable[[array, int], None], batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.consume = consume
+        self.buffer = array("Q", bytes(8 * batch_size))
+        self.count = 0
+        self.batches = 0
+
+    def flush(self) -> None:
+        if self.count:
+            self.consume(self.buffer, self.count)
+            self.batches += 1
+            self.count = 0
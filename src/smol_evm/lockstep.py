@@ -0,0 +1,561 @@
+"""
+Lockstep execution of one contract over many calldatas.
+
+When the same code runs against thousands of inputs, most runs follow the same control path. `run_lanes` advances all
+the inputs (lanes) together: every instruction is decoded and dispatched once per group of lanes, instead of once per
+run.
+
+Stack slots hold either a plain int, when the value is the same in every lane of the group (constants, jump targets,
+most of what a dispatcher computes), or a tuple with one value per lane. Operations on uniform values are computed
+once, operations on per-lane values are mapped over the lanes, and results that turn out to be the same in every lane
+collapse back to a plain int. Memory and calldata are per lane.
+
+When a JUMPI condition (or a jump target) differs between the lanes, the group splits into sub-groups, one per
+destination, which then run independently. Instructions that touch state (storage, calls, logs...) are not executed
+in lockstep: each lane of the group is handed over to the scalar interpreter (`runner.resume`) from that point.
+
+Lanes run like `run(code, calldata=...)` without a world state: they don't share anything, and each one gets its own
+empty storage if it falls back to the scalar interpreter.
+"""
+
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence
+
+from eth_utils import keccak
+
+from .codecache import CODE_REGISTRY
+from .constants import MAX_STACK_DEPTH, MAX_UINT256
+from .context import Calldata, ExecutionContext
+from .memory import Memory
+from .opcodes import PUSH1_OPCODE, REGISTRY, int_to_uint, uint_to_int
+from .runner import EXECUTION_ERRORS, ExecutionLimitReached, resume
+from .stack import Stack, StackOverflow, StackUnderflow
+
+
+@dataclass
+class LaneResult:
+    success: Optional[bool] = None
+    returndata: bytes = bytes()
+
+    # why execution stopped, like `ExecutionContext.reason`
+    reason: Optional[str] = None
+
+    # set if the run raised, like `run` would have
+    error: Optional[str] = None
+
+
+@dataclass
+class LockstepResult:
+    lanes: List[LaneResult]
+
+    # instructions dispatched for whole groups, and by the scalar fallback
+    group_steps: int = 0
+    scalar_steps: int = 0
+
+    # the sum of the steps of every lane, i.e. what running the lanes one by one would dispatch
+    lane_steps: int = 0
+    splits: int = 0
+    fallbacks: int = 0
+
+    @property
+    def dispatch_ratio(self) -> float:
+        """lane steps per dispatched instruction"""
+        dispatched = self.group_steps + self.scalar_steps
+        return self.lane_steps / dispatched if dispatched else 0.0
+
+
+class _Group:
+    __slots__ = ("lanes", "pc", "stack", "memories", "calldatas", "steps", "code", "env")
+
+    def __init__(self, lanes: List[int], pc: int, stack: list, memories: list, calldatas: list, steps: int, code, env):
+        # the lane indices, and their memory and calldata in the same order
+        self.lanes = lanes
+        self.pc = pc
+        self.stack = stack
+        self.memories = memories
+        self.calldatas = calldatas
+        self.steps = steps
+
+        # shared by all the groups: the code, and (address, caller, callvalue)
+        self.code = code
+        self.env = env
+
+    def per_lane(self, slot):
+        """the values of a stack slot, one per lane"""
+        return slot if type(slot) is tuple else repeat(slot, len(self.lanes))
+
+    def select(self, positions: List[int], pc: int) -> "_Group":
+        """a sub-group with the lanes at the given positions"""
+        stack = [slot if type(slot) is int else _collapse(tuple(slot[i] for i in positions)) for slot in self.stack]
+        return _Group(
+            [self.lanes[i] for i in positions],
+            pc,
+            stack,
+            [self.memories[i] for i in positions],
+            [self.calldatas[i] for i in positions],
+            self.steps,
+            self.code,
+            self.env,
+        )
+
+
+def _collapse(values: tuple):
+    """a plain int if all the lanes have the same value"""
+    first = values[0]
+    return first if values.count(first) == len(values) else values
+
+
+# stack-only instructions, as (number of inputs, function of the inputs), with the same semantics as `threaded`
+def _sdiv(a, b):
+    a, b = uint_to_int(a), uint_to_int(b)
+    return int_to_uint(a // b) if b != 0 else 0
+
+
+def _smod(a, b):
+    a, b = uint_to_int(a), uint_to_int(b)
+    return int_to_uint(a % b) if b != 0 else 0
+
+
+def _reference(name: str, arity: int):
+    """the reference implementation of a stack-only instruction, as a function of its inputs"""
+    execute = REGISTRY.by_name[name].execute
+    context = ExecutionContext()
+
+    def func(*args):
+        context.stack.stack[:] = reversed(args)
+        execute(context)
+        return context.stack.stack.pop()
+
+    return arity, func
+
+
+PURE = {
+    "ADD": (2, lambda a, b: (a + b) & MAX_UINT256),
+    "MUL": (2, lambda a, b: (a * b) & MAX_UINT256),
+    "SUB": (2, lambda a, b: (a - b) & MAX_UINT256),
+    "DIV": (2, lambda a, b: a // b if b != 0 else 0),
+    "SDIV": (2, _sdiv),
+    "MOD": (2, lambda a, b: a % b if b != 0 else 0),
+    "SMOD": (2, _smod),
+    "ADDMOD": _reference("ADDMOD", 3),
+    "MULMOD": _reference("MULMOD", 3),
+    "EXP": _reference("EXP", 2),
+    "SIGNEXTEND": _reference("SIGNEXTEND", 2),
+    "LT": (2, lambda a, b: 1 if a < b else 0),
+    "GT": (2, lambda a, b: 1 if a > b else 0),
+    "SLT": (2, lambda a, b: 1 if uint_to_int(a) < uint_to_int(b) else 0),
+    "SGT": (2, lambda a, b: 1 if uint_to_int(a) > uint_to_int(b) else 0),
+    "EQ": (2, lambda a, b: 1 if a == b else 0),
+    "ISZERO": (1, lambda a: 1 if a == 0 else 0),
+    "AND": (2, lambda a, b: a & b),
+    "OR": (2, lambda a, b: a | b),
+    "XOR": (2, lambda a, b: a ^ b),
+    "NOT": (1, lambda a: MAX_UINT256 ^ a),
+    "BYTE": (2, lambda offset, value: (value >> ((31 - offset) * 8)) & 0xFF if offset < 32 else 0),
+    "SHL": (2, lambda a, b: 0 if a >= 256 else ((b << a) & MAX_UINT256)),
+    "SHR": (2, lambda a, b: b >> a),
+    "SAR": (2, lambda shift, value: int_to_uint(uint_to_int(value) >> shift)),
+}
+
+
+# lane handlers have the same signature as the threaded ones, but get the group instead of the context:
+#
+#     handler(group, stack, pc) -> pc
+def _lift(arity: int, func):
+    if arity == 1:
+
+        def unary(group, stack, pc):
+            if not stack:
+                raise StackUnderflow()
+            a = stack.pop()
+            stack.append(func(a) if type(a) is int else _collapse(tuple(map(func, a))))
+            return pc
+
+        return unary
+
+    def handler(group, stack, pc):
+        if len(stack) < arity:
+            raise StackUnderflow()
+        args = [stack.pop() for _ in range(arity)]
+        if all(type(arg) is int for arg in args):
+            stack.append(func(*args))
+        else:
+            stack.append(_collapse(tuple(map(func, *(group.per_lane(arg) for arg in args)))))
+        return pc
+
+    return handler
+
+
+def _push(width: int):
+    def handler(group, stack, pc):
+        if len(stack) >= MAX_STACK_DEPTH:
+            raise StackOverflow()
+        code = group.code
+        end = pc + width
+        value = int.from_bytes(code[pc:end], "big")
+        if end > len(code):
+            value <<= 8 * (end - len(code))
+        stack.append(value)
+        return end
+
+    return handler
+
+
+def _push_value(get):
+    """pushes get(group), which is the same for all the lanes"""
+
+    def handler(group, stack, pc):
+        if len(stack) >= MAX_STACK_DEPTH:
+            raise StackOverflow()
+        stack.append(get(group))
+        return pc
+
+    return handler
+
+
+def _dup(n: int):
+    def handler(group, stack, pc):
+        if len(stack) < n:
+            raise StackUnderflow()
+        if len(stack) >= MAX_STACK_DEPTH:
+            raise StackOverflow()
+        stack.append(stack[-n])
+        return pc
+
+    return handler
+
+
+def _swap(n: int):
+    def handler(group, stack, pc):
+        if len(stack) <= n:
+            raise StackUnderflow()
+        stack[-1], stack[-n - 1] = stack[-n - 1], stack[-1]
+        return pc
+
+    return handler
+
+
+def _pop(group, stack, pc):
+    if not stack:
+        raise StackUnderflow()
+    stack.pop()
+    return pc
+
+
+def _jumpdest(group, stack, pc):
+    return pc
+
+
+def _pc(group, stack, pc):
+    if len(stack) >= MAX_STACK_DEPTH:
+        raise StackOverflow()
+    stack.append(pc - 1)
+    return pc
+
+
+def _read_word(data: bytes, offset: int) -> int:
+    return int.from_bytes(data[offset : offset + 32].ljust(32, b"\x00"), "big")
+
+
+def _calldataload(group, stack, pc):
+    if not stack:
+        raise StackUnderflow()
+    offsets = group.per_lane(stack.pop())
+    stack.append(_collapse(tuple(map(_read_word, group.calldatas, offsets))))
+    return pc
+
+
+def _calldatasize(group, stack, pc):
+    if len(stack) >= MAX_STACK_DEPTH:
+        raise StackOverflow()
+    stack.append(_collapse(tuple(len(data) for data in group.calldatas)))
+    return pc
+
+
+def _calldatacopy(group, stack, pc):
+    if len(stack) < 3:
+        raise StackUnderflow()
+    dest_offsets, offsets, sizes = (group.per_lane(stack.pop()) for _ in range(3))
+    for memory, data, dest_offset, offset, size in zip(group.memories, group.calldatas, dest_offsets, offsets, sizes):
+        # like the reference implementation, whole words are copied
+        for pos in range((size / 32).__ceil__()):
+            memory.store_word(dest_offset + pos * 32, _read_word(data, offset + pos * 32))
+    return pc
+
+
+def _mload(group, stack, pc):
+    if not stack:
+        raise StackUnderflow()
+    offsets = group.per_lane(stack.pop())
+    stack.append(_collapse(tuple(memory.load_word(offset) for memory, offset in zip(group.memories, offsets))))
+    return pc
+
+
+def _mstore(group, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offsets, values = group.per_lane(stack.pop()), group.per_lane(stack.pop())
+    for memory, offset, value in zip(group.memories, offsets, values):
+        memory.store_word(offset, value)
+    return pc
+
+
+def _mstore8(group, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offsets, values = group.per_lane(stack.pop()), group.per_lane(stack.pop())
+    for memory, offset, value in zip(group.memories, offsets, values):
+        memory.store(offset, value % 256)
+    return pc
+
+
+def _msize(group, stack, pc):
+    if len(stack) >= MAX_STACK_DEPTH:
+        raise StackOverflow()
+    stack.append(_collapse(tuple(32 * memory.active_words() for memory in group.memories)))
+    return pc
+
+
+def _sha3(group, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offsets, sizes = group.per_lane(stack.pop()), group.per_lane(stack.pop())
+    hashes = (
+        int.from_bytes(keccak(memory.load_range(offset, size)), "big")
+        for memory, offset, size in zip(group.memories, offsets, sizes)
+    )
+    stack.append(_collapse(tuple(hashes)))
+    return pc
+
+
+def _build_table():
+    table = [None] * 256
+    for name, (arity, func) in PURE.items():
+        table[REGISTRY.by_name[name].opcode] = _lift(arity, func)
+
+    for width in range(1, 33):
+        table[PUSH1_OPCODE + width - 1] = _push(width)
+    for i in range(1, 17):
+        table[0x7F + i] = _dup(i)
+        table[0x8F + i] = _swap(i)
+
+    values = {
+        "PUSH0": lambda group: 0,
+        "ADDRESS": lambda group: group.env[0],
+        "CALLER": lambda group: group.env[1],
+        "CALLVALUE": lambda group: group.env[2],
+        "GAS": lambda group: MAX_UINT256,
+        "RETURNDATASIZE": lambda group: 0,
+    }
+    for name, get in values.items():
+        table[REGISTRY.by_name[name].opcode] = _push_value(get)
+
+    handlers = {
+        "POP": _pop,
+        "JUMPDEST": _jumpdest,
+        "PC": _pc,
+        "CALLDATALOAD": _calldataload,
+        "CALLDATASIZE": _calldatasize,
+        "CALLDATACOPY": _calldatacopy,
+        "MLOAD": _mload,
+        "MSTORE": _mstore,
+        "MSTORE8": _mstore8,
+        "MSIZE": _msize,
+        "SHA3": _sha3,
+    }
+    for name, handler in handlers.items():
+        table[REGISTRY.by_name[name].opcode] = handler
+
+    return tuple(table)
+
+
+LANE_HANDLERS = _build_table()
+
+
+STOP = REGISTRY.by_name["STOP"].opcode
+JUMP = REGISTRY.by_name["JUMP"].opcode
+JUMPI = REGISTRY.by_name["JUMPI"].opcode
+RETURN = REGISTRY.by_name["RETURN"].opcode
+REVERT = REGISTRY.by_name["REVERT"].opcode
+INVALID = REGISTRY.by_name["INVALID"].opcode
+
+
+# control flow ends the straight-line run of a group, it returns the next pc if all the lanes go to the same place,
+# or a list of branches: ("goto", positions, pc) and ("stop", positions, success, returndata per position, reason)
+def _control(opcode: int, group: _Group, pc: int, jumpdests):
+    stack = group.stack
+    everyone = range(len(group.lanes))
+
+    if opcode == STOP:
+        return [("stop", everyone, True, None, None)]
+
+    if opcode == INVALID:
+        return [("stop", everyone, False, None, None)]
+
+    if len(stack) < (1 if opcode == JUMP else 2):
+        raise StackUnderflow()
+
+    if opcode in (RETURN, REVERT):
+        offsets, sizes = group.per_lane(stack.pop()), group.per_lane(stack.pop())
+        returndata = [
+            # a zero-sized REVERT doesn't touch memory, RETURN always does (see the reference implementations)
+            memory.load_range(offset, size) if size or opcode == RETURN else bytes()
+            for memory, offset, size in zip(group.memories, offsets, sizes)
+        ]
+        return [("stop", everyone, opcode == RETURN, returndata, None)]
+
+    target = stack.pop()
+    condition = stack.pop() if opcode == JUMPI else 1
+    if type(target) is int and type(condition) is int:
+        if condition == 0:
+            return pc + 1
+        if target in jumpdests:
+            return target
+        return [("stop", everyone, False, None, _invalid_jump(target, jumpdests))]
+
+    # (destination, jumped) -> positions
+    destinations: Dict[tuple, List[int]] = {}
+    for i, (t, c) in enumerate(zip(group.per_lane(target), group.per_lane(condition))):
+        key = (t, True) if c != 0 else (pc + 1, False)
+        destinations.setdefault(key, []).append(i)
+
+    branches = []
+    for (destination, jumped), positions in destinations.items():
+        if not jumped or destination in jumpdests:
+            branches.append(("goto", positions, destination))
+        else:
+            branches.append(("stop", positions, False, None, _invalid_jump(destination, jumpdests)))
+
+    if len(branches) == 1 and branches[0][0] == "goto":
+        return branches[0][2]
+    return branches
+
+
+def _invalid_jump(target: int, jumpdests) -> str:
+    return f"Invalid jump to {target}, not in valid jumpdests {jumpdests}"
+
+
+CONTROL = frozenset((STOP, JUMP, JUMPI, RETURN, REVERT, INVALID))
+
+
+def _finish(result: LockstepResult, group: _Group, positions, **outcome) -> None:
+    for i in positions:
+        lane = result.lanes[group.lanes[i]]
+        for name, value in outcome.items():
+            setattr(lane, name, value)
+    result.lane_steps += group.steps * len(positions)
+
+
+def _run_group(group: _Group, groups: List[_Group], result: LockstepResult, jumpdests, max_steps: int) -> None:
+    """runs a group until all its lanes stopped, split into new groups, or fell back to the scalar interpreter"""
+    code = group.code
+    code_len = len(code)
+    stack = group.stack
+    handlers = LANE_HANDLERS
+    pc = group.pc
+    everyone = range(len(group.lanes))
+
+    try:
+        while True:
+            # section 9.4.1 of the yellow paper, if pc is outside code, then the operation to be executed is STOP
+            opcode = code[pc] if pc < code_len else STOP
+            handler = handlers[opcode]
+            if handler is not None:
+                pc = handler(group, stack, pc + 1)
+                outcome = pc
+            elif opcode in CONTROL:
+                outcome = _control(opcode, group, pc, jumpdests)
+            else:
+                group.pc = pc
+                _fall_back(group, result, jumpdests, max_steps)
+                return
+
+            group.steps += 1
+            result.group_steps += 1
+            if max_steps > 0 and group.steps > max_steps:
+                _finish(result, group, everyone, error="ExecutionLimitReached")
+                return
+
+            if type(outcome) is int:
+                pc = outcome
+                continue
+
+            result.splits += max(0, sum(branch[0] == "goto" for branch in outcome) - 1)
+            for branch in outcome:
+                if branch[0] == "goto":
+                    _, positions, destination = branch
+                    groups.append(group.select(positions, destination))
+                else:
+                    _, positions, success, returndata, reason = branch
+                    for i in positions:
+                        result.lanes[group.lanes[i]].returndata = returndata[i] if returndata is not None else bytes()
+                    _finish(result, group, positions, success=success, reason=reason)
+            return
+
+    except EXECUTION_ERRORS as e:
+        _finish(result, group, everyone, error=f"{type(e).__name__}: {e}")
+
+
+def _fall_back(group: _Group, result: LockstepResult, jumpdests, max_steps: int) -> None:
+    """hands every lane of the group over to the scalar interpreter, from the instruction at group.pc"""
+    result.fallbacks += 1
+    analysis = CODE_REGISTRY.get(group.code)
+    address, caller, callvalue = group.env
+
+    for i, lane in enumerate(group.lanes):
+        stack = Stack()
+        stack.stack = [slot if type(slot) is int else slot[i] for slot in group.stack]
+        context = ExecutionContext(
+            code=group.code,
+            pc=group.pc,
+            stack=stack,
+            memory=group.memories[i],
+            calldata=Calldata(group.calldatas[i]),
+            address=address,
+            caller=caller,
+            callvalue=callvalue,
+            analysis=analysis,
+        )
+        context.jumpdests = jumpdests
+
+        outcome = result.lanes[lane]
+        try:
+            steps = resume(context, max_steps, group.steps)
+        except ExecutionLimitReached:
+            outcome.error = "ExecutionLimitReached"
+            steps = max_steps + 1
+        except EXECUTION_ERRORS as e:
+            outcome.error = f"{type(e).__name__}: {e}"
+            steps = group.steps
+        else:
+            outcome.success = context.success
+            outcome.returndata = context.returndata
+            outcome.reason = context.reason
+
+        result.scalar_steps += steps - group.steps
+        result.lane_steps += steps
+
+
+def run_lanes(
+    code: bytes, calldatas: Sequence[bytes], max_steps=0, address=0, caller=0, callvalue=0
+) -> LockstepResult:
+    """
+    Runs the code once per calldata, in lockstep. The result of each lane is the same as the one of
+    `run(code, calldata=..., max_steps=...)`, except that errors are reported in the lane instead of being raised.
+    """
+    calldatas = [bytes(calldata) for calldata in calldatas]
+    result = LockstepResult([LaneResult() for _ in calldatas])
+    if not calldatas:
+        return result
+
+    # a plain set like in `run`, so that the reasons of invalid jumps are identical
+    jumpdests = set(CODE_REGISTRY.get(code).jumpdests)
+    lanes = list(range(len(calldatas)))
+    env = (address, caller, callvalue)
+    groups = [_Group(lanes, 0, [], [Memory() for _ in lanes], calldatas, 0, code, env)]
+
+    while groups:
+        _run_group(groups.pop(), groups, result, jumpdests, max_steps)
+
+    return result
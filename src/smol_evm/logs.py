@@ -0,0 +1,492 @@
+"""
+A concurrent, resumable fetcher of historical event logs over JSON-RPC.
+
+The block range is fetched with several `eth_getLogs` requests in flight. Ranges adapt to the density of the logs:
+a range that fails because it has too many results, or that times out, is split in halves (and the range size is
+halved), and the range size doubles after ranges that return few logs, up to max_range.
+
+Ranges complete out of order, but logs are written in block order, as JSON lines: a range is only written once all
+the ranges before it were. After each write, a checkpoint records the next block and the size of the output file, so a
+fetch that is stopped (or fails after its retries) resumes exactly where it stopped, without duplicated or missing
+logs: the output is truncated back to the checkpointed size.
+
+Logs are decoded with the event ABIs of the contract (`EventDecoder`), the ones that don't match any event are
+skipped. Only the standard library is used, the HTTP client speaks just enough HTTP/1.1 for JSON-RPC endpoints.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import ssl
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from eth_utils import keccak, to_checksum_address
+
+from .rpc import RpcError
+
+DEFAULT_RANGE_SIZE = 1000
+DEFAULT_MAX_RANGE = 100_000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 5
+
+# a range with fewer logs than this grows the range size
+SPARSE_LOGS = 500
+
+# how many completed ranges can wait for an earlier one before the fetch pauses
+MAX_BUFFERED_RANGES = 64
+
+# the errors providers return when a range has too many logs, or takes too long to query
+RANGE_ERRORS = (
+    "more than",
+    "too many",
+    "too large",
+    "limit exceeded",
+    "response size",
+    "range is too",
+    "block range",
+    "timeout",
+    "timed out",
+)
+
+
+class HttpError(Exception): ...
+
+
+def is_range_error(e: Exception) -> bool:
+    """True if the range should be split, rather than retried as is"""
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    return isinstance(e, RpcError) and any(marker in e.message.lower() for marker in RANGE_ERRORS)
+
+
+def _dechunk(body: bytes) -> bytes:
+    chunks = []
+    while True:
+        size_line, _, body = body.partition(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            return b"".join(chunks)
+        chunks.append(body[:size])
+        body = body[size + 2 :]
+
+
+class RpcClient:
+    """a minimal JSON-RPC over HTTP(S) client, one connection per request"""
+
+    def __init__(self, url: str, timeout: float = DEFAULT_TIMEOUT) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.https = parts.scheme == "https"
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.ids = itertools.count(1)
+
+    async def _post(self, payload: bytes) -> bytes:
+        context = ssl.create_default_context() if self.https else None
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        try:
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\n"
+                f"Host: {self.host}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, body = response.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = _dechunk(body)
+
+        status = int(status_line.split(" ")[1])
+        if status != 200:
+            raise HttpError(f"{status_line}: {body[:200]!r}")
+        return body
+
+    async def call(self, method: str, *params):
+        request = {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": list(params)}
+        body = await asyncio.wait_for(self._post(json.dumps(request).encode()), self.timeout)
+
+        response = json.loads(body)
+        if "error" in response:
+            error = response["error"]
+            raise RpcError(error.get("code", 0), error.get("message", ""), error.get("data"))
+        return response["result"]
+
+
+def _canonical_type(param: dict) -> str:
+    kind = param["type"]
+    if kind.startswith("tuple"):
+        return f"({','.join(_canonical_type(component) for component in param['components'])}){kind[5:]}"
+    return kind
+
+
+def _is_dynamic(param: dict) -> bool:
+    kind = param["type"]
+    if kind in ("bytes", "string") or kind.endswith("[]"):
+        return True
+    if kind.endswith("]"):
+        return _is_dynamic({**param, "type": kind[: kind.rindex("[")]})
+    if kind == "tuple":
+        return any(_is_dynamic(component) for component in param["components"])
+    return False
+
+
+def _head_size(param: dict) -> int:
+    """the size of the value in the head of its enclosing tuple"""
+    if _is_dynamic(param):
+        return 32
+
+    kind = param["type"]
+    if kind.endswith("]"):
+        length = int(kind[kind.rindex("[") + 1 : -1])
+        return length * _head_size({**param, "type": kind[: kind.rindex("[")]})
+    if kind == "tuple":
+        return sum(_head_size(component) for component in param["components"])
+    return 32
+
+
+def _word(data: bytes, offset: int) -> int:
+    return int.from_bytes(data[offset : offset + 32], "big")
+
+
+def _decode_tuple(params: Sequence[dict], data: bytes, offset: int = 0) -> list:
+    values = []
+    head = offset
+    for param in params:
+        if _is_dynamic(param):
+            values.append(_decode(param, data, offset + _word(data, head)))
+        else:
+            values.append(_decode(param, data, head))
+        head += _head_size(param)
+    return values
+
+
+def _decode(param: dict, data: bytes, offset: int):
+    kind = param["type"]
+
+    if kind.endswith("]"):
+        element = {**param, "type": kind[: kind.rindex("[")]}
+        length = kind[kind.rindex("[") + 1 : -1]
+        if length:
+            return _decode_tuple([element] * int(length), data, offset)
+        return _decode_tuple([element] * _word(data, offset), data, offset + 32)
+
+    if kind == "tuple":
+        values = _decode_tuple(param["components"], data, offset)
+        return {component["name"]: value for component, value in zip(param["components"], values)}
+
+    if kind in ("bytes", "string"):
+        value = data[offset + 32 : offset + 32 + _word(data, offset)]
+        return value.decode(errors="replace") if kind == "string" else f"0x{value.hex()}"
+
+    word = _word(data, offset)
+    if kind == "address":
+        return to_checksum_address(word.to_bytes(32, "big")[12:])
+    if kind == "bool":
+        return bool(word)
+    if kind.startswith("uint"):
+        return word
+    if kind.startswith("int"):
+        bits = int(kind[3:] or 256)
+        word &= (1 << bits) - 1
+        return word - (1 << bits) if word >> (bits - 1) else word
+    if kind.startswith("bytes"):
+        return f"0x{data[offset : offset + int(kind[5:])].hex()}"
+
+    raise ValueError(f"unsupported type {kind}")
+
+
+class EventDecoder:
+    """decodes logs with the event entries of a contract ABI (the JSON list), by topic 0"""
+
+    def __init__(self, abi: Sequence[dict], event_names: Optional[Sequence[str]] = None) -> None:
+        self.events = {}
+        for entry in abi:
+            if entry.get("type") != "event" or entry.get("anonymous"):
+                continue
+            if event_names is not None and entry["name"] not in event_names:
+                continue
+
+            signature = f"{entry['name']}({','.join(_canonical_type(param) for param in entry['inputs'])})"
+            self.events[f"0x{keccak(text=signature).hex()}"] = entry
+
+        if not self.events:
+            raise ValueError(f"no events named {', '.join(event_names or [])} in the ABI")
+
+    @property
+    def topics(self) -> List[str]:
+        return sorted(self.events)
+
+    def decode(self, log: dict) -> Optional[dict]:
+        """the decoded log, or None if it doesn't match any of the events"""
+        topics = log.get("topics") or []
+        event = self.events.get(topics[0].lower()) if topics else None
+        if event is None:
+            return None
+
+        try:
+            indexed = [param for param in event["inputs"] if param.get("indexed")]
+            if len(topics) != len(indexed) + 1:
+                return None
+
+            args = {}
+            for param, topic in zip(indexed, topics[1:]):
+                # dynamic values, tuples and arrays are indexed by their hash
+                hashed = _is_dynamic(param) or param["type"].startswith("tuple") or param["type"].endswith("]")
+                args[param["name"]] = topic if hashed else _decode(param, bytes.fromhex(topic[2:]), 0)
+
+            data = bytes.fromhex(log.get("data", "0x")[2:])
+            params = [param for param in event["inputs"] if not param.get("indexed")]
+            args.update(zip((param["name"] for param in params), _decode_tuple(params, data)))
+
+        except (ValueError, IndexError, KeyError):
+            return None
+
+        return {
+            "event": event["name"],
+            "address": log.get("address"),
+            "blockNumber": int(log["blockNumber"], 16),
+            "transactionHash": log.get("transactionHash"),
+            "logIndex": int(log.get("logIndex", "0x0"), 16),
+            "args": args,
+        }
+
+
+@dataclass
+class FetchStats:
+    blocks: int = 0
+    ranges: int = 0
+    splits: int = 0
+    retries: int = 0
+    logs: int = 0
+    skipped: int = 0
+    range_size: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def blocks_per_second(self) -> float:
+        return self.blocks / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"blocks: {self.blocks} ({self.blocks_per_second:,.0f}/s), ranges: {self.ranges} (size {self.range_size}, "
+            f"{self.splits} splits, {self.retries} retries), logs: {self.logs}, skipped: {self.skipped}"
+        )
+
+
+def _write_json(path: str, data) -> None:
+    """atomically, a fetch that is stopped halfway through a write keeps the previous checkpoint"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class InvalidCheckpoint(Exception): ...
+
+
+class LogFetcher:
+    def __init__(
+        self,
+        client: RpcClient,
+        address: Optional[str],
+        decoder: EventDecoder,
+        from_block: int,
+        to_block: int,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        max_range: int = DEFAULT_MAX_RANGE,
+        retries: int = DEFAULT_RETRIES,
+        retry_delay: float = 1.0,
+        sparse_logs: int = SPARSE_LOGS,
+    ) -> None:
+        """fetches the logs of address (None for all addresses) in [from_block, to_block]"""
+        self.client = client
+        self.address = address
+        self.decoder = decoder
+        self.from_block = from_block
+        self.to_block = to_block
+        self.concurrency = concurrency
+        self.range_size = range_size
+        self.max_range = max_range
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.sparse_logs = sparse_logs
+        self.stats = FetchStats(range_size=range_size)
+
+    def _filter(self, start: int, end: int) -> dict:
+        log_filter = {"fromBlock": hex(start), "toBlock": hex(end), "topics": [self.decoder.topics]}
+        if self.address is not None:
+            log_filter["address"] = self.address
+        return log_filter
+
+    async def get_logs(self, start: int, end: int) -> List[dict]:
+        """the logs of [start, end], split in halves as long as the range is too large"""
+        for attempt in itertools.count():
+            try:
+                return await self.client.call("eth_getLogs", self._filter(start, end))
+            except (RpcError, HttpError, asyncio.TimeoutError, OSError, ValueError) as e:
+                if is_range_error(e) and start < end:
+                    self.stats.splits += 1
+                    self.range_size = max(1, min(self.range_size, end - start + 1) // 2)
+                    middle = (start + end) // 2
+                    return await self.get_logs(start, middle) + await self.get_logs(middle + 1, end)
+
+                if attempt >= self.retries:
+                    raise
+                self.stats.retries += 1
+                await asyncio.sleep(self.retry_delay * 2**attempt)
+
+    def checkpoint_state(self, next_block: int, output_offset: int) -> dict:
+        return {
+            "address": self.address,
+            "topics": self.decoder.topics,
+            "next_block": next_block,
+            "range_size": self.range_size,
+            "output_offset": output_offset,
+        }
+
+    def resume(self, checkpoint: dict) -> int:
+        """continues from a checkpoint, returns the size the output must be truncated to"""
+        if checkpoint["address"] != self.address or checkpoint["topics"] != self.decoder.topics:
+            raise InvalidCheckpoint("the checkpoint is for a different address or events")
+
+        self.from_block = checkpoint["next_block"]
+        self.range_size = checkpoint["range_size"]
+        return checkpoint["output_offset"]
+
+    async def fetch(
+        self,
+        write: Callable[[List[dict]], int],
+        save: Optional[Callable[[int], None]] = None,
+        report: Optional[Callable[[FetchStats], None]] = None,
+        report_interval: float = 1.0,
+    ) -> FetchStats:
+        """
+        Fetches the logs, and calls write(decoded logs) for each range in block order. write returns the output
+        offset after the range, that is passed to save(next block, offset) once the range is written.
+        """
+        next_start = self.from_block
+        next_write = self.from_block
+
+        # start -> (end, logs) of the ranges that completed before an earlier one
+        completed: Dict[int, Tuple[int, List[dict]]] = {}
+        written = asyncio.Event()
+        begin = last_report = time.perf_counter()
+
+        def flush():
+            nonlocal next_write, last_report
+            while next_write in completed:
+                end, logs = completed.pop(next_write)
+                decoded = [self.decoder.decode(log) for log in logs]
+                records = sorted(
+                    (log for log in decoded if log is not None), key=lambda log: (log["blockNumber"], log["logIndex"])
+                )
+                offset = write(records)
+
+                self.stats.blocks += end - next_write + 1
+                self.stats.logs += len(records)
+                self.stats.skipped += len(logs) - len(records)
+                next_write = end + 1
+                if save is not None:
+                    save(next_write, offset)
+
+            written.set()
+            self.stats.range_size = self.range_size
+            self.stats.elapsed = time.perf_counter() - begin
+            if report is not None and time.perf_counter() - last_report >= report_interval:
+                report(self.stats)
+                last_report = time.perf_counter()
+
+        async def worker():
+            nonlocal next_start
+            while next_start <= self.to_block:
+                if len(completed) >= MAX_BUFFERED_RANGES:
+                    written.clear()
+                    await written.wait()
+                    continue
+
+                start, size = next_start, self.range_size
+                end = min(start + size - 1, self.to_block)
+                next_start = end + 1
+
+                logs = await self.get_logs(start, end)
+                self.stats.ranges += 1
+                # full ranges with few logs grow the range size, unless a range was split since
+                if len(logs) < self.sparse_logs and end - start + 1 == size and self.range_size <= size:
+                    self.range_size = min(self.max_range, self.range_size * 2)
+
+                completed[start] = (end, logs)
+                flush()
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        self.stats.elapsed = time.perf_counter() - begin
+        if report is not None:
+            report(self.stats)
+        return self.stats
+
+
+async def fetch_logs(
+    url: str,
+    address: Optional[str],
+    abi: Sequence[dict],
+    output: str,
+    from_block: int,
+    to_block: Optional[int] = None,
+    event_names: Optional[Sequence[str]] = None,
+    checkpoint: Optional[str] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    report: Optional[Callable[[FetchStats], None]] = None,
+    **kwargs,
+) -> FetchStats:
+    """
+    Fetches the decoded events of address to the output file as JSON lines, from from_block to to_block (the latest
+    block by default). With a checkpoint path, a fetch that was stopped resumes where it stopped, it must be restarted
+    with the same address and events. kwargs are passed to `LogFetcher`.
+    """
+    client = RpcClient(url, timeout)
+    decoder = EventDecoder(abi, event_names)
+    if to_block is None:
+        to_block = int(await client.call("eth_blockNumber"), 16)
+
+    fetcher = LogFetcher(client, address, decoder, from_block, to_block, **kwargs)
+    offset = 0
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            offset = fetcher.resume(json.load(f))
+
+    with open(output, "ab") as out:
+        out.truncate(offset)
+
+        def write(records):
+            out.write(b"".join(json.dumps(record).encode() + b"\n" for record in records))
+            out.flush()
+            return out.tell()
+
+        def save(next_block, output_offset):
+            if checkpoint is not None:
+                _write_json(checkpoint, fetcher.checkpoint_state(next_block, output_offset))
+
+        return await fetcher.fetch(write, save, report)
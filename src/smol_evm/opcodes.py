@@ -7,7 +7,7 @@ from typing import Callable, Optional, Sequence, Union
 from eth_utils import keccak
 from math import ceil
 
-from .context import ExecutionContext
+from .context import ExecutionContext, Message
 from .exceptions import InvalidCodeOffset, UnknownOpcode, InvalidJumpDestination
 from .constants import MAX_UINT256
 
@@ -346,10 +346,19 @@ def SHA3(ctx: ExecutionContext) -> None:
     ctx.stack.push(int.from_bytes(keccak(content), "big"))
 
 
-# TODO: placeholder for now
+@insn(0x30)
+def ADDRESS(ctx: ExecutionContext) -> None:
+    ctx.stack.push(ctx.address)
+
+
+@insn(0x33)
+def CALLER(ctx: ExecutionContext) -> None:
+    ctx.stack.push(ctx.caller)
+
+
 @insn(0x34)
 def CALLVALUE(ctx: ExecutionContext) -> None:
-    ctx.stack.push(0)
+    ctx.stack.push(ctx.callvalue)
 
 
 @insn(0x35)
@@ -383,6 +392,22 @@ def EXTCODECOPY(ctx: ExecutionContext) -> None:
         ctx.memory.store(dest_offset + i, 0x42)
 
 
+@insn(0x3D)
+def RETURNDATASIZE(ctx: ExecutionContext) -> None:
+    ctx.stack.push(len(ctx.last_returndata))
+
+
+@insn(0x3E)
+def RETURNDATACOPY(ctx: ExecutionContext) -> None:
+    dest_offset, offset, size = ctx.stack.pop(), ctx.stack.pop(), ctx.stack.pop()
+    if offset + size > len(ctx.last_returndata):
+        ctx.stop(success=False, reason=f"RETURNDATACOPY out of bounds: {offset}+{size} > {len(ctx.last_returndata)}")
+        return
+
+    for i in range(size):
+        ctx.memory.store(dest_offset + i, ctx.last_returndata[offset + i])
+
+
 @insn(0x50)
 def POP(ctx: ExecutionContext) -> None:
     ctx.stack.pop()
@@ -410,7 +435,7 @@ def SLOAD(ctx: ExecutionContext) -> None:
 
 @insn(0x55)
 def SSTORE(ctx: ExecutionContext) -> None:
-    ctx.storage.put(slot=ctx.stack.pop(), value=ctx.stack.pop())
+    ctx.sstore(slot=ctx.stack.pop(), value=ctx.stack.pop())
 
 
 def _do_jump(ctx: ExecutionContext, target_pc: int) -> None:
@@ -497,6 +522,39 @@ SWAP15 = insn(0x9E, "SWAP15")(lambda ctx: ctx.stack.swap(15))
 SWAP16 = insn(0x9F, "SWAP16")(lambda ctx: ctx.stack.swap(16))
 
 
+def _read_memory(ctx: ExecutionContext, offset: int, size: int) -> bytes:
+    # a zero-sized read does not touch (or expand) memory, whatever the offset
+    return ctx.memory.load_range(offset, size) if size else bytes()
+
+
+def _call(ctx: ExecutionContext, kind: str, gas: int, address: int, value: int, is_static: bool) -> None:
+    args_offset, args_size, ret_offset, ret_size = ctx.stack.pop(), ctx.stack.pop(), ctx.stack.pop(), ctx.stack.pop()
+
+    # there is no gas metering: the gas argument is ignored, and so are balances (the value is only passed along)
+    ctx.message = Message(
+        kind=kind,
+        caller=ctx.caller if kind == "DELEGATECALL" else ctx.address,
+        address=ctx.address if kind == "DELEGATECALL" else address,
+        code_address=address,
+        value=value,
+        calldata=_read_memory(ctx, args_offset, args_size),
+        ret_offset=ret_offset,
+        ret_size=ret_size,
+        is_static=is_static,
+    )
+
+
+@insn(0xF1)
+def CALL(ctx: ExecutionContext) -> None:
+    """Message-call into an account. The call itself is executed by the runner, which then pushes the result."""
+    gas, address, value = ctx.stack.pop(), ctx.stack.pop(), ctx.stack.pop()
+    if ctx.is_static and value != 0:
+        ctx.stop(success=False, reason="CALL with value in a static context")
+        return
+
+    _call(ctx, "CALL", gas, address, value, ctx.is_static)
+
+
 @insn(0xF3)
 def RETURN(ctx: ExecutionContext) -> None:
     offset, length = ctx.stack.pop(), ctx.stack.pop()
@@ -504,10 +562,24 @@ def RETURN(ctx: ExecutionContext) -> None:
     ctx.stop(success=True)
 
 
-# TODO: no-op for now
+@insn(0xF4)
+def DELEGATECALL(ctx: ExecutionContext) -> None:
+    """Message-call into this account with the code of another account, keeping the caller and callvalue."""
+    gas, address = ctx.stack.pop(), ctx.stack.pop()
+    _call(ctx, "DELEGATECALL", gas, address, ctx.callvalue, ctx.is_static)
+
+
+@insn(0xFA)
+def STATICCALL(ctx: ExecutionContext) -> None:
+    """Message-call into an account, disallowing any state modification in the callee."""
+    gas, address = ctx.stack.pop(), ctx.stack.pop()
+    _call(ctx, "STATICCALL", gas, address, 0, True)
+
+
 @insn(0xFD)
 def REVERT(ctx: ExecutionContext) -> None:
     offset, length = ctx.stack.pop(), ctx.stack.pop()
+    ctx.returndata = _read_memory(ctx, offset, length)
     ctx.stop(success=False)
 
 
@@ -551,11 +623,11 @@ def decode_opcode(context: ExecutionContext) -> Instruction:
 
     # section 9.4.1 of the yellow paper, if pc is outside code, then the operation to be executed is STOP
     if context.pc >= len(context.code):
-        return REGISTRY[STOP]
+        return REGISTRY.by_code[0x00]
 
     # increments context.pc
     opcode = context.read_code(1)
-    instruction = REGISTRY[opcode]
+    instruction = REGISTRY.by_code[opcode]
     if instruction is None:
         return Instruction(opcode, f"UNKNOWN 0x{opcode:02x}")
 
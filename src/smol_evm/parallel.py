@@ -0,0 +1,302 @@
+"""
+Optimistic parallel execution of a block of transactions, in the style of Block-STM.
+
+Transactions are executed speculatively in worker processes, each against an estimate of the state it will see: the
+base state plus the writes of all the lower transactions, as far as we know them. Every storage read, storage write
+and account access is recorded. Results are then validated in block order: a transaction is committed if everything
+it read matches the state left by the transactions before it, otherwise it is executed again in the next round.
+
+The first uncommitted transaction always runs against the exact committed state, so every round commits at least one
+transaction, and the final state is exactly the one of sequential execution.
+"""
+
+import copy
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from .constants import is_valid_uint256
+from .context import AccountState, InvalidStorageSlot, InvalidStorageValue, Storage, WorldState
+from .runner import EXECUTION_ERRORS, ExecutionLimitReached, run
+from .state import pack_accounts, unpack_accounts
+
+# ("slot", address, slot) -> value, or ("code", address) -> code hash (None for missing accounts)
+Key = Tuple
+
+
+@dataclass
+class Transaction:
+    to: int
+    calldata: bytes = bytes()
+    caller: int = 0
+    callvalue: int = 0
+
+
+@dataclass
+class TransactionResult:
+    index: int
+    success: bool
+    returndata: bytes
+    reads: Dict[Key, object]
+    writes: Dict[Key, int]
+
+    # set if the execution halted with an exception, which is only raised once the reads are validated
+    error: Optional[str] = None
+
+
+@dataclass
+class BlockReport:
+    results: List[TransactionResult]
+    rounds: int = 0
+    executions: int = 0
+    parallel_time: float = 0.0
+    sequential_time: Optional[float] = None
+
+    @property
+    def reexecutions(self) -> int:
+        return self.executions - len(self.results)
+
+    @property
+    def conflict_rate(self) -> float:
+        """re-executions per transaction"""
+        return self.reexecutions / len(self.results) if self.results else 0.0
+
+    @property
+    def speedup(self) -> Optional[float]:
+        if self.sequential_time is None or not self.parallel_time:
+            return None
+        return self.sequential_time / self.parallel_time
+
+    def __str__(self) -> str:
+        lines = [
+            f"transactions: {len(self.results)} ({sum(not r.success for r in self.results)} failed)",
+            f"rounds: {self.rounds}",
+            f"executions: {self.executions} ({self.conflict_rate:.1%} conflict rate)",
+            f"parallel: {self.parallel_time:.3f}s",
+        ]
+        if self.sequential_time is not None:
+            lines.append(f"sequential: {self.sequential_time:.3f}s (speedup {self.speedup:.2f}x)")
+        return "\n".join(lines)
+
+
+class _TrackedStorage(Storage):
+    def __init__(self, state: "_TransactionState", address: int) -> None:
+        self.state = state
+        self.address = address
+
+    @property
+    def data(self):
+        return {key[2]: value for key, value in self.state.writes.items() if key[1] == self.address}
+
+    def get(self, slot):
+        if not is_valid_uint256(slot):
+            raise InvalidStorageSlot(slot)
+        return self.state.read(("slot", self.address, slot))
+
+    def put(self, slot, value):
+        if not is_valid_uint256(slot):
+            raise InvalidStorageSlot(slot)
+
+        if not is_valid_uint256(value):
+            raise InvalidStorageValue(value)
+
+        self.state.writes[("slot", self.address, slot)] = value
+
+
+class _TransactionState(WorldState):
+    """the world state as seen by one speculative execution: base state + estimated writes, with read tracking"""
+
+    def __init__(self, base: WorldState, estimates: Dict[Key, int]) -> None:
+        self.base = base
+        self.estimates = estimates
+        self.reads = {}
+        self.writes = {}
+        self.views = {}
+
+    @property
+    def accounts(self):
+        return self.views
+
+    def read(self, key: Key):
+        if key in self.writes:
+            return self.writes[key]
+
+        if key not in self.reads:
+            self.reads[key] = self.estimates[key] if key in self.estimates else _base_value(self.base, key)
+        return self.reads[key]
+
+    def find(self, address):
+        if address in self.views:
+            return self.views[address]
+
+        self.read(("code", address))
+        account = self.base.find(address)
+        if account is None:
+            return None
+
+        view = AccountState(nonce=account.nonce, balance=account.balance, storage=_TrackedStorage(self, address))
+        view.code_handle = account.code_handle
+        self.views[address] = view
+        return view
+
+    def set(self, address, account):
+        raise NotImplementedError("transactions can't create accounts yet")
+
+
+def _base_value(base: WorldState, key: Key):
+    account = base.find(key[1])
+    if key[0] == "code":
+        return account.code_handle.code_hash if account is not None else None
+    return account.storage.get(key[2]) if account is not None else 0
+
+
+def _execute(
+    base: WorldState, index: int, tx: Transaction, estimates: Dict[Key, int], max_steps: int, raise_errors=False
+):
+    state = _TransactionState(base, estimates)
+    account = state.find(tx.to)
+    code = account.code if account is not None else bytes()
+    try:
+        context = run(
+            code,
+            calldata=tx.calldata,
+            max_steps=max_steps,
+            world_state=state,
+            address=tx.to,
+            caller=tx.caller,
+            callvalue=tx.callvalue,
+        )
+    except (*EXECUTION_ERRORS, ExecutionLimitReached) as e:
+        # a speculative execution against stale reads can take a path that the real one never takes
+        if raise_errors:
+            raise
+        return TransactionResult(index, False, bytes(), state.reads, {}, error=f"{type(e).__name__}: {e}")
+
+    # failed calls restore the previous values, these writes don't change anything
+    writes = {key: value for key, value in state.writes.items() if state.reads.get(key) != value}
+    return TransactionResult(index, bool(context.success), context.returndata, state.reads, writes)
+
+
+# the base state of the worker processes, set once by the pool initializer
+_worker_state = None
+
+
+def _init_worker(accounts) -> None:
+    global _worker_state
+    _worker_state = unpack_accounts(accounts)
+
+
+def _worker_execute(job):
+    return _execute(_worker_state, *job)
+
+
+def _consistent(base: WorldState, result: TransactionResult, view: Dict[Key, int]) -> bool:
+    return all((view[key] if key in view else _base_value(base, key)) == value for key, value in result.reads.items())
+
+
+def execute_sequential(world_state: WorldState, transactions: List[Transaction], max_steps=0) -> List:
+    """the reference semantics: runs the transactions one after the other, directly on the world state"""
+    contexts = []
+    for tx in transactions:
+        account = world_state.find(tx.to)
+        code = account.code if account is not None else bytes()
+        contexts.append(
+            run(
+                code,
+                calldata=tx.calldata,
+                max_steps=max_steps,
+                world_state=world_state,
+                address=tx.to,
+                caller=tx.caller,
+                callvalue=tx.callvalue,
+            )
+        )
+    return contexts
+
+
+def execute_block(
+    world_state: WorldState, transactions: List[Transaction], processes=None, max_steps=0, compare=False
+) -> BlockReport:
+    """
+    Executes the transactions in parallel and applies their writes to the world state.
+
+    processes=1 runs everything in the current process (still speculatively). With compare=True, the block is also
+    executed sequentially on a copy of the state, to measure the speedup and check that both final states match.
+    """
+    report = BlockReport(results=[None] * len(transactions))
+
+    sequential_state = None
+    if compare:
+        sequential_state = copy.deepcopy(world_state)
+        start = time.perf_counter()
+        execute_sequential(sequential_state, transactions, max_steps)
+        report.sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pool = (
+        Pool(processes, initializer=_init_worker, initargs=(pack_accounts(world_state),)) if processes != 1 else None
+    )
+    try:
+        committed = _schedule(world_state, transactions, report, pool, max_steps)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    for (_, address, slot), value in committed.items():
+        world_state.get(address).storage.put(slot, value)
+    report.parallel_time = time.perf_counter() - start
+
+    if sequential_state is not None:
+        for address, account in world_state.accounts.items():
+            expected = sequential_state.get(address).storage
+            if {k: v for k, v in account.storage.data.items() if v} != {k: v for k, v in expected.data.items() if v}:
+                raise AssertionError(f"parallel and sequential execution disagree on the storage of {hex(address)}")
+
+    return report
+
+
+def _schedule(base: WorldState, transactions, report: BlockReport, pool, max_steps: int) -> Dict[Key, int]:
+    results = report.results
+    committed = {}
+    next_to_commit = 0
+    to_run = list(range(len(transactions)))
+
+    def estimates(i):
+        # committed writes, then the speculative writes of the uncommitted transactions before i, in block order
+        view = dict(committed)
+        for j in range(next_to_commit, i):
+            if results[j] is not None:
+                view.update(results[j].writes)
+        return view
+
+    while next_to_commit < len(transactions):
+        report.rounds += 1
+        jobs = [(i, transactions[i], estimates(i), max_steps) for i in to_run]
+        if pool is not None:
+            executed = pool.map(_worker_execute, jobs)
+        else:
+            executed = [_execute(base, *job) for job in jobs]
+
+        report.executions += len(jobs)
+        for result in executed:
+            results[result.index] = result
+
+        # validate and commit in block order
+        while next_to_commit < len(transactions) and _consistent(base, results[next_to_commit], committed):
+            if results[next_to_commit].error is not None:
+                # the execution saw the committed state, so sequential execution halts too: raise its exception
+                _execute(base, next_to_commit, transactions[next_to_commit], committed, max_steps, raise_errors=True)
+
+            committed.update(results[next_to_commit].writes)
+            next_to_commit += 1
+
+        # the first uncommitted transaction now sees the exact state, the others only if their estimates changed
+        to_run = [
+            i
+            for i in range(next_to_commit, len(transactions))
+            if i == next_to_commit or not _consistent(base, results[i], estimates(i))
+        ]
+
+    return committed
@@ -0,0 +1,364 @@
+"""
+Deterministic record and replay of executions.
+
+`record()` runs the code against a `RecordingWorldState`, which wraps the real world state like
+`accesslist.TracingWorldState` does, and captures every external input the run consumes:
+
+- the code, calldata, and environment (address, caller, callvalue)
+- the accounts looked up by execution (including the ones that don't exist)
+- the original value of every storage slot read before the run wrote it
+
+`replay()` runs the same code again from the recording alone, through a `PersistentWorldState` backed by the recorded
+accounts and slots. Replays don't need the original world state, so slow production cases can be profiled and
+benchmarked in isolation. A replay that looks up an account or slot that was not recorded raises `ReplayDivergence`:
+the interpreter no longer behaves the way it did when the recording was made.
+
+GAS is a constant in this interpreter, so there is no gas to record.
+
+Recordings are saved as a zlib-compressed binary file (all integers are big-endian):
+
+    header      magic "SMOLREPL", version: u32
+    env         address: 20 bytes, caller: 20 bytes, callvalue: 32 bytes
+    limits      max_steps: u64 (0 for no limit, since version 2)
+    outcome     status: u8 (0 failed, 1 succeeded, 2 raised), returndata, error (utf-8)
+    inputs      code, calldata
+    accounts    num_accounts: u32, then (address: 20 bytes, exists: u8, nonce: u64, balance: 32 bytes, code) each
+    slots       num_slots: u32, then (address: 20 bytes, slot: 32 bytes, value: 32 bytes) each
+
+where returndata, error, code and calldata are each a u32 length followed by the bytes.
+"""
+
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from .context import AccountState, ExecutionContext, Storage, WorldState
+from .runner import EXECUTION_ERRORS, ExecutionLimitReached, run
+from .state import AccountFields, PersistentWorldState, StateBackend
+
+MAGIC = b"SMOLREPL"
+VERSION = 2
+
+HEADER = struct.Struct(">8sI")
+ENV = struct.Struct(">20s20s32s")
+ACCOUNT = struct.Struct(">20sBQ32s")
+SLOT = struct.Struct(">20s32s32s")
+U32 = struct.Struct(">I")
+U64 = struct.Struct(">Q")
+U8 = struct.Struct(">B")
+
+STATUS_FAILED = 0
+STATUS_SUCCEEDED = 1
+STATUS_RAISED = 2
+
+
+class InvalidRecording(Exception): ...
+
+
+class ReplayDivergence(Exception): ...
+
+
+@dataclass
+class Recording:
+    code: bytes
+    calldata: bytes = bytes()
+    address: int = 0
+    caller: int = 0
+    callvalue: int = 0
+
+    # the step limit of the recorded run, replays get the same one (0 for no limit)
+    max_steps: int = 0
+
+    # address -> (nonce, balance, code), or None for accounts that didn't exist
+    accounts: Dict[int, Optional[AccountFields]] = field(default_factory=dict)
+
+    # (address, slot) -> value before the run
+    slots: Dict[Tuple[int, int], int] = field(default_factory=dict)
+
+    # the outcome of the recorded run, error is set if it raised
+    success: Optional[bool] = None
+    returndata: bytes = bytes()
+    error: Optional[str] = None
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def to_bytes(self) -> bytes:
+        if self.error is not None:
+            status = STATUS_RAISED
+        else:
+            status = STATUS_SUCCEEDED if self.success else STATUS_FAILED
+
+        parts = [
+            HEADER.pack(MAGIC, VERSION),
+            ENV.pack(_address(self.address), _address(self.caller), _word(self.callvalue)),
+            U64.pack(self.max_steps),
+            U8.pack(status),
+            _blob(self.returndata),
+            _blob((self.error or "").encode()),
+            _blob(self.code),
+            _blob(self.calldata),
+            U32.pack(len(self.accounts)),
+        ]
+
+        for address, fields in sorted(self.accounts.items()):
+            nonce, balance, code = fields if fields is not None else (0, 0, bytes())
+            parts.append(ACCOUNT.pack(_address(address), fields is not None, nonce, _word(balance)))
+            parts.append(_blob(code))
+
+        parts.append(U32.pack(len(self.slots)))
+        for (address, slot), value in sorted(self.slots.items()):
+            parts.append(SLOT.pack(_address(address), _word(slot), _word(value)))
+
+        return zlib.compress(b"".join(parts))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Recording":
+        try:
+            reader = _Reader(zlib.decompress(data))
+        except zlib.error as e:
+            raise InvalidRecording(f"not a recording: {e}")
+
+        magic, version = reader.unpack(HEADER)
+        if magic != MAGIC:
+            raise InvalidRecording(f"bad magic {magic!r}")
+        if version not in (1, VERSION):
+            raise InvalidRecording(f"unsupported version {version}")
+
+        address, caller, callvalue = reader.unpack(ENV)
+        (max_steps,) = reader.unpack(U64) if version >= 2 else (0,)
+        (status,) = reader.unpack(U8)
+        recording = cls(
+            address=_int(address),
+            caller=_int(caller),
+            callvalue=_int(callvalue),
+            max_steps=max_steps,
+            returndata=reader.blob(),
+            error=reader.blob().decode() or None,
+            code=reader.blob(),
+            calldata=reader.blob(),
+        )
+        if status != STATUS_RAISED:
+            recording.success = status == STATUS_SUCCEEDED
+
+        (num_accounts,) = reader.unpack(U32)
+        for _ in range(num_accounts):
+            address, exists, nonce, balance = reader.unpack(ACCOUNT)
+            code = reader.blob()
+            recording.accounts[_int(address)] = (nonce, _int(balance), code) if exists else None
+
+        (num_slots,) = reader.unpack(U32)
+        for _ in range(num_slots):
+            address, slot, value = reader.unpack(SLOT)
+            recording.slots[(_int(address), _int(slot))] = _int(value)
+
+        return recording
+
+
+def _address(value: int) -> bytes:
+    return value.to_bytes(20, "big")
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def _int(value: bytes) -> int:
+    return int.from_bytes(value, "big")
+
+
+def _blob(data: bytes) -> bytes:
+    return U32.pack(len(data)) + data
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, record: struct.Struct) -> tuple:
+        if self.offset + record.size > len(self.data):
+            raise InvalidRecording("truncated recording")
+
+        values = record.unpack_from(self.data, self.offset)
+        self.offset += record.size
+        return values
+
+    def blob(self) -> bytes:
+        (length,) = self.unpack(U32)
+        if self.offset + length > len(self.data):
+            raise InvalidRecording("truncated recording")
+
+        data = self.data[self.offset : self.offset + length]
+        self.offset += length
+        return data
+
+
+class RecordingStorage(Storage):
+    """records the original value of the slots read before they are written, and forwards everything"""
+
+    def __init__(self, storage: Storage, recording: Recording, address: int) -> None:
+        self.storage = storage
+        self.recording = recording
+        self.address = address
+
+        # slots written by this run, reading them doesn't consume any input
+        self.written = set()
+
+    @property
+    def data(self):
+        return self.storage.data
+
+    def get(self, slot):
+        value = self.storage.get(slot)
+        key = (self.address, slot)
+        if slot not in self.written and key not in self.recording.slots:
+            self.recording.slots[key] = value
+        return value
+
+    def put(self, slot, value):
+        self.storage.put(slot, value)
+        self.written.add(slot)
+
+
+class RecordingWorldState(WorldState):
+    """
+    Wraps a world state and records the accounts looked up during execution, and the slots they read.
+
+    Like `accesslist.TracingWorldState`, accounts are returned as views that share the code and storage of the wrapped
+    accounts. Missing accounts stay missing, and are recorded as such.
+    """
+
+    def __init__(self, world_state: WorldState, recording: Recording) -> None:
+        self.world_state = world_state
+        self.recording = recording
+        self.views = {}
+
+    @property
+    def accounts(self):
+        return self.world_state.accounts
+
+    def find(self, address):
+        if address in self.views:
+            return self.views[address]
+
+        account = self.world_state.find(address)
+        view = None
+        if account is not None:
+            view = AccountState(
+                nonce=account.nonce,
+                balance=account.balance,
+                storage=RecordingStorage(account.storage, self.recording, address),
+            )
+            view.code_handle = account.code_handle
+
+        self.recording.accounts.setdefault(
+            address, (account.nonce, account.balance, account.code) if account is not None else None
+        )
+        self.views[address] = view
+        return view
+
+    def get(self, address):
+        account = self.find(address)
+        if account is None:
+            raise KeyError(address)
+        return account
+
+    def set(self, address, account):
+        self.views.pop(address, None)
+        self.world_state.set(address, account)
+
+
+class ReplayBackend(StateBackend):
+    """a read-only StateBackend over a recording, that fails on anything the recorded run didn't read"""
+
+    def __init__(self, recording: Recording) -> None:
+        self.recording = recording
+
+    def load_account(self, address: int) -> Optional[AccountFields]:
+        try:
+            return self.recording.accounts[address]
+        except KeyError:
+            raise ReplayDivergence(f"account {hex(address)} was not looked up by the recorded run")
+
+    def load_slot(self, address: int, slot: int) -> int:
+        try:
+            return self.recording.slots[(address, slot)]
+        except KeyError:
+            raise ReplayDivergence(f"slot {hex(slot)} of {hex(address)} was not read by the recorded run")
+
+    def write_batch(self, accounts, slots) -> None:
+        raise NotImplementedError("recordings are read-only")
+
+
+def record(
+    code: bytes,
+    calldata=bytes(),
+    world_state: WorldState = None,
+    address=0,
+    caller=0,
+    callvalue=0,
+    max_steps=0,
+    **kwargs,
+) -> Tuple[Optional[ExecutionContext], Recording]:
+    """
+    Runs the code and records its inputs, kwargs are passed to `run`.
+
+    Returns (context, recording). Runs that raise are recorded too: the context is then None, and the error is kept
+    in the recording, so that failing cases can be replayed as well.
+    """
+    recording = Recording(
+        code=code, calldata=bytes(calldata), address=address, caller=caller, callvalue=callvalue, max_steps=max_steps
+    )
+    recorder = RecordingWorldState(world_state if world_state is not None else WorldState(), recording)
+
+    try:
+        context = run(
+            code,
+            calldata=calldata,
+            world_state=recorder,
+            address=address,
+            caller=caller,
+            callvalue=callvalue,
+            max_steps=max_steps,
+            **kwargs,
+        )
+    except ExecutionLimitReached:
+        recording.error = "ExecutionLimitReached"
+        return None, recording
+    except EXECUTION_ERRORS as e:
+        recording.error = f"{type(e).__name__}: {e}"
+        return None, recording
+
+    recording.success = context.success
+    recording.returndata = context.returndata
+    return context, recording
+
+
+def replay_state(recording: Recording) -> PersistentWorldState:
+    """a world state with the recorded accounts and slots, writes stay in memory"""
+    return PersistentWorldState(ReplayBackend(recording))
+
+
+def replay(recording: Recording, **kwargs) -> ExecutionContext:
+    """
+    Runs the recorded code again without the original world state, with the recorded step limit. kwargs are passed to
+    `run` (e.g. threaded).
+    """
+    kwargs.setdefault("max_steps", recording.max_steps)
+    return run(
+        recording.code,
+        calldata=recording.calldata,
+        world_state=replay_state(recording),
+        address=recording.address,
+        caller=recording.caller,
+        callvalue=recording.callvalue,
+        **kwargs,
+    )
@@ -0,0 +1,358 @@
+"""
+A local JSON-RPC server backed by smol-evm, for simulation work that doesn't need a real node.
+
+Supported methods: eth_call, eth_estimateGas, eth_getCode, eth_getStorageAt, eth_chainId, and smol_metrics (request
+latencies per method). Batch requests are supported. The block parameter is accepted and ignored: there is only one
+state, and it never changes.
+
+Calls are executed in a process pool, so concurrent requests scale across cores. Each worker loads the state once:
+snapshots are opened (and mmap'ed) by every worker, in-memory world states are pickled to the workers at startup.
+"""
+
+import asyncio
+import inspect
+import json
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Optional
+
+from .context import WorldState
+from .runner import EXECUTION_ERRORS, ExecutionLimitReached, run
+from .state import pack_accounts, unpack_accounts
+
+DEFAULT_CHAIN_ID = 31337
+
+# number of latency samples kept per method for the percentiles
+LATENCY_SAMPLES = 1000
+
+# smol-evm has no gas metering, eth_estimateGas prices the executed instructions with this coarse schedule instead
+INTRINSIC_GAS = 21000
+DEFAULT_STEP_GAS = 3
+STEP_GAS = {
+    "SLOAD": 2100,
+    "SSTORE": 20000,
+    "SHA3": 36,
+    "EXP": 60,
+    "CALL": 2600,
+    "STATICCALL": 2600,
+    "DELEGATECALL": 2600,
+    "JUMP": 8,
+    "JUMPI": 10,
+    "JUMPDEST": 1,
+}
+
+# https://eips.ethereum.org/EIPS/eip-1474
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+EXECUTION_ERROR = 3
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str, data: Optional[str] = None) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def __reduce__(self):
+        # errors raised in the worker processes are pickled back to the server
+        return RpcError, (self.code, self.message, self.data)
+
+    def to_json(self) -> dict:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+def parse_quantity(value: str, name: str) -> int:
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        raise RpcError(INVALID_PARAMS, f"invalid {name}: {value!r}")
+
+
+def parse_data(value: Optional[str], name: str) -> bytes:
+    if not value:
+        return bytes()
+
+    try:
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    except (AttributeError, ValueError):
+        raise RpcError(INVALID_PARAMS, f"invalid {name}: {value!r}")
+
+
+def load_state(spec) -> WorldState:
+    """spec is ("snapshot", path) or ("accounts", packed accounts)"""
+    kind, value = spec
+    if kind == "snapshot":
+        from .snapshot import open_snapshot
+
+        return open_snapshot(value)
+
+    return unpack_accounts(value)
+
+
+def execute_call(world_state: WorldState, tx: dict, estimate_gas: bool = False, max_steps: int = 0):
+    """executes a call object, returns (success, returndata, gas estimate)"""
+    to = parse_quantity(tx.get("to"), "to")
+    calldata = parse_data(tx.get("data", tx.get("input")), "data")
+
+    account = world_state.find(to)
+    code = account.code if account is not None else bytes()
+
+    gas = [INTRINSIC_GAS + sum(4 if b == 0 else 16 for b in calldata)]
+
+    def prehook(context, instruction):
+        gas[0] += STEP_GAS.get(instruction.name, DEFAULT_STEP_GAS)
+
+    caller = parse_quantity(tx.get("from", "0x0"), "from")
+    callvalue = parse_quantity(tx.get("value", "0x0"), "value")
+
+    # run() rolls back the storage writes of calls that halt with an exception
+    try:
+        context = run(
+            code,
+            calldata=calldata,
+            max_steps=max_steps,
+            prehook=prehook if estimate_gas else None,
+            world_state=world_state,
+            address=to,
+            caller=caller,
+            callvalue=callvalue,
+        )
+    except ExecutionLimitReached:
+        raise RpcError(EXECUTION_ERROR, f"execution exceeded {max_steps} steps")
+    except EXECUTION_ERRORS as e:
+        raise RpcError(EXECUTION_ERROR, f"execution halted: {type(e).__name__}{f': {e}' if str(e) else ''}")
+
+    # the state is shared by all the requests, eth_call must not modify it
+    context.revert_journal(0)
+
+    return bool(context.success), context.returndata, gas[0]
+
+
+# the state of the worker processes, loaded once by the pool initializer
+_worker_state = None
+
+
+def _init_worker(spec) -> None:
+    global _worker_state
+    _worker_state = load_state(spec)
+
+
+def _worker_call(tx: dict, estimate_gas: bool, max_steps: int):
+    return execute_call(_worker_state, tx, estimate_gas, max_steps)
+
+
+class LatencyMetrics:
+    def __init__(self) -> None:
+        self.counts = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.total = defaultdict(float)
+        self.samples = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def record(self, method: str, seconds: float, error: bool) -> None:
+        self.counts[method] += 1
+        self.total[method] += seconds
+        self.samples[method].append(seconds)
+        if error:
+            self.errors[method] += 1
+
+    def summary(self) -> dict:
+        summary = {}
+        for method, count in self.counts.items():
+            samples = sorted(self.samples[method])
+            summary[method] = {
+                "count": count,
+                "errors": self.errors[method],
+                "mean_ms": 1000 * self.total[method] / count,
+                "p50_ms": 1000 * samples[len(samples) // 2],
+                "p95_ms": 1000 * samples[min(len(samples) - 1, len(samples) * 95 // 100)],
+                "max_ms": 1000 * samples[-1],
+            }
+        return summary
+
+
+class RpcServer:
+    def __init__(
+        self,
+        world_state: WorldState = None,
+        snapshot_path: str = None,
+        processes: Optional[int] = None,
+        chain_id: int = DEFAULT_CHAIN_ID,
+        max_steps: int = 10_000_000,
+    ) -> None:
+        """
+        Serves either an in-memory world state or a snapshot file (see `smol_evm.snapshot`).
+
+        processes=0 executes the calls in the event loop, which is mostly useful for tests.
+        """
+        spec = ("snapshot", snapshot_path) if snapshot_path is not None else ("accounts", pack_accounts(world_state))
+        self.world_state = load_state(spec) if snapshot_path is not None else world_state
+        self.chain_id = chain_id
+        self.max_steps = max_steps
+        self.metrics = LatencyMetrics()
+
+        self.executor = None
+        if processes != 0:
+            self.executor = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(spec,))
+
+            # start the workers now: forking lazily from inside the running event loop can deadlock the pool
+            self.executor.submit(int).result()
+
+    async def _execute(self, tx: dict, estimate_gas: bool):
+        if not isinstance(tx, dict) or "to" not in tx:
+            raise RpcError(INVALID_PARAMS, "expected a call object with a 'to' field")
+
+        if self.executor is None:
+            return execute_call(self.world_state, tx, estimate_gas, self.max_steps)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _worker_call, tx, estimate_gas, self.max_steps)
+
+    async def eth_call(self, tx, block="latest"):
+        success, returndata, _ = await self._execute(tx, estimate_gas=False)
+        if not success:
+            raise RpcError(EXECUTION_ERROR, "execution reverted", f"0x{returndata.hex()}")
+        return f"0x{returndata.hex()}"
+
+    async def eth_estimateGas(self, tx, block="latest"):
+        success, returndata, gas = await self._execute(tx, estimate_gas=True)
+        if not success:
+            raise RpcError(EXECUTION_ERROR, "execution reverted", f"0x{returndata.hex()}")
+        return hex(gas)
+
+    async def eth_getCode(self, address, block="latest"):
+        account = self.world_state.find(parse_quantity(address, "address"))
+        return f"0x{account.code.hex()}" if account is not None else "0x"
+
+    async def eth_getStorageAt(self, address, slot, block="latest"):
+        account = self.world_state.find(parse_quantity(address, "address"))
+        value = account.storage.get(parse_quantity(slot, "slot")) if account is not None else 0
+        return f"0x{value:064x}"
+
+    async def eth_chainId(self):
+        return hex(self.chain_id)
+
+    async def smol_metrics(self):
+        return self.metrics.summary()
+
+    METHODS = ("eth_call", "eth_estimateGas", "eth_getCode", "eth_getStorageAt", "eth_chainId", "smol_metrics")
+
+    async def handle_request(self, request) -> Optional[dict]:
+        """handles a single JSON-RPC request object, returns None for notifications"""
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or "method" not in request:
+            return {"jsonrpc": "2.0", "id": None, "error": RpcError(INVALID_REQUEST, "invalid request").to_json()}
+
+        method = request["method"]
+        params = request.get("params", [])
+        start = time.perf_counter()
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            if method not in self.METHODS:
+                raise RpcError(METHOD_NOT_FOUND, f"method not found: {method}")
+
+            if not isinstance(params, list):
+                raise RpcError(INVALID_PARAMS, "params must be a list")
+
+            handler = getattr(self, method)
+            try:
+                inspect.signature(handler).bind(*params)
+            except TypeError as e:
+                raise RpcError(INVALID_PARAMS, str(e))
+
+            response["result"] = await handler(*params)
+
+        except RpcError as e:
+            response["error"] = e.to_json()
+
+        except Exception as e:
+            # a bug in the server or the interpreter, the other requests of a batch still get their responses
+            response["error"] = RpcError(INTERNAL_ERROR, f"internal error: {type(e).__name__}: {e}").to_json()
+
+        self.metrics.record(method, time.perf_counter() - start, "error" in response)
+        return response if "id" in request else None
+
+    async def handle_payload(self, payload: bytes):
+        try:
+            body = json.loads(payload)
+        except ValueError:
+            return {"jsonrpc": "2.0", "id": None, "error": RpcError(PARSE_ERROR, "parse error").to_json()}
+
+        if isinstance(body, list):
+            if not body:
+                return {"jsonrpc": "2.0", "id": None, "error": RpcError(INVALID_REQUEST, "empty batch").to_json()}
+
+            responses = await asyncio.gather(*(self.handle_request(request) for request in body))
+            return [response for response in responses if response is not None] or None
+
+        return await self.handle_request(body)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                method = request_line.split(b" ")[0]
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == b"POST":
+                    status, result = HTTPStatus.OK, await self.handle_payload(body)
+                elif method == b"GET":
+                    status, result = HTTPStatus.OK, self.metrics.summary()
+                else:
+                    status, result = HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+
+                content = json.dumps(result).encode() if result is not None else b""
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n\r\n".encode() + content
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8545):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def serve(server: RpcServer, host: str = "127.0.0.1", port: int = 8545) -> None:
+    async def main():
+        async with await server.start(host, port) as s:
+            print(f"listening on http://{host}:{port}")
+            await s.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -1,7 +1,21 @@
 from dataclasses import dataclass
 
-from .context import ExecutionContext, Calldata
+from .context import (
+    Calldata,
+    ExecutionContext,
+    FramePool,
+    InvalidCalldataAccess,
+    InvalidStorageSlot,
+    InvalidStorageValue,
+    Storage,
+)
+from .exceptions import EVMException, UnknownOpcode
+from .hooks import RECORD_DEPTH_SHIFT, RECORD_PC_SHIFT
+from .memory import InvalidMemoryAccess, InvalidMemoryValue
 from .opcodes import decode_opcode
+from .stack import InvalidStackItem, StackOverflow, StackUnderflow
+from .threaded import HANDLERS
+from .constants import MAX_CALL_DEPTH
 
 
 @dataclass
@@ -9,6 +23,22 @@ class ExecutionLimitReached(Exception):
     context: ExecutionContext
 
 
+# exceptional halts: in a nested call they make the call fail, in the top-level context they are raised to the caller
+EXECUTION_ERRORS = (
+    EVMException,
+    UnknownOpcode,
+    NotImplementedError,
+    StackUnderflow,
+    StackOverflow,
+    InvalidStackItem,
+    InvalidMemoryAccess,
+    InvalidMemoryValue,
+    InvalidCalldataAccess,
+    InvalidStorageSlot,
+    InvalidStorageValue,
+)
+
+
 def run(
     code: bytes,
     calldata=bytes(),
@@ -18,14 +48,195 @@ def run(
     posthook=None,
     print_stack=False,
     print_memory=False,
+    threaded=False,
+    world_state=None,
+    address=0,
+    caller=0,
+    callvalue=0,
+    hooks=None,
+    sink=None,
+    analysis=None,
 ) -> ExecutionContext:
     """
     Executes code in a fresh context.
+
+    By default, each instruction is decoded and executed through its reference implementation in `smol_evm.opcodes`.
+    With threaded=True, the run goes through the direct-threaded dispatch table from `smol_evm.threaded` instead,
+    which is much faster but can't be combined with hooks or tracing.
+
+    `hooks` (see `smol_evm.hooks.Hooks`) only fire on the opcodes or pcs they subscribe to. They are compiled into a
+    copy of the dispatch table, so a run with hooks always goes through the threaded loop.
+
+    `sink` (see `smol_evm.hooks.EventSink`) receives a packed record of every step, in batches. It also goes through the
+    threaded loop, and can be combined with `hooks`.
+
+    Message calls (CALL, STATICCALL, DELEGATECALL) are resolved against `world_state`, the code runs as the account
+    at `address`. The value of a CALL is only passed to the callee as CALLVALUE, balances are not moved (there is no
+    BALANCE opcode), and gas arguments are ignored. Storage writes are rolled back if the top-level context fails,
+    including when it halts with an exception, which is then raised.
+
+    `analysis` is the `CodeAnalysis` of code (see `smol_evm.codecache`), for callers that run the same code many times
+    without a world state: the jump destinations are then not recomputed on every run.
     """
-    context = ExecutionContext(code=code, calldata=Calldata(calldata))
-    num_steps = 0
+    if threaded and (prehook or posthook or verbose):
+        raise ValueError("threaded execution does not support hooks or verbose tracing")
+
+    if (hooks is not None or sink is not None) and (prehook or posthook or verbose):
+        raise ValueError("hooks and sinks can't be combined with prehook, posthook or verbose tracing")
+
+    account = world_state.find(address) if world_state is not None else None
+    storage = account.storage if account is not None else None
+    if analysis is None and account is not None and account.code == code:
+        analysis = account.code_handle
+
+    context = ExecutionContext(
+        code=code,
+        calldata=Calldata(calldata),
+        storage=storage,
+        analysis=analysis,
+        address=address,
+        caller=caller,
+        callvalue=callvalue,
+        world_state=world_state,
+    )
+
+    handlers = hooks.table() if hooks is not None else HANDLERS
+    if sink is not None:
+        step = lambda ctx, num_steps: _run_recorded(ctx, max_steps, sink, num_steps, handlers)
+    elif hooks is not None:
+        step = lambda ctx, num_steps: _run_threaded(ctx, max_steps, num_steps, handlers)
+    elif threaded:
+        step = lambda ctx, num_steps: _run_threaded(ctx, max_steps, num_steps)
+    else:
+        step = lambda ctx, num_steps: _run_decoded(
+            ctx, verbose, max_steps, prehook, posthook, print_stack, print_memory, num_steps
+        )
+
+    try:
+        _run_frames(context, step)
+    finally:
+        if sink is not None:
+            sink.flush()
+
+        # exceptional halts and ExecutionLimitReached leave success unset
+        if not context.success:
+            context.revert_journal(0)
+
+    if verbose:
+        print(f"Output: 0x{context.returndata.hex()}")
+
+    return context
+
+
+def resume(context: ExecutionContext, max_steps=0, num_steps=0) -> int:
+    """
+    Runs a context that is already under way (e.g. handed over by `smol_evm.lockstep`) to completion, through the
+    threaded loop. num_steps is the number of steps it already ran, they count against max_steps.
+
+    Like `run`, errors in the context are raised and storage writes are rolled back if it fails. Returns the total
+    number of steps.
+    """
+    try:
+        return _run_frames(context, lambda ctx, n: _run_threaded(ctx, max_steps, n), num_steps=num_steps)
+    finally:
+        if not context.success:
+            context.revert_journal(0)
+
+
+def _run_frames(root: ExecutionContext, step, pool=None, num_steps=0) -> int:
+    """
+    Runs the root context and all the message calls it makes, returns the number of steps.
+
+    Nested calls don't recurse in Python: the caller contexts wait on an explicit frame stack, so the depth is only
+    bounded by MAX_CALL_DEPTH. `step(context, num_steps)` runs a context until it stops or has a pending message, and
+    returns the updated step count (shared by all the frames, so that max_steps bounds the whole transaction).
+    """
+    pool = pool if pool is not None else FramePool()
+    frames = []
+    context = root
+
+    while True:
+        try:
+            num_steps = step(context, num_steps)
+        except EXECUTION_ERRORS as e:
+            if not frames:
+                raise
+            context.stop(success=False, reason=f"{type(e).__name__}: {e}")
 
-    while not context.is_stopped():
+        message = context.message
+        if message is not None:
+            context.message = None
+            callee = _enter(context, message, pool)
+            if callee is not None:
+                frames.append(context)
+                context = callee
+            continue
+
+        if not frames:
+            return num_steps
+
+        caller = frames.pop()
+        _exit(caller, context, pool)
+        context = caller
+
+
+def _enter(caller: ExecutionContext, message, pool: FramePool):
+    """returns the context for the message, or None if the call completed without running any code"""
+    world_state = caller.world_state
+    if caller.depth >= MAX_CALL_DEPTH:
+        caller.last_returndata = bytes()
+        caller.stack.push(0)
+        return None
+
+    code_account = world_state.find(message.code_address) if world_state is not None else None
+    if code_account is None or not code_account.code:
+        # calls to accounts without code always succeed
+        caller.last_returndata = bytes()
+        caller.stack.push(1)
+        return None
+
+    if message.kind == "DELEGATECALL":
+        storage = caller.storage
+    else:
+        target = world_state.find(message.address)
+        storage = target.storage if target is not None else Storage()
+
+    stack, memory = pool.acquire()
+    callee = ExecutionContext(
+        code=code_account.code,
+        stack=stack,
+        memory=memory,
+        calldata=Calldata(message.calldata),
+        storage=storage,
+        address=message.address,
+        caller=message.caller,
+        callvalue=message.value,
+        world_state=world_state,
+        depth=caller.depth + 1,
+        is_static=message.is_static,
+        journal=caller.journal,
+        analysis=code_account.code_handle,
+    )
+    callee.return_to = (message.ret_offset, message.ret_size, len(caller.journal))
+    return callee
+
+
+def _exit(caller: ExecutionContext, callee: ExecutionContext, pool: FramePool) -> None:
+    ret_offset, ret_size, checkpoint = callee.return_to
+    if not callee.success:
+        callee.revert_journal(checkpoint)
+
+    returndata = callee.returndata
+    caller.last_returndata = returndata
+    for i in range(min(ret_size, len(returndata))):
+        caller.memory.store(ret_offset + i, returndata[i])
+
+    caller.stack.push(1 if callee.success else 0)
+    pool.release(callee.stack, callee.memory)
+
+
+def _run_decoded(context, verbose, max_steps, prehook, posthook, print_stack, print_memory, num_steps=0) -> int:
+    while not context.is_stopped() and context.message is None:
         pc_before = context.pc
 
         # increments pc
@@ -52,7 +263,72 @@ def run(
 
             print()
 
-    if verbose:
-        print(f"Output: 0x{context.returndata.hex()}")
+    return num_steps
 
-    return context
+
+def _run_threaded(context: ExecutionContext, max_steps: int, num_steps=0, handlers=HANDLERS) -> int:
+    code = context.code
+    code_len = len(code)
+    stack = context.stack.stack
+    pc = context.pc
+
+    try:
+        while context.success is None and context.message is None:
+            # section 9.4.1 of the yellow paper, if pc is outside code, then the operation to be executed is STOP
+            if pc >= code_len:
+                context.stop(success=True)
+            else:
+                opcode = code[pc]
+                pc += 1
+                pc = handlers[opcode](context, stack, pc)
+
+            # the implicit STOP counts as a step, just like in the reference loop
+            num_steps += 1
+            if max_steps > 0 and num_steps > max_steps:
+                raise ExecutionLimitReached(context=context)
+
+    finally:
+        context.pc = pc
+
+    return num_steps
+
+
+def _run_recorded(context: ExecutionContext, max_steps: int, sink, num_steps=0, handlers=HANDLERS) -> int:
+    """the threaded loop, writing a packed (pc, depth, opcode) record of every step into the sink's buffer"""
+    code = context.code
+    code_len = len(code)
+    stack = context.stack.stack
+    pc = context.pc
+
+    buffer = sink.buffer
+    batch_size = len(buffer)
+    count = sink.count
+    depth = context.depth << RECORD_DEPTH_SHIFT
+
+    try:
+        while context.success is None and context.message is None:
+            # the record is written before executing, so that the failing instruction is recorded too
+            if pc >= code_len:
+                buffer[count] = pc << RECORD_PC_SHIFT | depth
+                count += 1
+                context.stop(success=True)
+            else:
+                opcode = code[pc]
+                buffer[count] = pc << RECORD_PC_SHIFT | depth | opcode
+                count += 1
+                pc = handlers[opcode](context, stack, pc + 1)
+
+            if count == batch_size:
+                sink.count = count
+                sink.flush()
+                count = 0
+
+            num_steps += 1
+            if max_steps > 0 and num_steps > max_steps:
+                raise ExecutionLimitReached(context=context)
+
+    finally:
+        context.pc = pc
+        sink.count = count
+
+    return num_steps
@@ -0,0 +1,175 @@
+"""
+Binary snapshots of the world state.
+
+Layout (all integers are big-endian):
+
+    header      magic "SMOLSNAP", version: u32, num_codes: u64, num_accounts: u64, num_slots: u64
+    codes       num_codes x (keccak(code): 32 bytes, offset: u64, length: u64), sorted by hash
+    accounts    num_accounts x (address: 20 bytes, nonce: u64, balance: 32 bytes, code index: u32,
+                                first slot: u64, num slots: u64), sorted by address
+    slots       num_slots x (key: 32 bytes, value: 32 bytes), grouped by account and sorted by key
+    code blobs  the concatenated code of all the distinct contracts
+
+Every table has fixed-width records and is sorted, so the loader can binary search the memory-mapped file directly.
+Nothing is read until it is accessed: opening a snapshot is instant, regardless of its size.
+"""
+
+import mmap
+import struct
+from typing import Iterable, Optional, Tuple
+
+from .context import AccountState
+from .state import AccountFields, PersistentWorldState, StateBackend
+
+MAGIC = b"SMOLSNAP"
+VERSION = 1
+
+HEADER = struct.Struct(">8sIQQQ")
+CODE_RECORD = struct.Struct(">32sQQ")
+ACCOUNT_RECORD = struct.Struct(">20sQ32sIQQ")
+SLOT_RECORD = struct.Struct(">32s32s")
+
+NO_CODE = 0xFFFFFFFF
+
+
+class InvalidSnapshot(Exception):
+    ...
+
+
+def write_snapshot(path: str, accounts: Iterable[Tuple[int, AccountState]]) -> None:
+    """writes the accounts (e.g. `world_state.accounts.items()`) to a snapshot file"""
+    accounts = sorted(accounts, key=lambda item: item[0])
+
+    code_hashes = sorted({account.code_handle.code_hash for _, account in accounts if account.code})
+    code_index = {code_hash: i for i, code_hash in enumerate(code_hashes)}
+    codes = {account.code_handle.code_hash: account.code for _, account in accounts if account.code}
+
+    account_records = []
+    slot_records = []
+    for address, account in accounts:
+        slots = sorted((k, v) for k, v in account.storage.data.items() if v != 0)
+        code_hash = account.code_handle.code_hash if account.code else None
+        account_records.append(
+            ACCOUNT_RECORD.pack(
+                address.to_bytes(20, "big"),
+                account.nonce,
+                account.balance.to_bytes(32, "big"),
+                code_index[code_hash] if code_hash is not None else NO_CODE,
+                len(slot_records),
+                len(slots),
+            )
+        )
+        slot_records.extend(SLOT_RECORD.pack(k.to_bytes(32, "big"), v.to_bytes(32, "big")) for k, v in slots)
+
+    blobs_offset = (
+        HEADER.size
+        + CODE_RECORD.size * len(code_hashes)
+        + ACCOUNT_RECORD.size * len(account_records)
+        + SLOT_RECORD.size * len(slot_records)
+    )
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(code_hashes), len(account_records), len(slot_records)))
+
+        offset = blobs_offset
+        for code_hash in code_hashes:
+            f.write(CODE_RECORD.pack(code_hash, offset, len(codes[code_hash])))
+            offset += len(codes[code_hash])
+
+        f.writelines(account_records)
+        f.writelines(slot_records)
+        f.writelines(codes[code_hash] for code_hash in code_hashes)
+
+
+def _bisect(buffer, start: int, count: int, record_size: int, key: bytes) -> Optional[int]:
+    """binary search for a record whose first bytes are `key`, returns the record offset"""
+    key_len = len(key)
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = start + mid * record_size
+        current = buffer[offset : offset + key_len]
+        if current == key:
+            return offset
+        if current < key:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return None
+
+
+class SnapshotBackend(StateBackend):
+    """a read-only StateBackend over a memory-mapped snapshot file"""
+
+    def __init__(self, path: str) -> None:
+        self.file = open(path, "rb")
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            self.file.close()
+            raise InvalidSnapshot(f"{path} is empty")
+
+        if len(self.buffer) < HEADER.size:
+            self.close()
+            raise InvalidSnapshot(f"{path} is truncated")
+
+        magic, version, self.num_codes, self.num_accounts, self.num_slots = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise InvalidSnapshot(f"{path} is not a version {VERSION} snapshot")
+
+        self.codes_offset = HEADER.size
+        self.accounts_offset = self.codes_offset + CODE_RECORD.size * self.num_codes
+        self.slots_offset = self.accounts_offset + ACCOUNT_RECORD.size * self.num_accounts
+
+    def _account_record(self, address: int):
+        offset = _bisect(
+            self.buffer, self.accounts_offset, self.num_accounts, ACCOUNT_RECORD.size, address.to_bytes(20, "big")
+        )
+        return ACCOUNT_RECORD.unpack_from(self.buffer, offset) if offset is not None else None
+
+    def _code(self, index: int) -> bytes:
+        if index == NO_CODE:
+            return bytes()
+
+        _, offset, length = CODE_RECORD.unpack_from(self.buffer, self.codes_offset + index * CODE_RECORD.size)
+        return self.buffer[offset : offset + length]
+
+    def load_account(self, address: int) -> Optional[AccountFields]:
+        record = self._account_record(address)
+        if record is None:
+            return None
+
+        _, nonce, balance, code_index, _, _ = record
+        return nonce, int.from_bytes(balance, "big"), self._code(code_index)
+
+    def load_slot(self, address: int, slot: int) -> int:
+        record = self._account_record(address)
+        if record is None:
+            return 0
+
+        _, _, _, _, first_slot, num_slots = record
+        start = self.slots_offset + first_slot * SLOT_RECORD.size
+        offset = _bisect(self.buffer, start, num_slots, SLOT_RECORD.size, slot.to_bytes(32, "big"))
+        if offset is None:
+            return 0
+
+        return int.from_bytes(self.buffer[offset + 32 : offset + 64], "big")
+
+    def write_batch(self, accounts, slots) -> None:
+        raise NotImplementedError("snapshots are read-only, use write_snapshot() to create a new one")
+
+    def close(self) -> None:
+        self.buffer.close()
+        self.file.close()
+
+
+def open_snapshot(path: str, **cache_sizes) -> PersistentWorldState:
+    """
+    Opens a snapshot as a world state, accounts and slots are materialized on first access.
+
+    The world state can be modified, but not committed.
+    """
+    return PersistentWorldState(SnapshotBackend(path), **cache_sizes)
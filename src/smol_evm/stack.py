@@ -34,7 +34,7 @@ class Stack:
         if i == 0:
             return
 
-        if len(self.stack) < i:
+        if len(self.stack) <= i:
             raise StackUnderflow()
 
         self.stack[-1], self.stack[-i - 1] = self.stack[-i - 1], self.stack[-1]
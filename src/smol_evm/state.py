@@ -0,0 +1,327 @@
+"""
+Persistent world state.
+
+`context.WorldState` keeps every account in a dict, which is fine for tests but not for mainnet-sized snapshots.
+`PersistentWorldState` has the same interface, but loads accounts and storage slots on demand from a `StateBackend`:
+
+- hot accounts and slots are kept in bounded LRU caches
+- writes are buffered as dirty entries (which are never evicted) until `commit()`
+- `commit()` writes all the dirty entries back to the backend in a single batch
+
+Account fields (nonce, balance, code) must be updated through `set()` to be persisted, storage writes are tracked
+automatically.
+"""
+
+import sqlite3
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Optional, Tuple
+
+from .context import AccountState, Storage, WorldState, InvalidStorageSlot, InvalidStorageValue
+from .constants import is_valid_uint256
+
+DEFAULT_ACCOUNT_CACHE_SIZE = 10_000
+DEFAULT_SLOT_CACHE_SIZE = 1_000_000
+
+# (nonce, balance, code)
+AccountFields = Tuple[int, int, bytes]
+
+
+class StateBackend:
+    """where a PersistentWorldState loads accounts and slots from, and writes them back to"""
+
+    def load_account(self, address: int) -> Optional[AccountFields]:
+        raise NotImplementedError()
+
+    def load_slot(self, address: int, slot: int) -> int:
+        raise NotImplementedError()
+
+    def write_batch(self, accounts: Dict[int, AccountFields], slots: Dict[Tuple[int, int], int]) -> None:
+        """writes accounts and slots (0 means cleared) atomically"""
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """a backend that lives in dicts, mostly useful for tests"""
+
+    def __init__(self) -> None:
+        self.accounts = {}
+        self.slots = {}
+
+    def load_account(self, address: int) -> Optional[AccountFields]:
+        return self.accounts.get(address)
+
+    def load_slot(self, address: int, slot: int) -> int:
+        return self.slots.get((address, slot), 0)
+
+    def write_batch(self, accounts, slots) -> None:
+        self.accounts.update(accounts)
+
+        for key, value in slots.items():
+            if value == 0:
+                self.slots.pop(key, None)
+            else:
+                self.slots[key] = value
+
+
+def _address_key(address: int) -> bytes:
+    return address.to_bytes(20, "big")
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+class SqliteBackend(StateBackend):
+    """
+    Stores the state in an sqlite database, uint256 values are stored as 32-byte big-endian blobs.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            address BLOB PRIMARY KEY,
+            nonce INTEGER NOT NULL,
+            balance BLOB NOT NULL,
+            code BLOB NOT NULL
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS storage (
+            address BLOB NOT NULL,
+            slot BLOB NOT NULL,
+            value BLOB NOT NULL,
+            PRIMARY KEY (address, slot)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(self.SCHEMA)
+
+    def load_account(self, address: int) -> Optional[AccountFields]:
+        row = self.connection.execute(
+            "SELECT nonce, balance, code FROM accounts WHERE address = ?", (_address_key(address),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        nonce, balance, code = row
+        return nonce, int.from_bytes(balance, "big"), bytes(code)
+
+    def load_slot(self, address: int, slot: int) -> int:
+        row = self.connection.execute(
+            "SELECT value FROM storage WHERE address = ? AND slot = ?", (_address_key(address), _word(slot))
+        ).fetchone()
+        return int.from_bytes(row[0], "big") if row else 0
+
+    def write_batch(self, accounts, slots) -> None:
+        updated = [(_address_key(a), nonce, _word(balance), code) for a, (nonce, balance, code) in accounts.items()]
+        cleared = [(_address_key(a), _word(slot)) for (a, slot), value in slots.items() if value == 0]
+        written = [(_address_key(a), _word(slot), _word(value)) for (a, slot), value in slots.items() if value != 0]
+
+        # the connection as a context manager wraps everything in one transaction
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?)", updated)
+            self.connection.executemany("DELETE FROM storage WHERE address = ? AND slot = ?", cleared)
+            self.connection.executemany("INSERT OR REPLACE INTO storage VALUES (?, ?, ?)", written)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class LRUCache:
+    """a bounded mapping that evicts the least recently used entries"""
+
+    def __init__(self, max_size: int, on_evict: Optional[Callable] = None) -> None:
+        self.max_size = max_size
+        self.data = OrderedDict()
+        # called with the key and value of every evicted entry
+        self.on_evict = on_evict
+
+    def get(self, key, default=None):
+        try:
+            self.data.move_to_end(key)
+        except KeyError:
+            return default
+        return self.data[key]
+
+    def put(self, key, value) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.max_size:
+            evicted = self.data.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(*evicted)
+
+    def pop(self, key, default=None):
+        return self.data.pop(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class BackedStorage(Storage):
+    """the storage of an account in a PersistentWorldState, reads and writes go through the world state caches"""
+
+    def __init__(self, world_state: "PersistentWorldState", address: int) -> None:
+        self.world_state = world_state
+        self.address = address
+
+    @property
+    def data(self):
+        # only the slots we know about, the backend may hold many more
+        return self.world_state.cached_slots(self.address)
+
+    def get(self, slot):
+        if not is_valid_uint256(slot):
+            raise InvalidStorageSlot(slot)
+        return self.world_state.load_slot(self.address, slot)
+
+    def put(self, slot, value):
+        if not is_valid_uint256(slot):
+            raise InvalidStorageSlot(slot)
+
+        if not is_valid_uint256(value):
+            raise InvalidStorageValue(value)
+
+        self.world_state.store_slot(self.address, slot, value)
+
+
+class PersistentWorldState(WorldState):
+    def __init__(
+        self,
+        backend: StateBackend,
+        account_cache_size=DEFAULT_ACCOUNT_CACHE_SIZE,
+        slot_cache_size=DEFAULT_SLOT_CACHE_SIZE,
+    ) -> None:
+        self.backend = backend
+        self.account_cache = LRUCache(account_cache_size)
+        self.slot_cache = LRUCache(slot_cache_size, on_evict=self._evict_slot)
+
+        # address -> the slots of the address that are in the slot cache or dirty, so that the storage of one account
+        # can be listed without scanning the whole cache
+        self.slot_index = defaultdict(set)
+
+        # address -> AccountState, (address, slot) -> value
+        self.dirty_accounts = {}
+        self.dirty_slots = {}
+
+    @property
+    def accounts(self):
+        """the accounts currently in memory"""
+        accounts = dict(self.account_cache.data)
+        accounts.update(self.dirty_accounts)
+        return accounts
+
+    def find(self, address):
+        if address in self.dirty_accounts:
+            return self.dirty_accounts[address]
+
+        account = self.account_cache.get(address)
+        if account is not None:
+            return account
+
+        fields = self.backend.load_account(address)
+        if fields is None:
+            return None
+
+        nonce, balance, code = fields
+        account = AccountState(nonce=nonce, balance=balance, code=code, storage=BackedStorage(self, address))
+        self.account_cache.put(address, account)
+        return account
+
+    def get(self, address):
+        account = self.find(address)
+        if account is None:
+            raise KeyError(address)
+        return account
+
+    def set(self, address, account):
+        if not isinstance(account.storage, BackedStorage):
+            # move the slots of a plain in-memory account into the world state
+            for slot, value in account.storage.data.items():
+                self.store_slot(address, slot, value)
+            account.storage = BackedStorage(self, address)
+
+        self.account_cache.pop(address)
+        self.dirty_accounts[address] = account
+
+    def load_slot(self, address: int, slot: int) -> int:
+        key = (address, slot)
+        if key in self.dirty_slots:
+            return self.dirty_slots[key]
+
+        value = self.slot_cache.get(key)
+        if value is None:
+            value = self.backend.load_slot(address, slot)
+            self.slot_index[address].add(slot)
+            self.slot_cache.put(key, value)
+        return value
+
+    def store_slot(self, address: int, slot: int, value: int) -> None:
+        key = (address, slot)
+        self.slot_cache.pop(key)
+        self.dirty_slots[key] = value
+        self.slot_index[address].add(slot)
+
+    def _evict_slot(self, key: Tuple[int, int], value: int) -> None:
+        address, slot = key
+        slots = self.slot_index.get(address)
+        if slots is not None and key not in self.dirty_slots:
+            slots.discard(slot)
+            if not slots:
+                del self.slot_index[address]
+
+    def cached_slots(self, address: int) -> Dict[int, int]:
+        dirty, cached = self.dirty_slots, self.slot_cache.data
+        slots = {}
+        for slot in self.slot_index.get(address, ()):
+            key = (address, slot)
+            slots[slot] = dirty[key] if key in dirty else cached[key]
+        return slots
+
+    def is_dirty(self) -> bool:
+        return bool(self.dirty_accounts or self.dirty_slots)
+
+    def commit(self) -> None:
+        """writes all the dirty accounts and slots to the backend in one batch"""
+        accounts = {
+            address: (account.nonce, account.balance, account.code) for address, account in self.dirty_accounts.items()
+        }
+        self.backend.write_batch(accounts, self.dirty_slots)
+
+        # the committed entries become clean, and can now be evicted (also from the slot index)
+        dirty_accounts, self.dirty_accounts = self.dirty_accounts, {}
+        dirty_slots, self.dirty_slots = self.dirty_slots, {}
+        for address, account in dirty_accounts.items():
+            self.account_cache.put(address, account)
+
+        for key, value in dirty_slots.items():
+            self.slot_cache.put(key, value)
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def __str__(self):
+        return f"PersistentWorldState(cached={len(self.account_cache)}, dirty={len(self.dirty_accounts)})"
+
+
+def pack_accounts(world_state: WorldState) -> Dict[int, Tuple[int, int, bytes, Dict[int, int]]]:
+    """the accounts currently in the world state as plain data, that is cheap to pickle (e.g. to worker processes)"""
+    return {
+        address: (account.nonce, account.balance, account.code, dict(account.storage.data))
+        for address, account in world_state.accounts.items()
+    }
+
+
+def unpack_accounts(accounts) -> WorldState:
+    return WorldState(
+        {
+            address: AccountState(nonce=nonce, balance=balance, code=code, storage=Storage(slots))
+            for address, (nonce, balance, code, slots) in accounts.items()
+        }
+    )
@@ -0,0 +1,395 @@
+"""
+A direct-threaded dispatch table for the interpreter loop.
+
+The instructions in `opcodes` are the reference implementation: each one goes through the `insn` wrapper, and
+through the checks in `Stack.push`/`Stack.pop`. That's great for readability and for hooks, but slow in a tight loop.
+
+`HANDLERS` is a flat 256-entry tuple, indexed by opcode, of plain functions with the signature:
+
+    handler(ctx: ExecutionContext, stack: list, pc: int) -> int
+
+`stack` is the list backing `ctx.stack` and `pc` points right after the opcode byte. Handlers return the pc of the
+next instruction. They check the stack depth once up front and skip the checks that can't fail (e.g. results are
+always masked to 256 bits, so they are always valid stack items).
+
+Instructions that are not performance sensitive are adapted from their reference implementation.
+"""
+
+from eth_utils import keccak
+
+from .constants import MAX_UINT256
+from .opcodes import REGISTRY, PUSH1_OPCODE, int_to_uint, uint_to_int
+from .stack import StackOverflow, StackUnderflow
+
+
+def _adapt(func):
+    """turns a reference instruction into a handler, keeping ctx.pc in sync so that PC-relative logic still works"""
+
+    def handler(ctx, stack, pc):
+        ctx.pc = pc
+        func(ctx)
+        return ctx.pc
+
+    return handler
+
+
+def _unknown(opcode: int):
+    def handler(ctx, stack, pc):
+        # same behavior as executing an unmaterialized Instruction
+        raise NotImplementedError(f"opcode={hex(opcode)}")
+
+    return handler
+
+
+def _push(width: int):
+    def handler(ctx, stack, pc):
+        if len(stack) >= ctx.stack.max_depth:
+            raise StackOverflow()
+
+        code = ctx.code
+        end = pc + width
+        value = int.from_bytes(code[pc:end], "big")
+        if end > len(code):
+            # bytes after the end of the code buffer are treated as 0
+            value <<= 8 * (end - len(code))
+
+        stack.append(value)
+        return end
+
+    return handler
+
+
+def _dup(n: int):
+    def handler(ctx, stack, pc):
+        if len(stack) < n:
+            raise StackUnderflow()
+        if len(stack) >= ctx.stack.max_depth:
+            raise StackOverflow()
+        stack.append(stack[-n])
+        return pc
+
+    return handler
+
+
+def _swap(n: int):
+    def handler(ctx, stack, pc):
+        if len(stack) <= n:
+            raise StackUnderflow()
+        stack[-1], stack[-n - 1] = stack[-n - 1], stack[-1]
+        return pc
+
+    return handler
+
+
+def _stop(ctx, stack, pc):
+    ctx.stop(success=True)
+    return pc
+
+
+def _add(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    stack.append((stack.pop() + stack.pop()) & MAX_UINT256)
+    return pc
+
+
+def _mul(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    stack.append((stack.pop() * stack.pop()) & MAX_UINT256)
+    return pc
+
+
+def _sub(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a = stack.pop()
+    stack.append((a - stack.pop()) & MAX_UINT256)
+    return pc
+
+
+def _div(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a, b = stack.pop(), stack.pop()
+    stack.append(a // b if b != 0 else 0)
+    return pc
+
+
+def _sdiv(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a, b = uint_to_int(stack.pop()), uint_to_int(stack.pop())
+    stack.append(int_to_uint(a // b) if b != 0 else 0)
+    return pc
+
+
+def _mod(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a, b = stack.pop(), stack.pop()
+    stack.append(a % b if b != 0 else 0)
+    return pc
+
+
+def _smod(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a, b = uint_to_int(stack.pop()), uint_to_int(stack.pop())
+    stack.append(int_to_uint(a % b) if b != 0 else 0)
+    return pc
+
+
+def _lt(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a = stack.pop()
+    stack.append(1 if a < stack.pop() else 0)
+    return pc
+
+
+def _gt(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a = stack.pop()
+    stack.append(1 if a > stack.pop() else 0)
+    return pc
+
+
+def _slt(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a = uint_to_int(stack.pop())
+    stack.append(1 if a < uint_to_int(stack.pop()) else 0)
+    return pc
+
+
+def _sgt(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a = uint_to_int(stack.pop())
+    stack.append(1 if a > uint_to_int(stack.pop()) else 0)
+    return pc
+
+
+def _eq(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    stack.append(1 if stack.pop() == stack.pop() else 0)
+    return pc
+
+
+def _iszero(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    stack.append(1 if stack.pop() == 0 else 0)
+    return pc
+
+
+def _and(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    stack.append(stack.pop() & stack.pop())
+    return pc
+
+
+def _or(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    stack.append(stack.pop() | stack.pop())
+    return pc
+
+
+def _xor(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    stack.append(stack.pop() ^ stack.pop())
+    return pc
+
+
+def _not(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    stack.append(MAX_UINT256 ^ stack.pop())
+    return pc
+
+
+def _byte(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offset, value = stack.pop(), stack.pop()
+    stack.append((value >> ((31 - offset) * 8)) & 0xFF if offset < 32 else 0)
+    return pc
+
+
+def _shl(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a, b = stack.pop(), stack.pop()
+    stack.append(0 if a >= 256 else ((b << a) & MAX_UINT256))
+    return pc
+
+
+def _shr(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    a = stack.pop()
+    stack.append(stack.pop() >> a)
+    return pc
+
+
+def _sar(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    shift, signed_value = stack.pop(), uint_to_int(stack.pop())
+    stack.append(int_to_uint(signed_value >> shift))
+    return pc
+
+
+def _sha3(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offset, size = stack.pop(), stack.pop()
+    stack.append(int.from_bytes(keccak(ctx.memory.load_range(offset, size)), "big"))
+    return pc
+
+
+def _calldataload(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    stack.append(ctx.calldata.read_word(stack.pop()))
+    return pc
+
+
+def _pop(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    stack.pop()
+    return pc
+
+
+def _mload(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    stack.append(ctx.memory.load_word(stack.pop()))
+    return pc
+
+
+def _mstore(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offset = stack.pop()
+    ctx.memory.store_word(offset, stack.pop())
+    return pc
+
+
+def _mstore8(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    offset = stack.pop()
+    ctx.memory.store(offset, stack.pop() % 256)
+    return pc
+
+
+def _sload(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    stack.append(ctx.storage.get(stack.pop()))
+    return pc
+
+
+def _sstore(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    slot = stack.pop()
+    ctx.sstore(slot, stack.pop())
+    return pc
+
+
+def _jump(ctx, stack, pc):
+    if len(stack) < 1:
+        raise StackUnderflow()
+    target_pc = stack.pop()
+    if target_pc in ctx.jumpdests:
+        return target_pc
+
+    ctx.stop(success=False, reason=f"Invalid jump to {target_pc}, not in valid jumpdests {ctx.jumpdests}")
+    return pc
+
+
+def _jumpi(ctx, stack, pc):
+    if len(stack) < 2:
+        raise StackUnderflow()
+    target_pc = stack.pop()
+    if stack.pop() == 0:
+        return pc
+
+    if target_pc in ctx.jumpdests:
+        return target_pc
+
+    ctx.stop(success=False, reason=f"Invalid jump to {target_pc}, not in valid jumpdests {ctx.jumpdests}")
+    return pc
+
+
+def _jumpdest(ctx, stack, pc):
+    return pc
+
+
+def _build_table():
+    table = []
+    for opcode in range(256):
+        instruction = REGISTRY.by_code[opcode]
+        if instruction is None:
+            table.append(_unknown(opcode))
+        elif instruction.is_push():
+            table.append(_push(opcode - PUSH1_OPCODE + 1))
+        else:
+            table.append(_adapt(instruction.execute))
+
+    for i in range(1, 17):
+        table[0x7F + i] = _dup(i)
+        table[0x8F + i] = _swap(i)
+
+    fast = {
+        "STOP": _stop,
+        "ADD": _add,
+        "MUL": _mul,
+        "SUB": _sub,
+        "DIV": _div,
+        "SDIV": _sdiv,
+        "MOD": _mod,
+        "SMOD": _smod,
+        "LT": _lt,
+        "GT": _gt,
+        "SLT": _slt,
+        "SGT": _sgt,
+        "EQ": _eq,
+        "ISZERO": _iszero,
+        "AND": _and,
+        "OR": _or,
+        "XOR": _xor,
+        "NOT": _not,
+        "BYTE": _byte,
+        "SHL": _shl,
+        "SHR": _shr,
+        "SAR": _sar,
+        "SHA3": _sha3,
+        "CALLDATALOAD": _calldataload,
+        "POP": _pop,
+        "MLOAD": _mload,
+        "MSTORE": _mstore,
+        "MSTORE8": _mstore8,
+        "SLOAD": _sload,
+        "SSTORE": _sstore,
+        "JUMP": _jump,
+        "JUMPI": _jumpi,
+        "JUMPDEST": _jumpdest,
+    }
+
+    for name, handler in fast.items():
+        table[REGISTRY.by_name[name].opcode] = handler
+
+    return tuple(table)
+
+
+HANDLERS = _build_table()
@@ -0,0 +1,207 @@
+"""
+Streaming diff of two execution traces, to find the first step where two executions diverge.
+
+Traces are JSON lines in the EIP-3155 format, as written by `geth evm --json run` and other reference EVMs, or by
+`write_trace()`: one object per step, with the state before the step executes.
+
+    {"pc": 0, "op": 96, "depth": 1, "stack": ["0x2a"], "memSize": 0, "memory": "0x", "opName": "PUSH1"}
+
+Steps are compared on pc, opcode, depth, stack and memory. Memory is compared by hash when both traces have it, and
+by size otherwise. Fields that the reference EVMs add (gas, refund, ...) are ignored, and so are lines that are not
+steps (e.g. the summary line geth prints at the end).
+
+Both traces are read line by line in lockstep, and only the last few steps are kept for context, so memory use does
+not depend on the length of the traces. Identical lines are skipped without being parsed: diffing two traces from
+the same tool costs little more than reading them. Files ending in .gz are decompressed on the fly.
+"""
+
+import gzip
+import hashlib
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import islice, zip_longest
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from .runner import run
+
+DEFAULT_CONTEXT = 5
+
+
+class InvalidTrace(Exception): ...
+
+
+@dataclass
+class Step:
+    pc: int
+    op: int
+    depth: Optional[int]
+    stack: Tuple[int, ...]
+    memory_size: Optional[int]
+    memory_hash: Optional[bytes]
+    name: str = ""
+
+    def differences(self, other: "Step") -> List[str]:
+        """the names of the fields that differ, fields that only one of the steps has are not compared"""
+        diffs = []
+        if self.pc != other.pc:
+            diffs.append("pc")
+        if self.op != other.op:
+            diffs.append("op")
+        if None not in (self.depth, other.depth) and self.depth != other.depth:
+            diffs.append("depth")
+        if self.stack != other.stack:
+            diffs.append("stack")
+
+        if None not in (self.memory_hash, other.memory_hash):
+            if self.memory_hash != other.memory_hash:
+                diffs.append("memory")
+        elif None not in (self.memory_size, other.memory_size) and self.memory_size != other.memory_size:
+            diffs.append("memory")
+        return diffs
+
+    def __str__(self) -> str:
+        name = self.name or f"0x{self.op:02x}"
+        depth = f" depth={self.depth}" if self.depth is not None else ""
+        memory = f" memSize={self.memory_size}" if self.memory_size is not None else ""
+        return f"pc={self.pc} {name}{depth}{memory} stack=[{' '.join(hex(x) for x in self.stack)}]"
+
+
+def _quantity(value) -> int:
+    return value if isinstance(value, int) else int(value, 16)
+
+
+def parse_step(line: str) -> Step:
+    try:
+        step = json.loads(line)
+        memory = step.get("memory")
+        if memory is not None:
+            # some tools write memory as a list of 32-byte words
+            memory = "".join(memory) if isinstance(memory, list) else memory
+            memory = hashlib.blake2b(bytes.fromhex(memory.replace("0x", "")), digest_size=16).digest()
+
+        mem_size = step.get("memSize")
+        return Step(
+            pc=_quantity(step["pc"]),
+            op=_quantity(step["op"]),
+            depth=step.get("depth"),
+            stack=tuple(_quantity(x) for x in step.get("stack", ())),
+            memory_size=_quantity(mem_size) if mem_size is not None else None,
+            memory_hash=memory,
+            name=step.get("opName", ""),
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidTrace(f"invalid step {line.strip()!r}: {e}")
+
+
+def open_trace(path: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def steps(lines: Iterable[str]) -> Iterator[str]:
+    """the raw lines of the steps, without parsing them"""
+    return (line for line in lines if '"pc"' in line)
+
+
+@dataclass
+class Divergence:
+    # index of the first divergent step, starting at 0
+    index: int
+
+    # None if that trace ended before the other one
+    left: Optional[Step]
+    right: Optional[Step]
+    fields: List[str]
+
+    # (index, step) before the divergence, where both traces agree
+    before: List[Tuple[int, Step]] = field(default_factory=list)
+
+    # the steps after the divergence in each trace
+    left_after: List[Step] = field(default_factory=list)
+    right_after: List[Step] = field(default_factory=list)
+
+    def format(self) -> List[str]:
+        lines = [f"first divergence at step {self.index} ({', '.join(self.fields)})"]
+        lines.extend(f"  {index:>10}  {step}" for index, step in self.before)
+        lines.append(f"< {self.index:>10}  {self.left if self.left is not None else '(end of trace)'}")
+        lines.append(f"> {self.index:>10}  {self.right if self.right is not None else '(end of trace)'}")
+
+        for marker, after in (("<", self.left_after), (">", self.right_after)):
+            lines.extend(f"{marker} {self.index + i + 1:>10}  {step}" for i, step in enumerate(after))
+        return lines
+
+
+def diff_traces(
+    left: Iterable[str], right: Iterable[str], context: int = DEFAULT_CONTEXT
+) -> Tuple[Optional[Divergence], int]:
+    """
+    Compares two traces (iterables of JSON lines) step by step.
+
+    Returns (first divergence or None, number of steps compared).
+    """
+    left, right = steps(left), steps(right)
+    before = deque(maxlen=context)
+    index = -1
+
+    for index, (a, b) in enumerate(zip_longest(left, right)):
+        # the fast path: identical lines are identical steps
+        if a == b:
+            before.append((index, a))
+            continue
+
+        step_a = parse_step(a) if a is not None else None
+        step_b = parse_step(b) if b is not None else None
+        fields = step_a.differences(step_b) if step_a is not None and step_b is not None else ["length"]
+        if fields:
+            divergence = Divergence(
+                index=index,
+                left=step_a,
+                right=step_b,
+                fields=fields,
+                before=[(i, parse_step(line)) for i, line in before],
+                left_after=[parse_step(line) for line in islice(left, context)],
+                right_after=[parse_step(line) for line in islice(right, context)],
+            )
+            return divergence, index
+
+        before.append((index, a))
+
+    return None, index + 1
+
+
+def diff_files(left_path: str, right_path: str, context: int = DEFAULT_CONTEXT) -> Tuple[Optional[Divergence], int]:
+    with open_trace(left_path) as left, open_trace(right_path) as right:
+        return diff_traces(left, right, context)
+
+
+def write_trace(out: IO[str], code: bytes, memory: bool = False, **kwargs):
+    """
+    Runs the code and writes its trace to out in the EIP-3155 format, kwargs are passed to `run`. Memory is only
+    written if memory=True, it can make the trace orders of magnitude larger.
+
+    Returns the context.
+    """
+    # the pc of the next instruction of each context: when the prehook fires, the instruction was already decoded
+    next_pcs = WeakKeyDictionary()
+
+    def prehook(context, instruction):
+        step = {
+            "pc": next_pcs.get(context, 0),
+            "op": instruction.opcode,
+            "depth": context.depth + 1,
+            "stack": [hex(x) for x in context.stack.stack],
+            "memSize": len(context.memory.memory),
+            "opName": instruction.name,
+        }
+        if memory:
+            step["memory"] = f"0x{bytes(context.memory.memory).hex()}"
+        out.write(json.dumps(step, separators=(",", ":")))
+        out.write("\n")
+
+    def posthook(context, instruction):
+        next_pcs[context] = context.pc
+
+    return run(code, prehook=prehook, posthook=posthook, **kwargs)
@@ -0,0 +1,305 @@
+"""
+Hexary Merkle-Patricia trie, as specified in appendix D of the yellow paper.
+
+Nodes are mutable and cache their reference (their RLP encoding if it is shorter than 32 bytes, its keccak hash
+otherwise). Updating a key clears the cached reference of the nodes on its path only, so computing the root after a
+batch of updates only rehashes the modified paths, everything else is reused.
+
+`TrieStorage` is a drop-in `Storage` that keeps track of the slots written since the last root computation, so that
+storage roots are maintained incrementally across transactions.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+from eth_utils import keccak
+
+from .context import AccountState, Storage
+
+Nibbles = Tuple[int, ...]
+
+
+def _length_prefix(length: int, offset: int) -> bytes:
+    if length < 56:
+        return bytes([offset + length])
+
+    length_bytes = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([offset + 55 + len(length_bytes)]) + length_bytes
+
+
+def rlp_encode(item) -> bytes:
+    """RLP encoding of bytes or (nested) lists of bytes"""
+    if isinstance(item, (bytes, bytearray)):
+        if len(item) == 1 and item[0] < 0x80:
+            return bytes(item)
+        return _length_prefix(len(item), 0x80) + bytes(item)
+
+    return _rlp_list([rlp_encode(x) for x in item])
+
+
+def _rlp_list(encoded_items: Iterable[bytes]) -> bytes:
+    payload = b"".join(encoded_items)
+    return _length_prefix(len(payload), 0xC0) + payload
+
+
+def int_to_big_endian(value: int) -> bytes:
+    """minimal big-endian encoding, as used for integers in RLP (0 is the empty string)"""
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+def to_nibbles(key: bytes) -> Nibbles:
+    return tuple(n for b in key for n in (b >> 4, b & 0x0F))
+
+
+def hex_prefix(nibbles: Nibbles, leaf: bool) -> bytes:
+    flag = 2 if leaf else 0
+    if len(nibbles) % 2:
+        nibbles = (flag + 1,) + nibbles
+    else:
+        nibbles = (flag, 0) + nibbles
+
+    return bytes(nibbles[i] << 4 | nibbles[i + 1] for i in range(0, len(nibbles), 2))
+
+
+class Leaf:
+    __slots__ = ("path", "value", "ref")
+
+    def __init__(self, path: Nibbles, value: bytes) -> None:
+        self.path = path
+        self.value = value
+        self.ref = None
+
+
+class Extension:
+    __slots__ = ("path", "child", "ref")
+
+    def __init__(self, path: Nibbles, child) -> None:
+        self.path = path
+        self.child = child
+        self.ref = None
+
+
+class Branch:
+    __slots__ = ("children", "value", "ref")
+
+    def __init__(self) -> None:
+        self.children: List = [None] * 16
+        self.value: Optional[bytes] = None
+        self.ref = None
+
+
+def _common_prefix_length(a: Nibbles, b: Nibbles) -> int:
+    i = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        i += 1
+    return i
+
+
+def _branch_put(branch: Branch, path: Nibbles, value: bytes) -> None:
+    if path:
+        branch.children[path[0]] = Leaf(path[1:], value)
+    else:
+        branch.value = value
+
+
+def _insert(node, path: Nibbles, value: bytes):
+    if node is None:
+        return Leaf(path, value)
+
+    if isinstance(node, Branch):
+        node.ref = None
+        if path:
+            node.children[path[0]] = _insert(node.children[path[0]], path[1:], value)
+        else:
+            node.value = value
+        return node
+
+    common = _common_prefix_length(node.path, path)
+    if isinstance(node, Leaf) and common == len(node.path) == len(path):
+        return Leaf(path, value)
+
+    if isinstance(node, Extension) and common == len(node.path):
+        node.ref = None
+        node.child = _insert(node.child, path[common:], value)
+        return node
+
+    # the paths diverge, split at the first different nibble
+    branch = Branch()
+    rest = node.path[common:]
+    if isinstance(node, Leaf):
+        _branch_put(branch, rest, node.value)
+    elif len(rest) == 1:
+        branch.children[rest[0]] = node.child
+    else:
+        branch.children[rest[0]] = Extension(rest[1:], node.child)
+
+    _branch_put(branch, path[common:], value)
+    return Extension(path[:common], branch) if common else branch
+
+
+def _prepend(path: Nibbles, node):
+    """prepends nibbles to the path of a node, keeping the trie in canonical form"""
+    if isinstance(node, Leaf):
+        return Leaf(path + node.path, node.value)
+    if isinstance(node, Extension):
+        return Extension(path + node.path, node.child)
+    return Extension(path, node) if path else node
+
+
+def _delete(node, path: Nibbles):
+    """deletes a key that is known to be in the trie"""
+    if isinstance(node, Leaf):
+        return None
+
+    if isinstance(node, Extension):
+        child = _delete(node.child, path[len(node.path) :])
+        return _prepend(node.path, child) if child is not None else None
+
+    node.ref = None
+    if path:
+        node.children[path[0]] = _delete(node.children[path[0]], path[1:])
+    else:
+        node.value = None
+
+    used = [i for i, child in enumerate(node.children) if child is not None]
+    if node.value is not None:
+        return node if used else Leaf((), node.value)
+
+    if len(used) > 1:
+        return node
+
+    # a branch with a single child and no value collapses into its child
+    return _prepend((used[0],), node.children[used[0]])
+
+
+class Trie:
+    EMPTY_ROOT = keccak(rlp_encode(b""))
+
+    def __init__(self) -> None:
+        self.root = None
+
+        # number of nodes (re)encoded so far, to check that updates are incremental
+        self.encoded_nodes = 0
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        node, path = self.root, to_nibbles(key)
+        while node is not None:
+            if isinstance(node, Leaf):
+                return node.value if node.path == path else None
+
+            if isinstance(node, Extension):
+                if path[: len(node.path)] != node.path:
+                    return None
+                node, path = node.child, path[len(node.path) :]
+                continue
+
+            if not path:
+                return node.value
+            node, path = node.children[path[0]], path[1:]
+
+        return None
+
+    def put(self, key: bytes, value: bytes) -> None:
+        """sets the value for a key, an empty value deletes the key"""
+        if not value:
+            self.delete(key)
+            return
+
+        self.root = _insert(self.root, to_nibbles(key), bytes(value))
+
+    def delete(self, key: bytes) -> None:
+        if self.get(key) is None:
+            return
+
+        self.root = _delete(self.root, to_nibbles(key))
+
+    def _ref(self, node) -> bytes:
+        if node.ref is None:
+            encoded = self._encode(node)
+            node.ref = encoded if len(encoded) < 32 else keccak(encoded)
+        return node.ref
+
+    def _embed(self, node) -> bytes:
+        """the RLP item for a child node: short nodes are inlined, others are referenced by hash"""
+        if node is None:
+            return rlp_encode(b"")
+
+        ref = self._ref(node)
+        return ref if len(ref) < 32 else rlp_encode(ref)
+
+    def _encode(self, node) -> bytes:
+        self.encoded_nodes += 1
+        if isinstance(node, Leaf):
+            return rlp_encode([hex_prefix(node.path, leaf=True), node.value])
+
+        if isinstance(node, Extension):
+            return _rlp_list([rlp_encode(hex_prefix(node.path, leaf=False)), self._embed(node.child)])
+
+        items = [self._embed(child) for child in node.children]
+        items.append(rlp_encode(node.value or b""))
+        return _rlp_list(items)
+
+    def root_hash(self) -> bytes:
+        if self.root is None:
+            return self.EMPTY_ROOT
+
+        ref = self._ref(self.root)
+
+        # the root is always hashed, even when its encoding is short
+        return ref if len(ref) == 32 else keccak(ref)
+
+
+def _slot_key(slot: int) -> bytes:
+    return keccak(slot.to_bytes(32, "big"))
+
+
+class StorageTrie(Trie):
+    """the secure trie of an account storage: keys are keccak(slot), values are RLP encoded integers"""
+
+    def update(self, slot: int, value: int) -> None:
+        self.put(_slot_key(slot), rlp_encode(int_to_big_endian(value)) if value else b"")
+
+
+class TrieStorage(Storage):
+    """a Storage that maintains its storage root incrementally"""
+
+    def __init__(self, init=None) -> None:
+        super().__init__(init)
+        self.trie = StorageTrie()
+        self.pending = set(self.data)
+
+    def put(self, slot, value):
+        super().put(slot, value)
+        self.pending.add(slot)
+
+    def root_hash(self) -> bytes:
+        # a slot written many times since the last root is only updated once in the trie
+        for slot in self.pending:
+            self.trie.update(slot, self.data.get(slot, 0))
+        self.pending.clear()
+        return self.trie.root_hash()
+
+
+def storage_root(storage: Storage) -> bytes:
+    if isinstance(storage, TrieStorage):
+        return storage.root_hash()
+
+    trie = StorageTrie()
+    for slot, value in storage.data.items():
+        trie.update(slot, value)
+    return trie.root_hash()
+
+
+def state_root(accounts: Iterable[Tuple[int, AccountState]]) -> bytes:
+    """the state root for (address, account) pairs, e.g. `world_state.accounts.items()`"""
+    trie = Trie()
+    for address, account in accounts:
+        fields = [
+            int_to_big_endian(account.nonce),
+            int_to_big_endian(account.balance),
+            storage_root(account.storage),
+            account.code_handle.code_hash,
+        ]
+        trie.put(keccak(address.to_bytes(20, "big")), rlp_encode(fields))
+    return trie.root_hash()
@@ -0,0 +1,47 @@
+import json
+
+from smol_evm.accesslist import create_access_list
+from smol_evm.context import AccountState, WorldState
+from smol_evm.opcodes import *
+
+CALLER_ADDRESS = 0xAA
+CALLEE_ADDRESS = 0xBB
+
+
+def call(address):
+    return [PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(address), GAS, CALL, POP]
+
+
+def world():
+    callee = assemble([PUSH(3), SLOAD, POP], print_bin=False)
+    return WorldState({CALLEE_ADDRESS: AccountState(code=callee)})
+
+
+def test_records_slots_and_called_accounts():
+    code = assemble([PUSH(1), SLOAD, PUSH(2), SSTORE] + call(CALLEE_ADDRESS) + call(0xCC), print_bin=False)
+    context, access_list = create_access_list(code, world(), address=CALLER_ADDRESS)
+
+    assert context.success
+    assert access_list.to_list() == [
+        {"address": f"0x{CALLER_ADDRESS:040x}", "storageKeys": [f"0x{1:064x}", f"0x{2:064x}"]},
+        {"address": f"0x{CALLEE_ADDRESS:040x}", "storageKeys": [f"0x{3:064x}"]},
+        {"address": f"0x{0xCC:040x}", "storageKeys": []},
+    ]
+
+
+def test_exclude_and_json():
+    code = assemble(call(CALLEE_ADDRESS), print_bin=False)
+    _, access_list = create_access_list(code, world(), address=CALLER_ADDRESS)
+    assert json.loads(access_list.to_json(exclude=[CALLER_ADDRESS])) == [
+        {"address": f"0x{CALLEE_ADDRESS:040x}", "storageKeys": [f"0x{3:064x}"]}
+    ]
+
+
+def test_writes_go_to_the_wrapped_state():
+    world_state = world()
+    code = assemble([PUSH(42), PUSH(0), SSTORE], print_bin=False)
+    world_state.set(CALLER_ADDRESS, AccountState(code=code))
+
+    _, access_list = create_access_list(code, world_state, address=CALLER_ADDRESS, threaded=True)
+    assert world_state.get(CALLER_ADDRESS).storage.get(0) == 42
+    assert list(access_list.entries[CALLER_ADDRESS]) == [0]
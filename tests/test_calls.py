@@ -0,0 +1,150 @@
+from smol_evm.context import AccountState, FramePool, WorldState
+from smol_evm.constants import MAX_CALL_DEPTH
+from smol_evm.opcodes import *
+from smol_evm.runner import ExecutionLimitReached, run
+from smol_evm.stack import StackUnderflow
+
+import pytest
+
+CALLER_ADDRESS = 0xAA
+CALLEE_ADDRESS = 0xBB
+
+
+def call(insn, address, ret_size=32):
+    """calls the address with no arguments, the returndata is copied to memory[0:ret_size]"""
+    args = [PUSH(ret_size), PUSH(0), PUSH(0), PUSH(0)]
+    if insn == CALL:
+        args.append(PUSH(0))
+    return args + [PUSH(address), GAS, insn]
+
+
+def return_top():
+    return [PUSH(0), MSTORE, PUSH(32), PUSH(0), RETURN]
+
+
+def world(callee_code):
+    return WorldState(
+        {
+            CALLER_ADDRESS: AccountState(),
+            CALLEE_ADDRESS: AccountState(code=assemble(callee_code, print_bin=False)),
+        }
+    )
+
+
+def run_caller(caller_code, world_state, threaded):
+    code = assemble(caller_code, print_bin=False)
+    return run(code, world_state=world_state, address=CALLER_ADDRESS, caller=0x11, threaded=threaded)
+
+
+@pytest.fixture(params=[False, True], ids=["decoded", "threaded"])
+def threaded(request):
+    return request.param
+
+
+def test_returndata(threaded):
+    ctx = run_caller(
+        call(CALL, CALLEE_ADDRESS) + [PUSH(32), PUSH(0), RETURN], world([PUSH(42)] + return_top()), threaded
+    )
+    assert ctx.success
+    assert ctx.stack.stack == [1]
+    assert ctx.returndata == (42).to_bytes(32, "big")
+    assert ctx.last_returndata == (42).to_bytes(32, "big")
+
+
+def test_caller_and_address(threaded):
+    callee = [CALLER, PUSH(0), MSTORE, ADDRESS, PUSH(32), MSTORE, PUSH(64), PUSH(0), RETURN]
+    caller = call(CALL, CALLEE_ADDRESS, ret_size=64) + [PUSH(64), PUSH(0), RETURN]
+    ctx = run_caller(caller, world(callee), threaded)
+    assert ctx.returndata == CALLER_ADDRESS.to_bytes(32, "big") + CALLEE_ADDRESS.to_bytes(32, "big")
+
+    # DELEGATECALL keeps the caller and address of the current context
+    caller = call(DELEGATECALL, CALLEE_ADDRESS, ret_size=64) + [PUSH(64), PUSH(0), RETURN]
+    ctx = run_caller(caller, world(callee), threaded)
+    assert ctx.returndata == (0x11).to_bytes(32, "big") + CALLER_ADDRESS.to_bytes(32, "big")
+
+
+def test_storage_writes(threaded):
+    world_state = world([PUSH(7), PUSH(1), SSTORE])
+    run_caller(call(CALL, CALLEE_ADDRESS), world_state, threaded)
+    assert world_state.get(CALLEE_ADDRESS).storage.get(1) == 7
+    assert world_state.get(CALLER_ADDRESS).storage.get(1) == 0
+
+
+def test_delegatecall_writes_caller_storage(threaded):
+    world_state = world([PUSH(7), PUSH(1), SSTORE])
+    run_caller(call(DELEGATECALL, CALLEE_ADDRESS), world_state, threaded)
+    assert world_state.get(CALLER_ADDRESS).storage.get(1) == 7
+    assert world_state.get(CALLEE_ADDRESS).storage.get(1) == 0
+
+
+def test_revert_rolls_back_storage(threaded):
+    world_state = world([PUSH(7), PUSH(1), SSTORE, PUSH(0x42), PUSH(0), MSTORE, PUSH(32), PUSH(0), REVERT])
+    ctx = run_caller(call(CALL, CALLEE_ADDRESS) + [RETURNDATASIZE], world_state, threaded)
+    assert ctx.success
+    assert ctx.stack.stack == [0, 32]
+    assert ctx.memory.load_word(0) == 0x42
+    assert world_state.get(CALLEE_ADDRESS).storage.get(1) == 0
+
+
+def test_staticcall_cannot_write_storage(threaded):
+    world_state = world([PUSH(7), PUSH(1), SSTORE])
+    ctx = run_caller(call(STATICCALL, CALLEE_ADDRESS), world_state, threaded)
+    assert ctx.stack.stack == [0]
+    assert world_state.get(CALLEE_ADDRESS).storage.get(1) == 0
+
+
+def test_exceptional_halt_fails_the_call(threaded):
+    ctx = run_caller(call(CALL, CALLEE_ADDRESS) + [RETURNDATASIZE], world([ADD]), threaded)
+    assert ctx.success
+    assert ctx.stack.stack == [0, 0]
+
+
+def test_call_account_without_code(threaded):
+    ctx = run_caller(call(CALL, 0xCC), world([]), threaded)
+    assert ctx.stack.stack == [1]
+
+
+def test_top_level_failure_rolls_back_storage(threaded):
+    world_state = world([PUSH(7), PUSH(1), SSTORE])
+    ctx = run_caller(call(CALL, CALLEE_ADDRESS) + [PUSH(0), PUSH(0), REVERT], world_state, threaded)
+    assert not ctx.success
+    assert world_state.get(CALLEE_ADDRESS).storage.get(1) == 0
+
+
+def test_depth_limit(threaded):
+    # each frame increments a counter in the caller's storage, then calls itself
+    code = [PUSH(0), SLOAD, PUSH(1), ADD, PUSH(0), SSTORE] + call(CALL, CALLER_ADDRESS)
+    world_state = WorldState({CALLER_ADDRESS: AccountState(code=assemble(code, print_bin=False))})
+
+    ctx = run(world_state.get(CALLER_ADDRESS).code, world_state=world_state, address=CALLER_ADDRESS, threaded=threaded)
+    assert ctx.success
+    assert world_state.get(CALLER_ADDRESS).storage.get(0) == MAX_CALL_DEPTH + 1
+
+
+def test_frame_pool_recycles_stack_and_memory():
+    pool = FramePool()
+    stack, memory = pool.acquire()
+    stack.push(1)
+    memory.store(0, 1)
+    pool.release(stack, memory)
+
+    assert pool.acquire() == (stack, memory)
+    assert stack.stack == [] and memory.memory == []
+
+
+def test_exceptional_halt_rolls_back_top_level_storage(threaded):
+    world_state = world([])
+    with pytest.raises(StackUnderflow):
+        run_caller([PUSH(1), PUSH(0), SSTORE, POP], world_state, threaded)
+    assert world_state.get(CALLER_ADDRESS).storage.get(0) == 0
+
+
+def test_execution_limit_rolls_back_storage(threaded):
+    # the callee writes to storage and never returns
+    world_state = world([PUSH(7), PUSH(1), SSTORE, JUMPDEST, PUSH(5), JUMP])
+    code = assemble([PUSH(1), PUSH(0), SSTORE] + call(CALL, CALLEE_ADDRESS), print_bin=False)
+    with pytest.raises(ExecutionLimitReached):
+        run(code, world_state=world_state, address=CALLER_ADDRESS, max_steps=100, threaded=threaded)
+
+    assert world_state.get(CALLER_ADDRESS).storage.get(0) == 0
+    assert world_state.get(CALLEE_ADDRESS).storage.get(1) == 0
@@ -0,0 +1,46 @@
+import gc
+
+from smol_evm.codecache import CodeRegistry, CODE_REGISTRY
+from smol_evm.context import AccountState
+from smol_evm.opcodes import *
+
+
+def test_identical_code_is_analyzed_once():
+    code = assemble([PUSH(4), JUMP, STOP, JUMPDEST, STOP], print_bin=False)
+    before = CODE_REGISTRY.misses
+    clones = [AccountState(code=code) for _ in range(1000)]
+
+    assert CODE_REGISTRY.misses <= before + 1
+    assert len({id(account.code_handle) for account in clones}) == 1
+    assert clones[0].code == code
+
+
+def test_analysis_artifacts():
+    code = assemble([PUSH(4), JUMPI, STOP, JUMPDEST, PUSH(0x5B), STOP], print_bin=False)
+    analysis = CodeRegistry().get(code)
+
+    assert analysis.jumpdests == {4}
+    assert [pc for pc in range(len(code)) if analysis.is_jumpdest(pc)] == [4]
+    assert analysis.program[0] == PUSH(4)
+    assert sorted(analysis.program) == [0, 2, 3, 4, 5, 7]
+    assert analysis.basic_blocks == [(0, 3), (3, 4), (4, 8)]
+    assert analysis.memory_usage() > 0
+
+
+def test_unreferenced_entries_are_evicted():
+    registry = CodeRegistry(max_unreferenced=2)
+    handles = [registry.get(bytes([i])) for i in range(5)]
+    assert len(registry) == 5
+
+    del handles
+    gc.collect()
+
+    # only the 2 most recently used entries survive
+    assert len(registry) == 2
+    assert registry.memory_usage() > 0
+
+
+def test_changing_code_updates_the_handle():
+    account = AccountState(code=b"\x00")
+    account.code = b"\x5b"
+    assert account.code_handle.jumpdests == {0}
@@ -0,0 +1,100 @@
+from smol_evm.concolic import Constraint, ShadowStackTracer, explore, solve, trace_branches
+from smol_evm.dispatcher import find_selectors
+from smol_evm.opcodes import *
+
+import pytest
+
+
+def selector_load():
+    return [PUSH(0), CALLDATALOAD, PUSH(0xE0), SHR]
+
+
+def test_solve_equality():
+    assert solve([Constraint("eq", 0x42)]) == 0x42
+
+
+def test_solve_range():
+    assert solve([Constraint("gt", 0x1000), Constraint("le", 0x2000)]) == 0x1001
+
+
+def test_solve_skips_excluded_values():
+    assert solve([Constraint("ge", 0x10), Constraint("ne", 0x10), Constraint("ne", 0x11)]) == 0x12
+
+
+def test_solve_unsat():
+    assert solve([Constraint("eq", 0x42), Constraint("ne", 0x42)]) is None
+    assert solve([Constraint("lt", 0x10), Constraint("gt", 0x20)]) is None
+
+
+def test_negate_round_trip():
+    for op in ("eq", "ne", "lt", "ge", "gt", "le"):
+        c = Constraint(op, 7)
+        assert c.negate().negate() == c
+        assert all(c.holds(x) != c.negate().holds(x) for x in range(5, 10))
+
+
+def test_trace_records_selector_branches():
+    code = assemble(selector_load() + [DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x11), JUMPI, STOP, JUMPDEST, STOP])
+
+    branches = trace_branches(code, 0xAABBCCDD)
+    assert len(branches) == 1
+    assert branches[0].constraint == Constraint("eq", 0xAABBCCDD)
+    assert branches[0].taken
+    assert branches[0].next_pc == 0x11
+
+    branches = trace_branches(code, 0)
+    assert not branches[0].taken
+
+
+def test_explore_binary_search_dispatcher():
+    code = assemble(
+        selector_load()
+        + [
+            DUP1, PUSH(0x80000000), LT, PUSH(0x1B), JUMPI,  # 0x06
+            DUP1, PUSH(0x11223344), EQ, PUSH(0x27), JUMPI,  # 0x10
+            STOP,  # 0x1a
+            JUMPDEST,  # 0x1b
+            DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x29), JUMPI,  # 0x1c
+            STOP,  # 0x26
+            JUMPDEST, STOP,  # 0x27
+            JUMPDEST, STOP,  # 0x29
+        ]
+    )
+    result = explore(code)
+    assert result.selectors == {0x11223344: 0x27, 0xAABBCCDD: 0x29}
+
+    # one run per leaf of the binary tree
+    assert result.runs == 4
+
+
+def test_explore_obfuscated_dispatcher():
+    """the ISZEROs hide the dispatcher from the static pattern matcher, but not from the concolic tracer"""
+    code = assemble(
+        selector_load()
+        + [
+            DUP1, PUSH(0xAABBCCDD), EQ, ISZERO, ISZERO, PUSH(0x1E), JUMPI,  # 0x06
+            PUSH(0x11223344), DUP2, XOR, ISZERO, PUSH(0x20), JUMPI,  # 0x12
+            STOP,  # 0x1d
+            JUMPDEST, STOP,  # 0x1e
+            JUMPDEST, STOP,  # 0x20
+        ]
+    )
+    assert find_selectors(code) is None
+
+    result = explore(code)
+    assert result.selectors == {0xAABBCCDD: 0x1E, 0x11223344: 0x20}
+
+
+def test_trace_stops_at_execution_errors():
+    code = assemble(selector_load() + [DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x12), JUMPI, ADD, JUMPDEST, STOP])
+    branches = trace_branches(code, 0)
+    assert len(branches) == 1 and not branches[0].taken
+
+
+def test_tracer_bugs_are_not_swallowed(monkeypatch):
+    def broken(*args):
+        raise KeyError("bug")
+
+    monkeypatch.setattr(ShadowStackTracer, "posthook", broken)
+    with pytest.raises(KeyError):
+        trace_branches(assemble(selector_load()), 0)
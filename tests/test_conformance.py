@@ -0,0 +1,127 @@
+import json
+
+from smol_evm.conformance import load_cases, run_conformance
+from smol_evm.opcodes import *
+
+import pytest
+
+STORE = assemble([PUSH(0), CALLDATALOAD, PUSH(1), SSTORE], print_bin=False)
+
+EVM_FROM_SCRATCH = [
+    {
+        "name": "ADD",
+        "code": {"asm": "", "bin": assemble([PUSH(1), PUSH(2), ADD], print_bin=False).hex()},
+        "expect": {"stack": ["0x3"], "success": True},
+    },
+    {
+        "name": "wrong stack",
+        "code": {"asm": "", "bin": assemble([PUSH(1)], print_bin=False).hex()},
+        "expect": {"stack": ["0x2"], "success": True},
+    },
+    {"name": "INVALID", "code": {"asm": "", "bin": "fe"}, "expect": {"stack": [], "success": False}},
+]
+
+VM_TESTS = {
+    "sstore": {
+        "exec": {
+            "address": "0x0f",
+            "caller": "0x01",
+            "code": "0x" + STORE.hex(),
+            "data": "0x" + "00" * 31 + "2a",
+            "value": "0x0",
+        },
+        "pre": {"0x0f": {"balance": "0x0", "nonce": "0x0", "code": "0x" + STORE.hex(), "storage": {}}},
+        "post": {"0x0f": {"balance": "0x0", "nonce": "0x0", "code": "0x" + STORE.hex(), "storage": {"0x01": "0x2a"}}},
+        "out": "0x",
+    },
+    "underflow": {
+        "exec": {"address": "0x0f", "caller": "0x01", "code": "0x01", "data": "0x", "value": "0x0"},
+        "pre": {},
+    },
+}
+
+STATE_TESTS = {
+    "store": {
+        "pre": {"0x0f": {"balance": "0x0", "nonce": "0x0", "code": "0x" + STORE.hex(), "storage": {}}},
+        "transaction": {
+            "to": "0x0f",
+            "sender": "0x01",
+            "data": ["0x" + "00" * 31 + "07", "0x"],
+            "value": ["0x0"],
+            "gasLimit": ["0x100000"],
+        },
+        "post": {
+            "Cancun": [
+                {
+                    "indexes": {"data": 0, "gas": 0, "value": 0},
+                    "hash": "0x00",
+                    "state": {"0x0f": {"storage": {"0x01": "0x07"}}},
+                },
+                {
+                    "indexes": {"data": 1, "gas": 0, "value": 0},
+                    "hash": "0x00",
+                    "state": {"0x0f": {"storage": {"0x01": "0x07"}}},
+                },
+            ],
+            "London": [{"indexes": {"data": 0, "gas": 0, "value": 0}, "hash": "0x00"}],
+        },
+    },
+    "root only": {
+        "pre": {},
+        "transaction": {"to": "0x0f", "sender": "0x01", "data": ["0x"], "value": ["0x0"], "gasLimit": ["0x100000"]},
+        "post": {"Cancun": [{"indexes": {"data": 0, "gas": 0, "value": 0}, "hash": "0x00"}]},
+    },
+}
+
+
+@pytest.fixture
+def fixtures(tmp_path):
+    (tmp_path / "evm.json").write_text(json.dumps(EVM_FROM_SCRATCH))
+    (tmp_path / "vm").mkdir()
+    (tmp_path / "vm" / "vmTests.json").write_text(json.dumps(VM_TESTS))
+    (tmp_path / "state.json").write_text(json.dumps(STATE_TESTS))
+    return tmp_path
+
+
+def test_load_cases(fixtures):
+    names = [name for name, _, _ in load_cases(str(fixtures / "state.json"))]
+    assert names == ["store[Cancun:0-0-0]", "store[Cancun:1-0-0]", "root only[Cancun:0-0-0]"]
+
+
+def test_results(fixtures):
+    report = run_conformance([str(fixtures)], processes=1)
+    statuses = {result.name: result.status for result in report.results}
+    assert statuses == {
+        "evm.json#0 ADD": "pass",
+        "evm.json#1 wrong stack": "fail",
+        "evm.json#2 INVALID": "pass",
+        "sstore": "pass",
+        "underflow": "pass",
+        "store[Cancun:0-0-0]": "pass",
+        "store[Cancun:1-0-0]": "fail",
+        "root only[Cancun:0-0-0]": "skip",
+    }
+
+    assert report.opcode_failures() == {"PUSH1": 2, "CALLDATALOAD": 1, "SSTORE": 1}
+    assert "passed: 5, failed: 2, skipped: 1" in report.summary()
+
+
+def test_cache(fixtures, tmp_path):
+    cache = str(tmp_path / "cache.json")
+    first = run_conformance([str(fixtures)], processes=2, cache_path=cache)
+    assert not any(result.cached for result in first.results)
+
+    second = run_conformance([str(fixtures)], processes=2, cache_path=cache)
+    assert all(result.cached for result in second.results)
+    assert [(r.name, r.status) for r in second.results] == [(r.name, r.status) for r in first.results]
+    assert second.execution_time == 0
+
+
+def test_cache_keeps_the_results_of_other_fixtures(fixtures, tmp_path):
+    cache = str(tmp_path / "cache.json")
+    run_conformance([str(fixtures / "evm.json")], processes=1, cache_path=cache)
+    run_conformance([str(fixtures / "vm")], processes=1, cache_path=cache)
+
+    report = run_conformance([str(fixtures / "evm.json"), str(fixtures / "vm")], processes=1, cache_path=cache)
+    assert len(report.results) == 5
+    assert all(result.cached for result in report.results)
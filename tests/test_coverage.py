@@ -0,0 +1,75 @@
+from disasm import disassemble
+from smol_evm.coverage import BUCKETS, EdgeCoverage, edge_index, static_edges
+from smol_evm.opcodes import *
+
+import pytest
+
+# if calldata[0] == 1: return 1 else: revert
+CODE = assemble(
+    [PUSH(0), CALLDATALOAD, PUSH(1), EQ, PUSH(17), JUMPI, PUSH(0), PUSH(0), REVERT, INVALID, INVALID, INVALID]
+    + [JUMPDEST, PUSH(1), PUSH(0), MSTORE, PUSH(32), PUSH(0), RETURN],
+    print_bin=False,
+)
+JUMPI_PC = 8
+TARGET_PC = 17
+
+
+def calldata(value):
+    return value.to_bytes(32, "big")
+
+
+def test_edges_and_new_coverage():
+    coverage = EdgeCoverage()
+    assert static_edges(CODE) == [(JUMPI_PC, JUMPI_PC + 1), (JUMPI_PC, TARGET_PC)]
+
+    context, new = coverage.run(CODE, calldata=calldata(0))
+    assert not context.success and new
+    assert coverage.covered_edges(CODE) == [(JUMPI_PC, JUMPI_PC + 1)]
+
+    # same path, nothing new
+    _, new = coverage.run(CODE, calldata=calldata(2))
+    assert not new
+
+    context, new = coverage.run(CODE, calldata=calldata(1))
+    assert context.success and new
+    assert coverage.covered_edges(CODE) == static_edges(CODE)
+    assert coverage.edge_count() == 2
+
+
+def test_hit_count_buckets():
+    assert [BUCKETS[n] for n in (0, 1, 2, 3, 5, 9, 20, 100, 200, 255)] == [0, 1, 2, 4, 8, 16, 32, 64, 128, 128]
+
+    # a loop that jumps back twice
+    loop = assemble(
+        [PUSH(3), JUMPDEST, PUSH(1), SWAP1, SUB, DUP1, PUSH(2), JUMPI, STOP],
+        print_bin=False,
+    )
+    coverage = EdgeCoverage()
+    coverage.run(loop)
+    assert coverage.total[edge_index(10, 2)] == BUCKETS[2]
+    assert coverage.total[edge_index(10, 11)] == BUCKETS[1]
+
+
+def test_merge_across_maps(tmp_path):
+    first, second = EdgeCoverage(), EdgeCoverage()
+    first.run(CODE, calldata=calldata(0))
+    second.run(CODE, calldata=calldata(1))
+
+    path = str(tmp_path / "coverage.map")
+    second.save(path)
+    assert first.load(path)
+    assert first.covered_edges(CODE) == static_edges(CODE)
+    assert not first.merge(second)
+
+    with pytest.raises(ValueError):
+        first.merge(bytes(16))
+
+
+def test_report():
+    coverage = EdgeCoverage()
+    coverage.run(CODE, calldata=calldata(0))
+
+    lines = coverage.report(CODE, disassemble(CODE))
+    never_executed = [line.split(": ")[1] for line in lines[:-1] if line.startswith("####")]
+    assert never_executed == ["JUMPDEST", "PUSH1 0x01", "PUSH1 0x00", "MSTORE", "PUSH1 0x20", "PUSH1 0x00", "RETURN"]
+    assert lines[-1] == "instructions: 9/16, edges: 1/2, runs: 1"
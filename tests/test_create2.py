@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+
+import pytest
+from eth_utils import keccak
+
+from smol_evm.create2 import (
+    ADDRESS_OFFSET,
+    Coordinator,
+    DirectoryChunks,
+    InvalidCheckpoint,
+    InvalidPattern,
+    LocalChunks,
+    Pattern,
+    RemoteChunks,
+    SearchSpec,
+    best_hits,
+    compile_pattern,
+    create2_address,
+    hasher,
+    init_code_hash,
+    preimage,
+    search,
+    search_chunks,
+    search_salts,
+)
+
+DEPLOYER = bytes.fromhex("Bf6cE3350513EfDcC0d5bd5413F1dE53D0E4f9aE")
+CODE_HASH = init_code_hash(bytes.fromhex("602a60205260206020f3"))
+
+
+def digest_of(address: str) -> bytes:
+    return bytes(ADDRESS_OFFSET) + bytes.fromhex(address[2:])
+
+
+def test_eip1014_examples():
+    assert create2_address(bytes(20), 0, init_code_hash(b"\x00")) == "0x4D1A2e2bB4F88F0250f26Ffff098B0b30B26BF38"
+    deployer = bytes.fromhex("00000000000000000000000000000000deadbeef")
+    salt = 0xCAFEBABE
+    code_hash = init_code_hash(bytes.fromhex("deadbeef"))
+    assert create2_address(deployer, salt, code_hash) == "0x60f3f640a8508fC6a86d45DF051962668E1e8AC7"
+
+
+def test_hasher_hashes_the_buffer_in_place():
+    buffer = preimage(DEPLOYER, CODE_HASH)
+    digest = hasher(buffer)
+    for salt in (0, 1, 2**64 + 5):
+        buffer[21:53] = salt.to_bytes(32, "big")
+        assert digest() == keccak(bytes(buffer))
+
+
+def test_patterns():
+    address = "0x00002Caf02f8D0f3A6cFC16c8877ba6FBD042C46"
+    for text in ("0000", "0x00002caf", "*2c46", "0000*2C46", "00??2?af", "????????????????????????????????????2c4?"):
+        assert Pattern(text).match(digest_of(address)), text
+
+    for text in ("0001", "*2c47", "00??3", "0000*2c45"):
+        assert not Pattern(text).match(digest_of(address)), text
+
+    # mixed case patterns must match the checksummed address
+    assert Pattern("00002Caf").match(digest_of(address))
+    assert not Pattern("00002cAf").match(digest_of(address))
+
+    for text in ("00*11*22", "0" * 41, "xyz"):
+        with pytest.raises(InvalidPattern):
+            Pattern(text)
+
+
+def test_search_salts_matches_brute_force():
+    patterns = [Pattern("0"), Pattern("*a")]
+    start = 2**64 - 100
+    hits = search_salts(DEPLOYER, CODE_HASH, patterns, start, 200)
+
+    expected = []
+    for salt in range(start, start + 200):
+        address = create2_address(DEPLOYER, salt, CODE_HASH)
+        if address[2] == "0":
+            expected.append((salt, address, "0"))
+        if address[-1].lower() == "a":
+            expected.append((salt, address, "*a"))
+
+    assert [(hit.salt, hit.address, hit.pattern) for hit in hits] == expected
+
+
+def test_search():
+    stats = search(DEPLOYER, CODE_HASH, [Pattern("000")], processes=1, chunk_size=1000)
+    assert len(stats.hits) >= 1
+    assert stats.hashes >= stats.hits[0].salt
+    assert create2_address(DEPLOYER, stats.hits[0].salt, CODE_HASH).startswith("0x000")
+
+    stats = search(DEPLOYER, CODE_HASH, [Pattern("00000000")], processes=1, max_salts=2500, chunk_size=1000)
+    assert stats.hashes == 2500
+    assert stats.hits == []
+
+
+def spec(**kwargs):
+    return SearchSpec(DEPLOYER, CODE_HASH, ("00",), chunk_size=100, **kwargs)
+
+
+def test_checkpoint_resumes(tmpdir):
+    path = str(tmpdir.join("checkpoint.json"))
+    stats = search(DEPLOYER, CODE_HASH, [Pattern("00")], max_hits=3, processes=1, chunk_size=100, checkpoint=path)
+    assert len(stats.hits) == 3
+
+    with open(path) as f:
+        checkpoint = json.load(f)
+    done = stats.chunks
+    assert checkpoint["completed"] == [[0, done - 1]]
+
+    # the completed chunks are skipped, and the hits are kept
+    stats = search(DEPLOYER, CODE_HASH, [Pattern("00")], max_hits=5, processes=1, chunk_size=100, checkpoint=path)
+    assert stats.hits[:3] == search_salts(DEPLOYER, CODE_HASH, [Pattern("00")], 0, 100 * done)[:3]
+    assert len(stats.hits) == 5
+    assert stats.hashes == 100 * stats.chunks
+    assert LocalChunks(spec(), path).claim() == done + stats.chunks
+
+    with pytest.raises(InvalidCheckpoint):
+        search(DEPLOYER, CODE_HASH, [Pattern("0000")], processes=1, chunk_size=100, checkpoint=path)
+
+
+def test_chunks_are_bounded_by_stop():
+    chunks = LocalChunks(spec(start=50, stop=300))
+    assert [chunks.claim() for _ in range(4)] == [0, 1, 2, None]
+    assert chunks.spec.chunk_range(2) == (250, 50)
+
+    stats = search_chunks(spec(start=50, stop=300), LocalChunks(spec(start=50, stop=300)), max_hits=0, processes=1)
+    assert stats.hashes == 250
+    assert stats.hits == search_salts(DEPLOYER, CODE_HASH, [Pattern("00")], 50, 250)
+
+
+def test_directory_chunks(tmpdir):
+    directory = str(tmpdir)
+    first, second = DirectoryChunks(directory, spec(stop=500)), DirectoryChunks(directory, spec(stop=500))
+    assert [first.claim(), second.claim(), first.claim()] == [0, 1, 2]
+
+    hits = search_salts(DEPLOYER, CODE_HASH, [Pattern("00")], 100, 100)
+    second.complete(1, hits)
+    assert first.hits() == hits
+
+    # the claims of a search that died are taken over once their lease expires
+    third = DirectoryChunks(directory, spec(stop=500), lease=0)
+    assert [third.claim(), third.claim(), third.claim(), third.claim()] == [0, 2, 3, 4]
+
+    stats = search_chunks(spec(stop=500), DirectoryChunks(directory, spec(stop=500), lease=0), max_hits=0, processes=1)
+    assert stats.hits == search_salts(DEPLOYER, CODE_HASH, [Pattern("00")], 0, 500)
+    assert sorted(name for name in os.listdir(directory) if name.endswith(".claim")) == []
+
+    with pytest.raises(InvalidCheckpoint):
+        DirectoryChunks(directory, spec(stop=600))
+
+
+def test_coordinator(tmpdir):
+    path = str(tmpdir.join("checkpoint.json"))
+    coordinator = Coordinator(spec(stop=1000), checkpoint=path, max_hits=0, lease=60)
+    assert coordinator.handle_request({"op": "claim"}) == {"chunk": 0}
+    assert coordinator.handle_request({"op": "claim"}) == {"chunk": 1}
+    assert coordinator.handle_request({"op": "complete", "chunk": 0, "hits": []}) == {}
+    assert "error" in coordinator.handle_request({"op": "nope"})
+
+    # chunk 1 was claimed but never completed, it is handed out again once its lease expires
+    coordinator.leases[1] = 0
+
+    def search_remote(port):
+        chunks = RemoteChunks("127.0.0.1", port)
+        assert chunks.spec == spec(stop=1000)
+        try:
+            return search_chunks(chunks.spec, chunks, max_hits=0, processes=1)
+        finally:
+            chunks.close()
+
+    async def main():
+        async with await coordinator.start("127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            return await asyncio.get_running_loop().run_in_executor(None, search_remote, port)
+
+    stats = asyncio.run(main())
+    assert stats.chunks == 9
+    assert stats.hits == search_salts(DEPLOYER, CODE_HASH, [Pattern("00")], 100, 900)
+    with open(path) as f:
+        assert json.load(f)["completed"] == [[0, 9]]
+
+
+def test_contains_and_scores():
+    address = "0x00002Caf02f8D0f3A6cFC16c8877ba6FBD042C46"
+    assert compile_pattern("~2caf02").match(digest_of(address))
+    assert compile_pattern("~f?d0f3").match(digest_of(address))
+    assert compile_pattern("~A6cFC").match(digest_of(address))
+    assert not compile_pattern("~a6cfC").match(digest_of(address))
+    assert not compile_pattern("~badc0de").match(digest_of(address))
+
+    score = compile_pattern("score:leading-zeros")
+    assert score.score(digest_of(address)) == 4
+    assert score.above(3)(digest_of(address)) and not score.above(4)(digest_of(address))
+    assert compile_pattern("score:zero-bytes").score(digest_of(address)) == 2
+
+    for text in ("~", "~xyz", "score:nope"):
+        with pytest.raises(InvalidPattern):
+            compile_pattern(text)
+
+
+def test_single_pass_matches_each_pattern():
+    texts = ["00", "0a", "*ff", "1?2", "~abc", "~dead", "score:leading-zeros", "score:zero-bytes"]
+    hits = search_salts(DEPLOYER, CODE_HASH, [compile_pattern(text) for text in texts], 0, 3000)
+
+    for text in texts:
+        alone = search_salts(DEPLOYER, CODE_HASH, [compile_pattern(text)], 0, 3000)
+        assert alone and [hit for hit in hits if hit.pattern == text] == alone, text
+
+    # scores only report improvements
+    scores = [hit.score for hit in hits if hit.pattern == "score:leading-zeros"]
+    assert scores == sorted(set(scores))
+    best = best_hits(hits)
+    assert best["00"] == next(hit for hit in hits if hit.pattern == "00")
+    assert best["score:leading-zeros"].score == scores[-1]
+
+
+def test_search_keeps_the_best_scores(tmpdir):
+    patterns = [compile_pattern("000"), compile_pattern("score:leading-zeros")]
+    stats = search(DEPLOYER, CODE_HASH, patterns, max_hits=1, processes=1, chunk_size=500)
+
+    # score hits don't stop the search
+    matches = [hit for hit in stats.hits if hit.score is None]
+    assert len(matches) == 1 and matches[0].pattern == "000"
+    best = best_hits(search_salts(DEPLOYER, CODE_HASH, patterns[1:], 0, 500 * stats.chunks))
+    assert stats.best["score:leading-zeros"] == best["score:leading-zeros"]
+
+    # the best scores are checkpointed with the hits
+    path = str(tmpdir.join("checkpoint.json"))
+    stats = search(DEPLOYER, CODE_HASH, patterns[1:], max_salts=5000, processes=1, chunk_size=500, checkpoint=path)
+    best = best_hits(search_salts(DEPLOYER, CODE_HASH, patterns[1:], 0, 5000))
+    assert stats.best == best
+    assert f"best score:leading-zeros: {best['score:leading-zeros'].score}" in str(stats)
+    score_spec = SearchSpec(DEPLOYER, CODE_HASH, ("score:leading-zeros",), stop=5000, chunk_size=500)
+    assert LocalChunks(score_spec, path).hits() == stats.hits
@@ -0,0 +1,106 @@
+from smol_evm.dispatcher import find_selectors
+from smol_evm.opcodes import *
+
+
+def selector_load():
+    return [PUSH(0), CALLDATALOAD, PUSH(0xE0), SHR]
+
+
+def test_no_dispatcher():
+    code = assemble([PUSH(0x42), PUSH(0), MSTORE, PUSH(0x20), PUSH(0), RETURN])
+    assert find_selectors(code) is None
+
+
+def test_no_selector_load():
+    """a PUSH4/EQ/JUMPI sequence is not a dispatcher if nothing loads a selector from calldata"""
+    code = assemble([PUSH(0), DUP1, PUSH(0xAABBCCDD), EQ, PUSH(9), JUMPI, STOP, JUMPDEST, STOP])
+    assert find_selectors(code) is None
+
+
+def test_linear_dispatcher():
+    code = assemble(
+        selector_load()
+        + [
+            DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x1B), JUMPI,  # 0x06 - 0x10
+            DUP1, PUSH(0x11223344), EQ, PUSH(0x1D), JUMPI,  # 0x10 - 0x1a
+            STOP,  # 0x1a
+            JUMPDEST, STOP,  # 0x1b
+            JUMPDEST, STOP,  # 0x1d
+        ]
+    )
+    assert find_selectors(code) == {0xAABBCCDD: 0x1B, 0x11223344: 0x1D}
+
+
+def test_legacy_div_selector_load():
+    code = assemble(
+        [PUSH(0), CALLDATALOAD, PUSH(2**224), SWAP1, DIV]
+        + [DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x2E), JUMPI, STOP, JUMPDEST, STOP]
+    )
+    assert find_selectors(code) == {0xAABBCCDD: 0x2E}
+
+
+def test_binary_search_dispatcher():
+    code = assemble(
+        selector_load()
+        + [
+            DUP1, PUSH(0x80000000), GT, PUSH(0x1B), JUMPI,  # 0x06
+            DUP1, PUSH(0x11223344), EQ, PUSH(0x27), JUMPI,  # 0x10
+            STOP,  # 0x1a
+            JUMPDEST,  # 0x1b
+            DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x29), JUMPI,  # 0x1c
+            STOP,  # 0x26
+            JUMPDEST, STOP,  # 0x27
+            JUMPDEST, STOP,  # 0x29
+        ]
+    )
+    assert find_selectors(code) == {0x11223344: 0x27, 0xAABBCCDD: 0x29}
+
+
+def test_vyper_style_dispatcher():
+    """XOR-based dispatchers jump away on mismatch, the function body is the fallthrough"""
+    code = assemble(
+        selector_load()
+        + [
+            PUSH(0xAABBCCDD), DUP2, XOR, PUSH(0x11), JUMPI,  # 0x06
+            STOP,  # 0x10
+            JUMPDEST, STOP,  # 0x11
+        ]
+    )
+    assert find_selectors(code) == {0xAABBCCDD: 0x10}
+
+
+def test_vyper_style_dispatcher_with_inline_bodies():
+    """each function body sits between two checks, comparisons inside of it are not selectors"""
+    code = assemble(
+        selector_load()
+        + [
+            PUSH(0xAABBCCDD), DUP2, XOR, PUSH(0x19), JUMPI,  # 0x06
+            DUP1, PUSH(0x42), EQ, PUSH(0x17), JUMPI,  # 0x10, body of 0xaabbccdd
+            JUMPDEST, STOP,  # 0x17
+            JUMPDEST,  # 0x19
+            PUSH(0x11223344), DUP2, XOR, PUSH(0x25), JUMPI,  # 0x1a
+            STOP,  # 0x24, body of 0x11223344
+            JUMPDEST, STOP,  # 0x25
+        ]
+    )
+    assert find_selectors(code) == {0xAABBCCDD: 0x10, 0x11223344: 0x24}
+
+
+def test_invalid_entry_ignored():
+    code = assemble(selector_load() + [DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x42), JUMPI, STOP])
+    assert find_selectors(code) is None
+
+
+def test_comparisons_in_function_bodies_ignored():
+    """once we reach the first function entry, we are out of the dispatcher"""
+    code = assemble(
+        selector_load()
+        + [
+            DUP1, PUSH(0xAABBCCDD), EQ, PUSH(0x11), JUMPI,  # 0x06
+            STOP,  # 0x10
+            JUMPDEST,  # 0x11
+            DUP1, PUSH(0x42), EQ, PUSH(0x1A), JUMPI,  # 0x12
+            JUMPDEST, STOP,  # 0x1a
+        ]
+    )
+    assert find_selectors(code) == {0xAABBCCDD: 0x11}
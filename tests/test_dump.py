@@ -0,0 +1,75 @@
+import json
+
+from smol_evm.dump import DumpBackend, InvalidDump, open_dump
+from smol_evm.opcodes import *
+from smol_evm.runner import run
+
+import pytest
+
+INCREMENT = assemble([PUSH(0), SLOAD, PUSH(1), ADD, PUSH(0), SSTORE], print_bin=False)
+
+ACCOUNTS = {
+    f"0x{0xAA:040x}": {
+        "balance": "1000000000000000000",
+        "nonce": 1,
+        "code": "0x" + INCREMENT.hex(),
+        "storage": {f"0x{0:064x}": "29", f"0x{5:064x}": "0a"},
+    },
+    f"0x{0xBB:040x}": {"balance": "0", "nonce": 0, "storage": {"0x02": '"}{'.encode().hex()}},
+    # no preimage for the address, can't be looked up
+    "pre(0x1234)": {"balance": "5", "nonce": 0},
+}
+
+
+@pytest.fixture(params=["json", "jsonl"])
+def dump_path(request, tmp_path):
+    path = tmp_path / f"dump.{request.param}"
+    if request.param == "json":
+        path.write_text(json.dumps({"root": "0x" + "00" * 32, "accounts": ACCOUNTS}, indent=2))
+    else:
+        lines = [json.dumps({"root": "0x" + "00" * 32})]
+        lines += [
+            json.dumps(dict(account, address=address)) for address, account in ACCOUNTS.items() if "(" not in address
+        ]
+        path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_index(dump_path):
+    backend = DumpBackend(dump_path)
+    assert sorted(backend.index) == [0xAA, 0xBB]
+    assert backend.parsed == 0
+
+    assert backend.load_account(0xAA) == (1, 10**18, INCREMENT)
+    assert backend.load_slot(0xAA, 5) == 10
+    assert backend.load_slot(0xBB, 2) == int('"}{'.encode().hex(), 16)
+    assert backend.load_slot(0xBB, 3) == 0
+    assert backend.load_account(0xCC) is None
+
+    # every account was parsed once
+    assert backend.parsed == 2
+    backend.close()
+
+
+def test_execute_against_dump(dump_path):
+    world_state = open_dump(dump_path)
+    context = run(INCREMENT, world_state=world_state, address=0xAA)
+    assert context.success
+    assert world_state.get(0xAA).storage.get(0) == 42
+    assert list(world_state.accounts) == [0xAA]
+
+    with pytest.raises(NotImplementedError):
+        world_state.commit()
+
+
+def test_invalid_dumps(tmp_path):
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    no_accounts = tmp_path / "no_accounts"
+    no_accounts.write_text('{\n"root": "0x00"\n}')
+    truncated = tmp_path / "truncated"
+    truncated.write_text('{\n"accounts": {"0x00": {')
+
+    for path in (empty, no_accounts, truncated):
+        with pytest.raises(InvalidDump):
+            DumpBackend(str(path))
@@ -0,0 +1,82 @@
+import os
+import random
+
+from smol_evm import context
+from smol_evm.codecache import CODE_REGISTRY
+from smol_evm.constants import MAX_UINT256
+from smol_evm.fuzz import Mutator, failure, fuzz, minimize
+from smol_evm.opcodes import *
+
+# INVALID if the first ABI word is MAX_UINT256, an invalid jump if it is 2**255, otherwise STOP
+CODE = assemble(
+    [PUSH(4), CALLDATALOAD, DUP1, PUSH(MAX_UINT256), EQ, PUSH(79), JUMPI]
+    + [PUSH(2**255), EQ, PUSH(81), JUMPI, STOP, JUMPDEST, INVALID, JUMPDEST, PUSH(3), JUMP],
+    print_bin=False,
+)
+
+
+def word(value):
+    return bytes(4) + value.to_bytes(32, "big")
+
+
+def test_failure_kinds():
+    assert failure(CODE, word(1), 1000, ("error", "invalid-jump")) is None
+    assert failure(CODE, word(MAX_UINT256), 1000, ("error", "invalid-jump")) == ("error", "INVALID")
+    assert failure(CODE, word(2**255), 1000, ("error", "invalid-jump")) == ("invalid-jump", "Invalid jump to 3")
+    assert failure(CODE, word(2**255), 1000, ("error",)) is None
+
+    reverts = assemble([PUSH(0), PUSH(0), REVERT], print_bin=False)
+    assert failure(reverts, b"", 1000, ("error",)) is None
+    assert failure(reverts, b"", 1000, ("revert",)) == ("revert", "reverted with 0x")
+
+    assert failure(CODE, word(1), 1000, ("invariant",), lambda context: False) == ("invariant", "invariant violated")
+
+
+def test_minimize():
+    data = bytes([0xAA] * 4) + MAX_UINT256.to_bytes(32, "big") + bytes([0xBB] * 40)
+    assert minimize(CODE, data, "error", 1000) == word(MAX_UINT256)
+
+
+def test_mutations_stay_bounded():
+    mutator = Mutator(random.Random(0), selectors=[0x12345678])
+    data = bytes(4)
+    for _ in range(1000):
+        data = mutator.mutate(data, [bytes(36)])
+        assert len(data) <= 4 + 32 * 16
+
+
+def test_fuzz_finds_both_bugs(tmp_path):
+    corpus_dir = tmp_path / "corpus"
+    corpus_dir.mkdir()
+    (corpus_dir / "seed").write_bytes(word(0))
+
+    reports = []
+    stats = fuzz(CODE, str(corpus_dir), processes=1, max_execs=3000, seed=1, report=reports.append)
+
+    assert stats.execs >= 3000
+    assert stats.crashes == {"error": 1, "invalid-jump": 1}
+    assert stats.corpus > 1 and stats.edges >= 3
+    assert reports[-1] is stats
+
+    crashes = {
+        name.split("-")[0]: (corpus_dir / "crashes" / name).read_bytes() for name in os.listdir(corpus_dir / "crashes")
+    }
+    # calldata is zero-padded, the trailing zeros are minimized away
+    assert crashes == {"error": word(MAX_UINT256), "invalid": bytes(4) + b"\x80"}
+
+
+def test_fuzz_with_worker_processes(tmp_path):
+    stats = fuzz(CODE, str(tmp_path), processes=2, max_execs=400, batch_size=50, seed=2)
+    assert stats.execs >= 400
+    assert len(os.listdir(tmp_path)) > 1
+
+
+def test_fuzz_reuses_the_code_analysis(tmp_path, monkeypatch):
+    analyses = []
+    original = context.valid_jump_destinations
+    monkeypatch.setattr(context, "valid_jump_destinations", lambda code: analyses.append(code) or original(code))
+    CODE_REGISTRY.clear()
+
+    stats = fuzz(CODE, str(tmp_path), processes=1, max_execs=500, seed=3)
+    assert stats.execs >= 500
+    assert analyses == [CODE]
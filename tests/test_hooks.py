@@ -0,0 +1,124 @@
+from smol_evm.context import AccountState, WorldState
+from smol_evm.hooks import EventSink, Hooks, instruction_at, unpack_records
+from smol_evm.opcodes import *
+from smol_evm.runner import run
+from smol_evm.threaded import HANDLERS
+
+import pytest
+
+CODE = assemble([PUSH(0x42), PUSH(0), MSTORE, PUSH(1), PUSH(2), EQ, PUSH(0x20), PUSH(0), RETURN], print_bin=False)
+
+
+def test_only_subscribed_handlers_are_swapped():
+    hooks = Hooks().on([MSTORE, "EQ"], prehook=lambda context, instruction: None)
+    table = hooks.table()
+    swapped = [opcode for opcode in range(256) if table[opcode] is not HANDLERS[opcode]]
+    assert swapped == [EQ.opcode, MSTORE.opcode]
+
+    # the table is cached until the subscriptions change
+    assert hooks.table() is table
+    hooks.on(0x01, posthook=lambda context, instruction: None)
+    assert hooks.table() is not table
+
+
+def test_hooks_fire_on_subscribed_opcodes_only():
+    seen = []
+    hooks = Hooks()
+    hooks.on(
+        MSTORE, prehook=lambda context, instruction: seen.append(("pre", instruction.name, context.stack.peek(0)))
+    )
+    hooks.on(EQ, posthook=lambda context, instruction: seen.append(("post", instruction.name, context.stack.peek(0))))
+
+    context = run(CODE, hooks=hooks)
+    assert context.success
+    assert seen == [("pre", "MSTORE", 0), ("post", "EQ", 0)]
+
+
+def test_hooks_can_modify_the_stack():
+    def hijack(context, instruction):
+        offset = context.stack.pop()
+        context.stack.pop()
+        context.stack.push(0xDEADBEEF)
+        context.stack.push(offset)
+
+    context = run(CODE, hooks=Hooks().on(MSTORE, prehook=hijack))
+    assert int.from_bytes(context.returndata, "big") == 0xDEADBEEF
+
+
+def test_pc_filters():
+    pushes = []
+    hooks = Hooks().on("PUSH1", prehook=lambda context, instruction: pushes.append(instruction), pcs={2, 5})
+    run(CODE, hooks=hooks)
+    assert pushes == [PUSH(0), PUSH(1)]
+
+    pcs = []
+    hooks = Hooks().on(pcs=[0, 4], prehook=lambda context, instruction: pcs.append((context.pc, instruction.name)))
+    run(CODE, hooks=hooks)
+    assert pcs == [(2, "PUSH1"), (5, "MSTORE")]
+
+
+def test_instruction_at():
+    assert instruction_at(CODE, 0) == PUSH(0x42)
+    assert instruction_at(CODE, 4) == REGISTRY["MSTORE"]
+    assert instruction_at(CODE, len(CODE)) == REGISTRY["STOP"]
+    assert instruction_at(bytes([0x61, 0x01]), 0).operands[0].value == 0x0100
+
+
+def test_invalid_combinations():
+    with pytest.raises(ValueError):
+        Hooks().on(prehook=lambda context, instruction: None)
+
+    with pytest.raises(ValueError):
+        run(CODE, hooks=Hooks(), prehook=lambda context, instruction: None)
+
+
+def test_event_sink_batches():
+    steps = []
+    batches = []
+
+    def consume(buffer, count):
+        batches.append(count)
+        steps.extend(unpack_records(buffer, count))
+
+    sink = EventSink(consume, batch_size=4)
+    context = run(CODE, sink=sink)
+    assert context.success
+
+    assert batches == [4, 4, 1]
+    assert [(pc, opcode) for pc, opcode, _ in steps] == [
+        (0, 0x60),
+        (2, 0x60),
+        (4, MSTORE.opcode),
+        (5, 0x60),
+        (7, 0x60),
+        (9, EQ.opcode),
+        (10, 0x60),
+        (12, 0x60),
+        (14, RETURN.opcode),
+    ]
+
+
+def test_event_sink_records_depth_and_failing_steps():
+    callee = assemble([PUSH(0), POP, INVALID], print_bin=False)
+    code = assemble([PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0xBB), GAS, CALL], print_bin=False)
+    world_state = WorldState({0xBB: AccountState(code=callee)})
+
+    records = []
+    run(code, world_state=world_state, sink=EventSink(lambda b, n: records.extend(unpack_records(b, n))))
+
+    assert [(opcode, depth) for _, opcode, depth in records[-5:]] == [
+        (CALL.opcode, 0),
+        (0x60, 1),
+        (POP.opcode, 1),
+        (INVALID.opcode, 1),
+        (0x00, 0),
+    ]
+
+
+def test_event_sink_with_hooks():
+    seen = []
+    records = []
+    hooks = Hooks().on(EQ, posthook=lambda context, instruction: seen.append(context.stack.peek(0)))
+    run(CODE, hooks=hooks, sink=EventSink(lambda b, n: records.extend(unpack_records(b, n))))
+    assert seen == [0]
+    assert len(records) == 9
@@ -0,0 +1,123 @@
+import random
+
+from smol_evm.lockstep import LaneResult, run_lanes
+from smol_evm.opcodes import *
+from smol_evm.runner import EXECUTION_ERRORS, ExecutionLimitReached, run
+
+import pytest
+
+
+def scalar(code, calldata, max_steps=0):
+    """what run_lanes should report for one lane"""
+    try:
+        context = run(code, calldata=calldata, max_steps=max_steps)
+    except ExecutionLimitReached:
+        return LaneResult(error="ExecutionLimitReached")
+    except EXECUTION_ERRORS as e:
+        return LaneResult(error=f"{type(e).__name__}: {e}")
+    return LaneResult(context.success, context.returndata, context.reason)
+
+
+def assert_same(code, calldatas, max_steps=0):
+    result = run_lanes(code, calldatas, max_steps=max_steps)
+    assert result.lanes == [scalar(code, calldata, max_steps) for calldata in calldatas]
+    return result
+
+
+def word(value):
+    return value.to_bytes(32, "big")
+
+
+# sums 1..calldata[0] in a loop, stores it at memory[calldata[1]], returns keccak(memory[0:64]) and the sum, reverts
+# with the sum if calldata[2] is set
+LOOP = assemble(
+    sum(
+        [
+            [PUSH(0), PUSH(0), CALLDATALOAD],  # [sum, n]
+            [JUMPDEST, DUP1, ISZERO, PUSH(22), JUMPI],  # pc 5, exit if n == 0
+            [SWAP1, DUP2, ADD, SWAP1, PUSH(1), SWAP1, SUB, PUSH(5), JUMP],  # sum += n, n -= 1
+            [JUMPDEST, POP, PUSH(0x20), CALLDATALOAD, MSTORE],  # pc 22
+            [PUSH(0x40), CALLDATALOAD, PUSH(46), JUMPI],
+            [PUSH(0x40), PUSH(0), SHA3, PUSH(0x40), MSTORE, MSIZE, PUSH(0), RETURN],
+            [JUMPDEST, PUSH(0x20), PUSH(0x20), CALLDATALOAD, REVERT],  # pc 46
+        ],
+        [],
+    ),
+    print_bin=False,
+)
+
+
+def test_uniform_lanes_dont_split():
+    calldatas = [word(10) + word(0)] * 8
+    result = assert_same(LOOP, calldatas)
+    assert result.splits == 0 and result.fallbacks == 0
+    assert result.dispatch_ratio == 8
+
+
+def test_divergent_lanes():
+    rng = random.Random(1)
+    calldatas = [word(rng.randrange(8)) + word(rng.choice((0, 32, 64))) + word(rng.randrange(2)) for _ in range(50)]
+    result = assert_same(LOOP, calldatas)
+    assert result.splits > 0
+    assert result.dispatch_ratio > 1
+
+
+def test_arithmetic_matches_the_reference():
+    rng = random.Random(2)
+    values = [0, 1, 2, 31, 32, 255, 2**255, 2**256 - 1]
+    names = ["ADD", "MUL", "SUB", "DIV", "SDIV", "MOD", "SMOD", "LT", "GT", "SLT", "SGT", "EQ"]
+    names += ["AND", "OR", "XOR", "BYTE", "SHL", "SHR", "SAR"]
+
+    for name in names:
+        # f(calldata[0], uniform constant) and f(constant, calldata[0])
+        code = assemble(
+            [PUSH(7), PUSH(0), CALLDATALOAD, REGISTRY[name], PUSH(0), MSTORE]
+            + [PUSH(0), CALLDATALOAD, PUSH(9), REGISTRY[name], PUSH(0x20), MSTORE]
+            + [PUSH(0x40), PUSH(0), RETURN],
+            print_bin=False,
+        )
+        assert_same(code, [word(rng.choice(values)) for _ in range(10)])
+
+    # small operands only: the reference EXP(9, 2**255) would never finish, and SIGNEXTEND(2**255, x) overflows
+    for name in ("EXP", "SIGNEXTEND"):
+        code = assemble(
+            [PUSH(0), CALLDATALOAD, PUSH(0xF0), REGISTRY[name], PUSH(0), MSTORE, PUSH(0x20), PUSH(0), RETURN],
+            print_bin=False,
+        )
+        assert_same(code, [word(rng.randrange(40)) for _ in range(10)])
+
+    code = assemble(
+        [PUSH(3), PUSH(0), CALLDATALOAD, PUSH(5), MULMOD, PUSH(7), SWAP1, PUSH(0), CALLDATALOAD, ADDMOD]
+        + [NOT, ISZERO, PUSH(0), MSTORE, PUSH(0x20), PUSH(0), RETURN],
+        print_bin=False,
+    )
+    assert_same(code, [word(rng.choice(values)) for _ in range(10)])
+
+
+def test_per_lane_jump_targets_and_invalid_jumps():
+    code = assemble([PUSH(0), CALLDATALOAD, JUMP, JUMPDEST, PUSH(1), STOP, JUMPDEST, INVALID], print_bin=False)
+    result = assert_same(code, [word(4), word(8), word(5), word(4)])
+    assert [lane.success for lane in result.lanes] == [True, False, False, True]
+
+
+def test_fallback_to_the_scalar_interpreter():
+    # SSTORE and SLOAD are not executed in lockstep, the lanes finish in the threaded loop
+    code = assemble(
+        [PUSH(0), CALLDATALOAD, PUSH(1), SSTORE, PUSH(1), SLOAD, PUSH(0), MSTORE, PUSH(0x20), PUSH(0), RETURN],
+        print_bin=False,
+    )
+    result = assert_same(code, [word(i) for i in range(5)])
+    assert result.fallbacks == 1
+    assert result.scalar_steps == 5 * 8
+
+
+def test_errors_and_step_limits():
+    assert_same(assemble([PUSH(1), ADD], print_bin=False), [b"", b"\x01"])
+    assert_same(LOOP, [word(1), word(100)], max_steps=60)
+
+    code = assemble([PUSH(0), CALLDATALOAD, PUSH(1), SSTORE, PUSH(0), JUMP], print_bin=False)
+    assert_same(code, [b"", word(1)], max_steps=5)
+
+
+def test_no_lanes():
+    assert run_lanes(LOOP, []).lanes == []
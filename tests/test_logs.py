@@ -0,0 +1,241 @@
+import asyncio
+import json
+
+import pytest
+from eth_utils import keccak, to_checksum_address
+
+from smol_evm.context import WorldState
+from smol_evm.logs import EventDecoder, LogFetcher, RpcClient, fetch_logs, is_range_error
+from smol_evm.rpc import RpcError, RpcServer
+
+TOKEN = "0x00000000000000000000000000000000000000aa"
+ALICE = "0x000000000000000000000000000000000000a11c"
+TRANSFER = f"0x{keccak(text='Transfer(address,address,uint256)').hex()}"
+
+ABI = [
+    {
+        "type": "event",
+        "name": "Transfer",
+        "anonymous": False,
+        "inputs": [
+            {"name": "from", "type": "address", "indexed": True},
+            {"name": "to", "type": "address", "indexed": True},
+            {"name": "value", "type": "uint256", "indexed": False},
+        ],
+    },
+    {"type": "function", "name": "transfer", "inputs": []},
+]
+
+
+def word(value: int) -> str:
+    return f"{value % 2**256:064x}"
+
+
+def transfer_log(block: int, index: int) -> dict:
+    return {
+        "address": TOKEN,
+        "blockNumber": hex(block),
+        "transactionHash": f"0x{block:064x}",
+        "logIndex": hex(index),
+        "topics": [TRANSFER, "0x" + word(int(ALICE, 16)), "0x" + word(block)],
+        "data": "0x" + word(block * 10 + index),
+    }
+
+
+class LogsServer(RpcServer):
+    """a stand-in node with a transfer log in every block divisible by 10, two in every block divisible by 100"""
+
+    METHODS = RpcServer.METHODS + ("eth_blockNumber", "eth_getLogs")
+
+    def __init__(self, latest=10_000, max_results=20, fail_at=None):
+        super().__init__(WorldState(), processes=0)
+        self.latest = latest
+        self.max_results = max_results
+        self.fail_at = fail_at
+        self.ranges = []
+
+    async def eth_blockNumber(self):
+        return hex(self.latest)
+
+    async def eth_getLogs(self, log_filter):
+        start, end = int(log_filter["fromBlock"], 16), int(log_filter["toBlock"], 16)
+        if self.fail_at is not None and start <= self.fail_at <= end:
+            raise RpcError(-32000, "internal error")
+
+        logs = [
+            transfer_log(block, index)
+            for block in range(start - start % 10, end + 1, 10)
+            if block >= start
+            for index in range(2 if block % 100 == 0 else 1)
+        ]
+        if len(logs) > self.max_results:
+            raise RpcError(-32005, f"query returned more than {self.max_results} results")
+
+        self.ranges.append((start, end))
+        return logs
+
+
+def run_with_server(server, fetch):
+    async def main():
+        async with await server.start("127.0.0.1", 0) as s:
+            return await fetch(f"http://127.0.0.1:{s.sockets[0].getsockname()[1]}")
+
+    return asyncio.run(main())
+
+
+def expected_logs(start, end):
+    return [
+        {
+            "event": "Transfer",
+            "address": TOKEN,
+            "blockNumber": block,
+            "transactionHash": f"0x{block:064x}",
+            "logIndex": index,
+            "args": {
+                "from": to_checksum_address(ALICE),
+                "to": to_checksum_address(f"0x{block:040x}"),
+                "value": block * 10 + index,
+            },
+        }
+        for block in range(start - start % 10, end + 1, 10)
+        if block >= start
+        for index in range(2 if block % 100 == 0 else 1)
+    ]
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_decode():
+    decoder = EventDecoder(ABI)
+    assert decoder.topics == [TRANSFER]
+    decoded = decoder.decode(transfer_log(0x10, 1))
+    assert decoded["args"] == {
+        "from": to_checksum_address(ALICE),
+        "to": to_checksum_address(f"0x{0x10:040x}"),
+        "value": 161,
+    }
+    assert decoded["blockNumber"] == 16 and decoded["logIndex"] == 1
+
+    assert decoder.decode({**transfer_log(1, 0), "topics": ["0x" + "00" * 32]}) is None
+
+    with pytest.raises(ValueError):
+        EventDecoder(ABI, ["Approval"])
+
+
+def test_decode_dynamic_values():
+    abi = [
+        {
+            "type": "event",
+            "name": "Things",
+            "inputs": [
+                {"name": "name", "type": "string", "indexed": True},
+                {"name": "delta", "type": "int8", "indexed": False},
+                {"name": "tags", "type": "bytes2[]", "indexed": False},
+                {
+                    "name": "pair",
+                    "type": "tuple",
+                    "indexed": False,
+                    "components": [{"name": "ok", "type": "bool"}, {"name": "note", "type": "string"}],
+                },
+            ],
+        }
+    ]
+    decoder = EventDecoder(abi)
+    assert decoder.topics == [f"0x{keccak(text='Things(string,int8,bytes2[],(bool,string))').hex()}"]
+
+    name_hash = f"0x{keccak(text='smol').hex()}"
+    data = (
+        word(-3)
+        + word(0x60)  # tags
+        + word(0xC0)  # pair
+        + word(2)
+        + "beef"
+        + "00" * 30
+        + "cafe"
+        + "00" * 30
+        + word(1)
+        + word(0x40)
+        + word(5)
+        + b"hello".hex()
+        + "00" * 27
+    )
+    log = {"blockNumber": "0x1", "topics": [decoder.topics[0], name_hash], "data": "0x" + data}
+    assert decoder.decode(log)["args"] == {
+        "name": name_hash,
+        "delta": -3,
+        "tags": ["0xbeef", "0xcafe"],
+        "pair": {"ok": True, "note": "hello"},
+    }
+
+
+def test_range_errors():
+    assert is_range_error(RpcError(-32005, "query returned more than 10000 results"))
+    assert is_range_error(RpcError(-32602, "Log response size exceeded"))
+    assert is_range_error(asyncio.TimeoutError())
+    assert not is_range_error(RpcError(-32000, "internal error"))
+
+
+def test_ranges_split_and_grow():
+    server = LogsServer(latest=5000, max_results=20)
+
+    async def fetch(url):
+        fetcher = LogFetcher(RpcClient(url), TOKEN, EventDecoder(ABI), 0, 5000, range_size=1000, sparse_logs=10)
+        written = []
+        stats = await fetcher.fetch(lambda records: written.extend(records) or len(written))
+        return stats, written
+
+    stats, written = run_with_server(server, fetch)
+    assert written == expected_logs(0, 5000)
+    assert stats.blocks == 5001 and stats.logs == len(written)
+    assert stats.splits > 0
+
+    # the completed ranges cover the blocks exactly once, and are at most 20 results
+    assert sorted(block for start, end in server.ranges for block in range(start, end + 1)) == list(range(5001))
+    sizes = [end - start + 1 for start, end in server.ranges]
+    assert max(sizes) < 200
+
+
+def test_sparse_ranges_grow():
+    server = LogsServer(latest=20_000, max_results=10_000)
+
+    async def fetch(url):
+        fetcher = LogFetcher(RpcClient(url), TOKEN, EventDecoder(ABI), 0, 20_000, concurrency=1, range_size=100)
+        return await fetcher.fetch(lambda records: 0)
+
+    stats = run_with_server(server, fetch)
+    assert [end - start + 1 for start, end in server.ranges][:4] == [100, 200, 400, 800]
+    assert stats.ranges < 10 and stats.splits == 0
+
+
+def test_fetch_resumes_from_checkpoint(tmpdir):
+    output, checkpoint = str(tmpdir.join("logs.jsonl")), str(tmpdir.join("checkpoint.json"))
+
+    def fetch(**kwargs):
+        return lambda url: fetch_logs(
+            url, TOKEN, ABI, output, 0, checkpoint=checkpoint, range_size=100, retries=1, retry_delay=0, **kwargs
+        )
+
+    # the range with block 3456 keeps failing, the logs before it are written and checkpointed
+    with pytest.raises(RpcError):
+        run_with_server(LogsServer(latest=6000, max_results=1000, fail_at=3456), fetch())
+
+    with open(checkpoint) as f:
+        state = json.load(f)
+    assert 0 < state["next_block"] <= 3456
+    assert read_jsonl(output) == expected_logs(0, state["next_block"] - 1)
+
+    # logs written after the checkpoint are discarded on resume
+    with open(output, "a") as f:
+        f.write('{"partial": ')
+
+    server = LogsServer(latest=6000, max_results=1000)
+    stats = run_with_server(server, fetch())
+    assert read_jsonl(output) == expected_logs(0, 6000)
+    assert min(start for start, end in server.ranges) == state["next_block"]
+    assert stats.blocks == 6001 - state["next_block"]
+
+    with open(checkpoint) as f:
+        assert json.load(f)["next_block"] == 6001
@@ -0,0 +1,110 @@
+import random
+
+from smol_evm.context import AccountState, Storage, WorldState
+from smol_evm.opcodes import *
+from smol_evm.parallel import Transaction, execute_block, execute_sequential
+from smol_evm.stack import StackUnderflow
+
+import pytest
+
+# increments the slot given as calldata
+COUNTER = assemble([PUSH(0), CALLDATALOAD, DUP1, SLOAD, PUSH(1), ADD, SWAP1, SSTORE], print_bin=False)
+
+# calls the counter given as calldata, then increments its own slot 0, and reverts everything if it was odd
+CALL_COUNTER = assemble(
+    [
+        PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0), CALLDATALOAD, GAS, CALL, POP,
+        PUSH(0), SLOAD, DUP1, PUSH(1), ADD, PUSH(0), SSTORE,
+        PUSH(1), AND, PUSH(0x21), JUMPI, STOP,
+        JUMPDEST, PUSH(0), PUSH(0), REVERT,
+    ],
+    print_bin=False,
+)  # fmt: skip
+
+
+def world(num_counters=4):
+    accounts = {0xC0 + i: AccountState(code=COUNTER) for i in range(num_counters)}
+    accounts[0xD0] = AccountState(code=CALL_COUNTER)
+    return WorldState(accounts)
+
+
+def slot(n):
+    return n.to_bytes(32, "big")
+
+
+def random_block(rng, size):
+    transactions = []
+    for _ in range(size):
+        if rng.random() < 0.2:
+            transactions.append(Transaction(to=0xD0, calldata=slot(0xC0)))
+        else:
+            transactions.append(Transaction(to=0xC0 + rng.randrange(4), calldata=slot(rng.randrange(3))))
+    return transactions
+
+
+def storage_of(world_state):
+    return {a: {k: v for k, v in acc.storage.data.items() if v} for a, acc in world_state.accounts.items()}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_sequential_execution(seed):
+    rng = random.Random(seed)
+    transactions = random_block(rng, 40)
+    expected, actual = world(), world()
+
+    execute_sequential(expected, transactions)
+    report = execute_block(actual, transactions, processes=1)
+
+    assert storage_of(actual) == storage_of(expected)
+    assert report.executions >= len(transactions)
+    assert all(r is not None for r in report.results)
+
+
+def test_independent_transactions_do_not_conflict():
+    transactions = [Transaction(to=0xC0, calldata=slot(i)) for i in range(10)]
+    report = execute_block(world(), transactions, processes=1)
+    assert report.rounds == 1
+    assert report.conflict_rate == 0
+
+
+def test_conflicting_transactions_are_reexecuted():
+    transactions = [Transaction(to=0xC0, calldata=slot(0))] * 5
+    world_state = world()
+    report = execute_block(world_state, transactions, processes=1)
+    assert world_state.get(0xC0).storage.get(0) == 5
+    assert report.reexecutions > 0
+
+
+def test_reverted_transactions_have_no_writes():
+    world_state = world()
+    world_state.get(0xD0).storage.put(0, 1)
+    report = execute_block(world_state, [Transaction(to=0xD0, calldata=slot(0xC0))], processes=1)
+    assert not report.results[0].success
+    assert report.results[0].writes == {}
+    assert world_state.get(0xC0).storage.get(0) == 0
+    assert world_state.get(0xD0).storage.get(0) == 1
+
+
+def test_worker_processes():
+    transactions = random_block(random.Random(42), 30)
+    world_state = world()
+    report = execute_block(world_state, transactions, processes=2, compare=True)
+    assert report.speedup is not None
+    assert "conflict rate" in str(report)
+
+
+def test_speculative_exceptions_are_reexecuted():
+    # without calldata: sstore(0, 1). with calldata: a bad jump if sload(0), otherwise ADD on an empty stack
+    code = bytes.fromhex("36600a576001600055005b600054601157015b00")
+    transactions = [Transaction(to=1), Transaction(to=1, calldata=b"\x01")]
+    contexts = execute_sequential(WorldState({1: AccountState(code=code)}), transactions)
+
+    world_state = WorldState({1: AccountState(code=code)})
+    report = execute_block(world_state, transactions, processes=1)
+    assert [result.success for result in report.results] == [bool(ctx.success) for ctx in contexts]
+    assert report.reexecutions == 1
+    assert world_state.get(1).storage.get(0) == 1
+
+    # the exception of a transaction that also halts sequentially is raised
+    with pytest.raises(StackUnderflow):
+        execute_block(WorldState({1: AccountState(code=code)}), transactions[1:], processes=1)
@@ -0,0 +1,98 @@
+from smol_evm.context import AccountState, Storage, WorldState
+from smol_evm.opcodes import *
+from smol_evm.replay import InvalidRecording, Recording, ReplayDivergence, record, replay
+from smol_evm.runner import ExecutionLimitReached
+
+import pytest
+
+CALLER_ADDRESS = 0xAA
+CALLEE_ADDRESS = 0xBB
+
+
+def call(address):
+    return [PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(address), GAS, CALL, POP]
+
+
+# returns slot[calldata[0]] + callee's slot 3, after incrementing slot 1
+CODE = assemble(
+    [PUSH(1), SLOAD, PUSH(1), ADD, PUSH(1), SSTORE, PUSH(1), SLOAD, POP]
+    + call(CALLEE_ADDRESS)
+    + call(0xCC)
+    + [PUSH(0), CALLDATALOAD, SLOAD, CALLER, ADD, PUSH(0), MSTORE, PUSH(0x20), PUSH(0), RETURN],
+    print_bin=False,
+)
+
+
+def world():
+    callee = assemble([PUSH(3), SLOAD, POP], print_bin=False)
+    return WorldState(
+        {
+            CALLER_ADDRESS: AccountState(code=CODE, storage=Storage({1: 10, 2: 20, 5: 50})),
+            CALLEE_ADDRESS: AccountState(code=callee, storage=Storage({3: 30})),
+        }
+    )
+
+
+def test_records_consumed_inputs():
+    world_state = world()
+    calldata = (2).to_bytes(32, "big")
+    context, recording = record(CODE, calldata, world_state, address=CALLER_ADDRESS, caller=7)
+
+    assert context.success
+    assert int.from_bytes(context.returndata, "big") == 27
+    assert recording.success and recording.returndata == context.returndata
+
+    # only the slots that were read before being written, with their original value
+    assert recording.slots == {(CALLER_ADDRESS, 1): 10, (CALLER_ADDRESS, 2): 20, (CALLEE_ADDRESS, 3): 30}
+    assert sorted(recording.accounts) == [CALLER_ADDRESS, CALLEE_ADDRESS, 0xCC]
+    assert recording.accounts[0xCC] is None
+
+    # writes go to the wrapped state
+    assert world_state.get(CALLER_ADDRESS).storage.get(1) == 11
+
+
+def test_replay_without_world_state(tmp_path):
+    calldata = (2).to_bytes(32, "big")
+    _, recording = record(CODE, calldata, world(), address=CALLER_ADDRESS, caller=7)
+
+    path = str(tmp_path / "case.rec")
+    recording.save(path)
+    loaded = Recording.load(path)
+    assert loaded == recording
+
+    for threaded in (False, True):
+        context = replay(loaded, threaded=threaded)
+        assert context.success
+        assert context.returndata == recording.returndata
+
+
+def test_replay_divergence():
+    _, recording = record(CODE, (2).to_bytes(32, "big"), world(), address=CALLER_ADDRESS, caller=7)
+
+    # reading slot 5 instead of slot 2 is an input the recording doesn't have
+    recording.calldata = (5).to_bytes(32, "big")
+    with pytest.raises(ReplayDivergence):
+        replay(recording)
+
+
+def test_record_errors():
+    context, recording = record(assemble([PUSH(1), ADD], print_bin=False))
+    assert context is None
+    assert recording.error.startswith("StackUnderflow")
+
+    loaded = Recording.from_bytes(recording.to_bytes())
+    assert loaded.error == recording.error and loaded.success is None
+
+    with pytest.raises(InvalidRecording):
+        Recording.from_bytes(b"garbage")
+
+
+def test_replay_keeps_the_step_limit():
+    loop = assemble([JUMPDEST, PUSH(0), JUMP], print_bin=False)
+    context, recording = record(loop, max_steps=100)
+    assert context is None and recording.error == "ExecutionLimitReached"
+
+    loaded = Recording.from_bytes(recording.to_bytes())
+    assert loaded.max_steps == 100
+    with pytest.raises(ExecutionLimitReached):
+        replay(loaded)
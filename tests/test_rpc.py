@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+from smol_evm.context import AccountState, Storage, WorldState
+from smol_evm.opcodes import *
+from smol_evm.rpc import RpcError, RpcServer, execute_call
+
+import pytest
+
+CONTRACT = 0xC0
+
+# returns calldata[0:32] + storage[0], then overwrites storage[0] (which eth_call must not persist)
+CODE = assemble(
+    [PUSH(0), CALLDATALOAD, PUSH(0), SLOAD, ADD, PUSH(0), MSTORE, PUSH(7), PUSH(0), SSTORE, PUSH(32), PUSH(0), RETURN],
+    print_bin=False,
+)
+REVERTS = assemble([PUSH(0x42), PUSH(0), MSTORE8, PUSH(1), PUSH(0), REVERT], print_bin=False)
+
+# writes to storage, then halts with a stack underflow
+HALTS = assemble([PUSH(1), PUSH(0), SSTORE, ADD], print_bin=False)
+
+
+def world():
+    return WorldState(
+        {
+            CONTRACT: AccountState(code=CODE, storage=Storage({0: 100})),
+            0xD0: AccountState(code=REVERTS),
+            0xE0: AccountState(code=HALTS),
+        }
+    )
+
+
+def request(method, *params, id=1):
+    return {"jsonrpc": "2.0", "id": id, "method": method, "params": list(params)}
+
+
+def call(to, data=""):
+    return {"to": hex(to), "data": data}
+
+
+async def http_post(port, body):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode()
+    writer.write(f"POST / HTTP/1.1\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+def test_eth_call():
+    server = RpcServer(world(), processes=0)
+    response = asyncio.run(
+        server.handle_request(request("eth_call", call(CONTRACT, "0x" + "00" * 31 + "01"), "latest"))
+    )
+    assert response["result"] == f"0x{101:064x}"
+
+    # the state is not modified
+    assert world().get(CONTRACT).storage.get(0) == 100
+    assert server.world_state.get(CONTRACT).storage.get(0) == 100
+
+
+def test_revert():
+    server = RpcServer(world(), processes=0)
+    response = asyncio.run(server.handle_request(request("eth_call", call(0xD0))))
+    assert response["error"] == {"code": 3, "message": "execution reverted", "data": "0x42"}
+
+
+def test_state_queries():
+    server = RpcServer(world(), processes=0)
+    code = asyncio.run(server.handle_request(request("eth_getCode", hex(CONTRACT), "latest")))
+    assert code["result"] == "0x" + CODE.hex()
+
+    slot = asyncio.run(server.handle_request(request("eth_getStorageAt", hex(CONTRACT), "0x0", "latest")))
+    assert slot["result"] == f"0x{100:064x}"
+
+    missing = asyncio.run(server.handle_request(request("eth_getCode", "0x1234")))
+    assert missing["result"] == "0x"
+
+
+def test_estimate_gas():
+    server = RpcServer(world(), processes=0)
+    response = asyncio.run(server.handle_request(request("eth_estimateGas", call(CONTRACT))))
+    assert int(response["result"], 16) > 21000 + 2100 + 20000
+
+
+def test_errors():
+    server = RpcServer(world(), processes=0)
+    assert asyncio.run(server.handle_request(request("eth_foo")))["error"]["code"] == -32601
+    assert asyncio.run(server.handle_request(request("eth_call", {"data": "0x"})))["error"]["code"] == -32602
+    assert asyncio.run(server.handle_request(request("eth_getCode")))["error"]["code"] == -32602
+    assert asyncio.run(server.handle_payload(b"{"))["error"]["code"] == -32700
+
+
+def test_batch_over_http_with_worker_processes():
+    server = RpcServer(world(), processes=1)
+
+    async def main():
+        s = await server.start(port=0)
+        port = s.sockets[0].getsockname()[1]
+        async with s:
+            batch = [request("eth_call", call(CONTRACT), id=i) for i in range(5)] + [request("eth_chainId", id=99)]
+            batch.append(request("eth_call", call(0xE0), id=50))
+            responses = await http_post(port, batch)
+            metrics = await http_post(port, request("smol_metrics"))
+        return responses, metrics
+
+    try:
+        responses, metrics = asyncio.run(main())
+    finally:
+        server.close()
+
+    assert sorted(r["id"] for r in responses) == [0, 1, 2, 3, 4, 50, 99]
+    assert all(r["result"] == f"0x{100:064x}" for r in responses if r["id"] < 50)
+
+    # errors raised in the workers reach the client
+    assert next(r for r in responses if r["id"] == 50)["error"]["code"] == 3
+    assert metrics["result"]["eth_call"]["count"] == 6
+    assert metrics["result"]["eth_call"]["errors"] == 1
+
+
+def test_execute_call_rejects_bad_params():
+    with pytest.raises(Exception):
+        execute_call(world(), {"to": "not hex"})
+
+
+def test_exceptional_halts():
+    server = RpcServer(world(), processes=0)
+    batch = [request("eth_call", call(0xE0), id=1), request("eth_call", call(CONTRACT), id=2)]
+    halted, returned = asyncio.run(server.handle_payload(json.dumps(batch).encode()))
+    assert halted["error"] == {"code": 3, "message": "execution halted: StackUnderflow"}
+    assert returned["result"] == f"0x{100:064x}"
+
+    # the write made before the halt is rolled back
+    response = asyncio.run(server.handle_request(request("eth_getStorageAt", hex(0xE0), "0x0")))
+    assert response["result"] == f"0x{0:064x}"
+
+    # loops are bounded
+    server = RpcServer(world(), processes=0, max_steps=2)
+    assert asyncio.run(server.handle_request(request("eth_call", call(CONTRACT))))["error"]["code"] == 3
+
+
+def test_internal_errors_are_not_invalid_params():
+    class BuggyServer(RpcServer):
+        METHODS = RpcServer.METHODS + ("smol_buggy",)
+
+        async def smol_buggy(self, value):
+            return value + 1
+
+    server = BuggyServer(world(), processes=0)
+    assert asyncio.run(server.handle_request(request("smol_buggy", "0x1")))["error"]["code"] == -32603
+    assert asyncio.run(server.handle_request(request("smol_buggy")))["error"]["code"] == -32602
+    assert asyncio.run(server.handle_request(request("smol_buggy", 1)))["result"] == 2
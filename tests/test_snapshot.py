@@ -0,0 +1,76 @@
+from smol_evm.context import AccountState, Storage, WorldState
+from smol_evm.opcodes import *
+from smol_evm.runner import run
+from smol_evm.snapshot import InvalidSnapshot, SnapshotBackend, open_snapshot, write_snapshot
+
+import pytest
+
+CLONE_CODE = assemble([PUSH(0), SLOAD, PUSH(1), ADD, PUSH(0), SSTORE], print_bin=False)
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    world_state = WorldState(
+        {
+            address: AccountState(
+                nonce=address,
+                balance=2**160 + address,
+                code=CLONE_CODE if address % 2 else bytes(),
+                storage=Storage({slot: slot * address for slot in range(1, 20)}),
+            )
+            for address in range(1, 50)
+        }
+    )
+    path = str(tmp_path / "state.snap")
+    write_snapshot(path, world_state.accounts.items())
+    return path
+
+
+def test_round_trip(snapshot_path):
+    world_state = open_snapshot(snapshot_path)
+    for address in range(1, 50):
+        account = world_state.get(address)
+        assert account.nonce == address
+        assert account.balance == 2**160 + address
+        assert account.code == (CLONE_CODE if address % 2 else b"")
+        assert [account.storage.get(slot) for slot in range(25)] == [
+            slot * address if 0 < slot < 20 else 0 for slot in range(25)
+        ]
+
+    assert world_state.find(50) is None
+    assert world_state.find(0) is None
+
+
+def test_code_is_deduplicated(snapshot_path):
+    backend = SnapshotBackend(snapshot_path)
+    assert backend.num_codes == 1
+    backend.close()
+
+
+def test_accounts_are_materialized_lazily(snapshot_path):
+    world_state = open_snapshot(snapshot_path)
+    assert len(world_state.accounts) == 0
+
+    world_state.get(7).storage.get(3)
+    assert list(world_state.accounts) == [7]
+    assert len(world_state.slot_cache) == 1
+
+
+def test_execute_against_snapshot(snapshot_path):
+    world_state = open_snapshot(snapshot_path)
+    run(CLONE_CODE, world_state=world_state, address=3)
+    assert world_state.get(3).storage.get(0) == 1
+
+    with pytest.raises(NotImplementedError):
+        world_state.commit()
+
+
+def test_invalid_files(tmp_path):
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    garbage = tmp_path / "garbage"
+    garbage.write_bytes(b"x" * 100)
+
+    for path in (empty, garbage):
+        with pytest.raises(InvalidSnapshot):
+            SnapshotBackend(str(path))
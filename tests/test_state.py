@@ -0,0 +1,116 @@
+from smol_evm.context import AccountState, Storage
+from smol_evm.opcodes import *
+from smol_evm.runner import run
+from smol_evm.state import LRUCache, MemoryBackend, PersistentWorldState, SqliteBackend
+
+import pytest
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SqliteBackend(str(tmp_path / "state.db"))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.get(1)
+    cache.put(3, "c")
+    assert 1 in cache and 3 in cache and 2 not in cache
+
+
+def test_unknown_account(backend):
+    world_state = PersistentWorldState(backend)
+    assert world_state.find(0xAA) is None
+    with pytest.raises(KeyError):
+        world_state.get(0xAA)
+
+
+def test_commit_round_trip(backend):
+    world_state = PersistentWorldState(backend)
+    world_state.set(0xAA, AccountState(nonce=1, balance=2**200, code=b"\x60\x00", storage=Storage({1: 2})))
+    world_state.get(0xAA).storage.put(2**255, 3)
+    world_state.commit()
+
+    reloaded = PersistentWorldState(backend)
+    account = reloaded.get(0xAA)
+    assert (account.nonce, account.balance, account.code) == (1, 2**200, b"\x60\x00")
+    assert account.storage.get(1) == 2
+    assert account.storage.get(2**255) == 3
+    assert account.storage.get(4) == 0
+
+
+def test_writes_are_buffered_until_commit(backend):
+    world_state = PersistentWorldState(backend)
+    world_state.set(0xAA, AccountState())
+    assert backend.load_account(0xAA) is None
+
+    world_state.commit()
+    world_state.get(0xAA).storage.put(1, 42)
+    assert backend.load_slot(0xAA, 1) == 0
+    assert world_state.get(0xAA).storage.get(1) == 42
+
+    world_state.commit()
+    assert backend.load_slot(0xAA, 1) == 42
+    assert not world_state.is_dirty()
+
+
+def test_clearing_a_slot(backend):
+    world_state = PersistentWorldState(backend)
+    world_state.set(0xAA, AccountState(storage=Storage({1: 2})))
+    world_state.commit()
+
+    world_state.get(0xAA).storage.put(1, 0)
+    world_state.commit()
+    assert PersistentWorldState(backend).get(0xAA).storage.get(1) == 0
+
+
+def test_dirty_entries_are_not_evicted(backend):
+    world_state = PersistentWorldState(backend, account_cache_size=2, slot_cache_size=2)
+    for address in range(10):
+        world_state.set(address, AccountState(nonce=address))
+        world_state.get(address).storage.put(0, address + 1)
+
+    world_state.commit()
+    assert len(world_state.account_cache) == 2
+    assert len(world_state.slot_cache) == 2
+
+    # evicted entries are reloaded from the backend
+    assert all(world_state.get(a).nonce == a and world_state.get(a).storage.get(0) == a + 1 for a in range(10))
+
+
+def test_storage_data_tracks_the_cached_slots(backend):
+    world_state = PersistentWorldState(backend, slot_cache_size=3)
+    world_state.set(0xAA, AccountState(storage=Storage({slot: slot + 1 for slot in range(5)})))
+    world_state.set(0xBB, AccountState(storage=Storage({0: 7})))
+    world_state.commit()
+
+    def scanned(address):
+        slots = {slot: value for (a, slot), value in world_state.slot_cache.data.items() if a == address}
+        slots.update({slot: value for (a, slot), value in world_state.dirty_slots.items() if a == address})
+        return slots
+
+    # only 3 of the committed slots are still cached
+    assert scanned(0xAA) == world_state.get(0xAA).storage.data == {3: 4, 4: 5}
+    assert world_state.get(0xBB).storage.data == {0: 7}
+
+    world_state.get(0xAA).storage.put(9, 10)
+    for slot in range(5):
+        world_state.get(0xAA).storage.get(slot)
+    assert world_state.get(0xAA).storage.data == scanned(0xAA) == {2: 3, 3: 4, 4: 5, 9: 10}
+    assert world_state.get(0xBB).storage.data == scanned(0xBB) == {}
+
+
+def test_run_against_persistent_state(backend):
+    code = assemble([PUSH(0), SLOAD, PUSH(1), ADD, PUSH(0), SSTORE], print_bin=False)
+    world_state = PersistentWorldState(backend)
+    world_state.set(0xAA, AccountState(code=code))
+
+    for _ in range(3):
+        run(code, world_state=world_state, address=0xAA)
+        world_state.commit()
+
+    assert PersistentWorldState(backend).get(0xAA).storage.get(0) == 3
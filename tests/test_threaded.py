@@ -0,0 +1,153 @@
+import random
+
+from smol_evm.context import ExecutionContext
+from smol_evm.opcodes import *
+from smol_evm.runner import run, ExecutionLimitReached
+from smol_evm.stack import StackOverflow, StackUnderflow
+from smol_evm.threaded import HANDLERS
+
+import pytest
+
+# instructions whose operands are memory offsets or sizes, or exponents: huge values would take forever
+BOUNDED_OPERANDS = ("EXP", "SIGNEXTEND", "SHA3", "MLOAD", "MSTORE", "MSTORE8", "RETURN", "REVERT")
+BOUNDED_OPERANDS += tuple(i.name for i in REGISTRY if "COPY" in i.name)
+
+# covered separately: SLOAD/SSTORE here, message calls in test_calls.py
+STATEFUL = ("SLOAD", "SSTORE", "CALL", "DELEGATECALL", "STATICCALL")
+
+NON_PUSH = [i for i in REGISTRY if not i.is_push() and i.name not in STATEFUL]
+UNBOUNDED = [i for i in NON_PUSH if i.name not in BOUNDED_OPERANDS]
+BOUNDED = [i for i in NON_PUSH if i.name in BOUNDED_OPERANDS]
+
+INTERESTING_VALUES = [0, 1, 2, 31, 32, 255, 256, 2**255, 2**255 + 1, MAX_UINT256 - 1, MAX_UINT256]
+SMALL_VALUES = [0, 1, 2, 3, 31, 32, 33, 64, 255]
+
+
+def noop_hook(context, instruction):
+    pass
+
+
+def outcome(code, calldata=b"", max_steps=1000):
+    """runs the code through the threaded loop and through the reference implementation"""
+    results = []
+    for threaded, prehook in ((True, None), (False, noop_hook)):
+        try:
+            ctx = run(code, calldata=calldata, max_steps=max_steps, prehook=prehook, threaded=threaded)
+            results.append((ctx.success, ctx.reason, ctx.pc, ctx.stack.stack, ctx.memory.memory, ctx.returndata))
+        except ExecutionLimitReached as e:
+            results.append(("limit", e.context.pc, e.context.stack.stack))
+        except Exception as e:
+            results.append(type(e))
+    return results
+
+
+def random_program(rng: random.Random, length: int) -> bytes:
+    program = []
+    for _ in range(length):
+        p = rng.random()
+        if p < 0.4:
+            program.append(PUSH(rng.randrange(256)))
+        elif p < 0.5:
+            # push small operands right before, NOT/SUB/etc. can make anything left on the stack huge
+            insn = rng.choice(BOUNDED)
+            program += [PUSH(rng.choice(SMALL_VALUES)) for _ in range(4)] + [insn]
+        else:
+            program.append(rng.choice(UNBOUNDED))
+    return assemble(program, print_bin=False)
+
+
+def execute_handler(ctx: ExecutionContext, instruction: Instruction) -> None:
+    ctx.pc = HANDLERS[instruction.opcode](ctx, ctx.stack.stack, ctx.pc)
+
+
+def compare_with_reference(instruction: Instruction, values) -> None:
+    results = []
+    for execute in (instruction.execute, lambda ctx: execute_handler(ctx, instruction)):
+        ctx = ExecutionContext(code=bytes(64), pc=1)
+        for v in values:
+            ctx.stack.push(v)
+
+        try:
+            execute(ctx)
+            results.append((ctx.stack.stack, ctx.memory.memory, ctx.pc, ctx.success))
+        except Exception as e:
+            results.append(type(e))
+
+    assert results[0] == results[1]
+
+
+def test_table_covers_all_opcodes():
+    assert len(HANDLERS) == 256
+    assert all(callable(h) for h in HANDLERS)
+
+
+@pytest.mark.parametrize("instruction", UNBOUNDED, ids=str)
+def test_handler_matches_reference(instruction):
+    rng = random.Random(instruction.opcode)
+    for num_values in (0, 1, 17):
+        for _ in range(10):
+            compare_with_reference(instruction, [rng.choice(INTERESTING_VALUES) for _ in range(num_values)])
+
+
+@pytest.mark.parametrize("instruction", BOUNDED, ids=str)
+def test_handler_matches_reference_small_operands(instruction):
+    rng = random.Random(instruction.opcode)
+    for num_values in (0, 1, 4):
+        for _ in range(10):
+            compare_with_reference(instruction, [rng.choice(SMALL_VALUES) for _ in range(num_values)])
+
+
+def test_random_programs():
+    rng = random.Random(0x5EED)
+    for i in range(300):
+        code = random_program(rng, 1 + i % 40)
+        threaded, reference = outcome(code, calldata=bytes(range(40)))
+        assert threaded == reference, code.hex()
+
+
+def test_implicit_stop_counts_as_a_step():
+    code = assemble([PUSH(1), PUSH(2)], print_bin=False)
+    assert outcome(code, max_steps=2) == [("limit", 4, [1, 2])] * 2
+    assert outcome(code, max_steps=3)[0] == outcome(code, max_steps=3)[1]
+
+
+def test_sstore_sload():
+    code = assemble([PUSH(42), PUSH(7), SSTORE, PUSH(7), SLOAD], print_bin=False)
+    assert run(code, threaded=True).stack.stack == [42]
+
+
+def test_push_truncated():
+    code = assemble([PUSH(0x4243)], print_bin=False)[:-1]
+    ctx = run(code, threaded=True)
+    assert ctx.stack.stack == [0x4200]
+    assert outcome(code)[0] == outcome(code)[1]
+
+
+def test_underflow():
+    with pytest.raises(StackUnderflow):
+        run(assemble([PUSH(1), ADD], print_bin=False), threaded=True)
+
+
+def test_overflow():
+    with pytest.raises(StackOverflow):
+        run(assemble([PUSH(1)] * 1025, print_bin=False), threaded=True)
+
+
+def test_swap_underflow():
+    code = assemble([PUSH(1), SWAP1], print_bin=False)
+    assert outcome(code) == [StackUnderflow, StackUnderflow]
+
+
+def test_execution_limit():
+    code = assemble([JUMPDEST, PUSH(0), JUMP], print_bin=False)
+    with pytest.raises(ExecutionLimitReached):
+        run(code, max_steps=100, threaded=True)
+
+
+def test_unknown_opcode():
+    assert outcome(bytes([0x0C])) == [NotImplementedError, NotImplementedError]
+
+
+def test_threaded_rejects_hooks():
+    with pytest.raises(ValueError):
+        run(bytes(), prehook=noop_hook, threaded=True)
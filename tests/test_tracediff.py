@@ -0,0 +1,85 @@
+import gzip
+import io
+import json
+
+from smol_evm.context import AccountState, WorldState
+from smol_evm.opcodes import *
+from smol_evm.tracediff import diff_files, diff_traces, write_trace
+
+CODE = assemble(
+    [PUSH(0x42), PUSH(0), MSTORE, PUSH(1), PUSH(2), ADD, PUSH(3), EQ, PUSH(0x20), PUSH(0), RETURN], print_bin=False
+)
+
+
+def trace(code, **kwargs):
+    out = io.StringIO()
+    write_trace(out, code, **kwargs)
+    return out.getvalue().splitlines()
+
+
+def test_write_trace():
+    steps = [json.loads(line) for line in trace(CODE, memory=True)]
+    assert [(s["pc"], s["opName"]) for s in steps[:4]] == [(0, "PUSH1"), (2, "PUSH1"), (4, "MSTORE"), (5, "PUSH1")]
+    assert steps[2]["stack"] == ["0x42", "0x0"]
+    assert steps[3]["memSize"] == 32 and steps[3]["memory"] == "0x" + "00" * 31 + "42"
+    assert steps[-1]["opName"] == "RETURN"
+
+
+def test_write_trace_with_calls():
+    callee = assemble([PUSH(1), POP], print_bin=False)
+    code = assemble([PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0), PUSH(0xBB), GAS, CALL, POP], print_bin=False)
+    steps = [json.loads(line) for line in trace(code, world_state=WorldState({0xBB: AccountState(code=callee)}))]
+
+    assert [(s["pc"], s["opName"], s["depth"]) for s in steps[-6:]] == [
+        (13, "CALL", 1),
+        (0, "PUSH1", 2),
+        (2, "POP", 2),
+        (3, "STOP", 2),
+        (14, "POP", 1),
+        (15, "STOP", 1),
+    ]
+
+
+def test_identical_traces():
+    lines = trace(CODE, memory=True)
+    divergence, count = diff_traces(lines, list(lines) + ['{"output":"","gasUsed":"0x0"}'])
+    assert divergence is None
+    assert count == len(lines)
+
+
+def test_first_divergence_with_context():
+    # same code, except for the operand of the last PUSH1 before EQ
+    changed = bytearray(CODE)
+    changed[11] = 4
+    divergence, count = diff_traces(trace(CODE), trace(bytes(changed)), context=2)
+
+    assert count == divergence.index == 7
+    assert divergence.fields == ["stack"]
+    assert divergence.left.name == "EQ"
+    assert divergence.left.stack == (3, 3) and divergence.right.stack == (3, 4)
+    assert [index for index, _ in divergence.before] == [5, 6]
+    assert [step.name for step in divergence.left_after] == ["PUSH1", "PUSH1"]
+    assert len(divergence.format()) == 1 + 2 + 2 + 2 + 2
+
+
+def test_ignores_formatting_and_extra_fields():
+    left = ['{"pc":0,"op":96,"depth":1,"stack":[],"memSize":0}', '{"pc":2,"op":1,"depth":1,"stack":["0x1","0x02"]}']
+    right = [
+        '{"pc": 0, "op": 96, "gas": "0x10", "stack": [], "depth": 1, "memSize": 0}',
+        '{"pc": 2, "op": 1, "gas": "0xd", "stack": ["0x01", "0x2"], "depth": 1, "memory": "0x"}',
+    ]
+    assert diff_traces(left, right) == (None, 2)
+
+    divergence, _ = diff_traces(left, right[:1])
+    assert divergence.index == 1 and divergence.right is None and divergence.fields == ["length"]
+
+
+def test_diff_files(tmp_path):
+    lines = trace(CODE)
+    (tmp_path / "a.jsonl").write_text("\n".join(lines) + "\n")
+    with gzip.open(tmp_path / "b.jsonl.gz", "wt") as f:
+        f.write("\n".join(lines[:-1]) + "\n")
+
+    divergence, count = diff_files(str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl.gz"))
+    assert count == len(lines) - 1
+    assert divergence.left.name == "RETURN" and divergence.right is None
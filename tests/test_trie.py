@@ -0,0 +1,116 @@
+import random
+
+from smol_evm.context import AccountState, Storage
+from smol_evm.trie import StorageTrie, Trie, TrieStorage, hex_prefix, rlp_encode, state_root, storage_root
+
+import pytest
+
+
+def build(items):
+    trie = Trie()
+    for key, value in items.items():
+        trie.put(key, value)
+    return trie
+
+
+def test_rlp():
+    assert rlp_encode(b"") == b"\x80"
+    assert rlp_encode(b"\x7f") == b"\x7f"
+    assert rlp_encode(b"dog") == b"\x83dog"
+    assert rlp_encode([b"cat", b"dog"]) == b"\xc8\x83cat\x83dog"
+    assert rlp_encode(b"a" * 56) == b"\xb8\x38" + b"a" * 56
+
+
+def test_hex_prefix():
+    assert hex_prefix((1, 2, 3, 4, 5), leaf=False) == bytes([0x11, 0x23, 0x45])
+    assert hex_prefix((0, 1, 2, 3, 4, 5), leaf=False) == bytes([0x00, 0x01, 0x23, 0x45])
+    assert hex_prefix((0xF, 1, 0xC, 0xB, 8), leaf=True) == bytes([0x3F, 0x1C, 0xB8])
+
+
+def test_empty_root():
+    assert Trie().root_hash().hex() == "56e81f171bcc55a6ff8345e692c0f86e5b48e01b996cadc001622fb5e363b421"
+
+
+@pytest.mark.parametrize(
+    "items, root",
+    [
+        (
+            {b"do": b"verb", b"horse": b"stallion", b"doge": b"coin", b"dog": b"puppy"},
+            "5991bb8c6514148a29db676a14ac506cd2cd5775ace63c30a4fe457715e9ac84",
+        ),
+        (
+            {b"doe": b"reindeer", b"dog": b"puppy", b"dogglesworth": b"cat"},
+            "8aad789dff2f538bca5d8ea56e8abe10f4c7ba3a5dea95fea4cd6e7c3a1168d3",
+        ),
+    ],
+)
+def test_known_roots(items, root):
+    assert build(items).root_hash().hex() == root
+
+
+def test_get():
+    trie = build({b"do": b"verb", b"dog": b"puppy"})
+    assert trie.get(b"do") == b"verb"
+    assert trie.get(b"dog") == b"puppy"
+    assert trie.get(b"d") is None
+    assert trie.get(b"doge") is None
+
+
+def test_updates_and_deletes_match_rebuild():
+    rng = random.Random(0x7121E)
+    trie, expected = Trie(), {}
+    for i in range(2000):
+        key = bytes(rng.randrange(4) for _ in range(rng.randrange(1, 4)))
+        if rng.random() < 0.3:
+            trie.delete(key)
+            expected.pop(key, None)
+        else:
+            value = bytes([rng.randrange(256)]) * rng.randrange(1, 40)
+            trie.put(key, value)
+            expected[key] = value
+
+        if i % 50 == 0:
+            assert trie.root_hash() == build(expected).root_hash()
+
+    assert trie.root_hash() == build(expected).root_hash()
+
+    for key in list(expected):
+        trie.delete(key)
+    assert trie.root_hash() == Trie.EMPTY_ROOT
+
+
+def test_only_modified_paths_are_rehashed():
+    trie = StorageTrie()
+    for slot in range(10_000):
+        trie.update(slot, slot + 1)
+    root = trie.root_hash()
+
+    before = trie.encoded_nodes
+    trie.update(42, 0xDEAD)
+    assert trie.root_hash() != root
+    assert trie.encoded_nodes - before < 10
+
+    before = trie.encoded_nodes
+    trie.root_hash()
+    assert trie.encoded_nodes == before
+
+
+def test_trie_storage_is_incremental():
+    storage = TrieStorage({slot: slot for slot in range(1, 100)})
+    plain = Storage({slot: slot for slot in range(1, 100)})
+    assert storage.root_hash() == storage_root(plain)
+
+    for slot, value in ((1, 0), (2, 7), (2, 8), (1000, 1)):
+        storage.put(slot, value)
+        plain.put(slot, value)
+    assert storage.root_hash() == storage_root(plain)
+    assert not storage.pending
+
+
+def test_state_root():
+    # an account with no code and no storage
+    accounts = [(0xAA, AccountState(nonce=1, balance=10**18))]
+    root = state_root(accounts)
+    assert root != Trie.EMPTY_ROOT
+    assert state_root([(0xAA, AccountState(nonce=1, balance=10**18, storage=TrieStorage()))]) == root
+    assert state_root([]) == Trie.EMPTY_ROOT